@@ -19,17 +19,29 @@ def create_app():
 
     db.init_app(app)
 
+    from .services.write_behind import write_behind
+    write_behind.init_app(app)
+
+    from .services.session_pool import session_pool
+    session_pool.init_app(app)
+
+    from .services.history import summarizer
+    summarizer.init_app(app)
+
     from .routes.assistant_routes import assistant_bp
     from .routes.auth_routes import auth_bp
     from .routes.rag_routes import rag_bp
     from .routes.voice_routes import voice_bp
+    from .routes.metrics_routes import metrics_bp
 
     app.register_blueprint(assistant_bp, url_prefix="/api")
     app.register_blueprint(voice_bp, url_prefix="/voice")
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(rag_bp) 
+    app.register_blueprint(metrics_bp)
 
+    from .migrations import migrate
     with app.app_context():
-        db.create_all()
+        migrate(db.engine)
 
     return app
@@ -0,0 +1,75 @@
+# app/asgi.py
+import asyncio
+
+from quart import Quart, websocket
+from hypercorn.middleware import AsyncioWSGIMiddleware
+
+from app import create_app
+from app.extensions import db
+from app.models import Assistant, Conversation
+from app.routes.voice_routes import active_calls
+from app.services.realtime_processing import CallHandler
+from app.services.session_pool import session_pool
+
+
+def create_asgi_app():
+    """
+    Shared-event-loop serving mode.
+
+    Twilio media streams on /ws/call/<conversation_id> are served natively by
+    Quart, so every CallHandler in a worker runs as a task on that worker's
+    single event loop instead of getting its own thread + asyncio.run().
+    All plain HTTP traffic (/voice, /api, ...) is handed to the regular Flask
+    app through Hypercorn's WSGI bridge.
+
+    Run with e.g.:  hypercorn asgi:app --workers 4
+    """
+    flask_app = create_app()
+    ws_app = Quart(__name__)
+
+    @ws_app.before_serving
+    async def bind_session_pool():
+        # /voice runs in the WSGI bridge's threads; pre-warmed realtime
+        # sessions must live on this loop so the media handler can claim them
+        session_pool.bind(asyncio.get_running_loop())
+
+    @ws_app.websocket("/ws/call/<int:conversation_id>")
+    async def call_websocket(conversation_id):
+        # Accept right away; Quart would otherwise hold the handshake until
+        # the first receive, i.e. until the upstream session is connected.
+        await websocket.accept()
+
+        # The Flask app context gives this call its own SQLAlchemy session;
+        # tasks spawned by the handler inherit it through contextvars.
+        with flask_app.app_context():
+            convo = Conversation.query.get(conversation_id)
+            if not convo:
+                return
+            assistant = Assistant.query.get(convo.assistant_id)
+            # release the pooled connection before the first await; the
+            # loaded attributes stay readable on the detached instances
+            db.session.close()
+
+            handler = CallHandler(
+                websocket=websocket._get_current_object(),
+                assistant=assistant,
+                conversation_id=conversation_id
+            )
+            active_calls[conversation_id] = handler
+
+            try:
+                await handler.process()
+            except Exception as e:
+                print(f"Error in WebSocket handler: {e}")
+            finally:
+                active_calls.pop(conversation_id, None)
+
+    http_app = AsyncioWSGIMiddleware(flask_app)
+
+    async def asgi_app(scope, receive, send):
+        if scope["type"] in ("websocket", "lifespan"):
+            await ws_app(scope, receive, send)
+        else:
+            await http_app(scope, receive, send)
+
+    return asgi_app
@@ -17,4 +17,64 @@ OPENAI_API_KEY = os.getenv("OPENAI_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY") 
 
 QDRANT_URL      = os.getenv("QDRANT_URL")
-QDRANT_API_KEY  = os.getenv("QDRANT_API_KEY")
\ No newline at end of file
+QDRANT_API_KEY  = os.getenv("QDRANT_API_KEY")
+
+# OpenAI Realtime endpoint (override to point calls at a local fake server)
+OPENAI_REALTIME_URL = os.getenv(
+    "OPENAI_REALTIME_URL",
+    "wss://api.openai.com/v1/realtime?model=gpt-4o-mini-realtime-preview-2024-12-17",
+)
+
+# Write-behind persistence for transcripts/bookings on the realtime path
+WRITE_BEHIND_MAX_ITEMS  = int(os.getenv("WRITE_BEHIND_MAX_ITEMS", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_INTERVAL   = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.2"))
+WRITE_BEHIND_DEAD_LETTERS = os.getenv("WRITE_BEHIND_DEAD_LETTERS", "write_behind_dead_letters.jsonl")  # rows that failed permanently
+
+# Pre-warm the realtime session from the /voice webhook (shared-event-loop mode)
+REALTIME_PREWARM     = os.getenv("REALTIME_PREWARM", "1") == "1"
+REALTIME_PREWARM_TTL = float(os.getenv("REALTIME_PREWARM_TTL", "15"))
+
+# Outbound audio pacing: ms of assistant audio kept queued at Twilio
+AUDIO_LEAD_MS = int(os.getenv("AUDIO_LEAD_MS", "60"))
+
+# Call recording (opt-in per assistant): segmented stereo WAV files
+RECORDING_DIR           = os.getenv("RECORDING_DIR", "recordings")
+RECORDING_SEGMENT_BYTES = int(os.getenv("RECORDING_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+RECORDING_QUEUE_FRAMES  = int(os.getenv("RECORDING_QUEUE_FRAMES", "3000"))
+
+# Shared outbound HTTP pool for provider calls (app/services/http_pool.py)
+HTTP_TIMEOUT          = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS  = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_PER_HOST     = int(os.getenv("HTTP_MAX_PER_HOST", "16"))
+HTTP_RETRIES          = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# Document indexing: embedding requests per batch and in flight (rag.embed_many)
+EMBED_BATCH_SIZE  = int(os.getenv("EMBED_BATCH_SIZE", "256"))          # inputs per request (provider max 2048)
+EMBED_BATCH_CHARS = int(os.getenv("EMBED_BATCH_CHARS", "400000"))      # ~100k tokens, under the per-request cap
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))           # batches in flight before any 429
+EMBED_RETRIES     = int(os.getenv("EMBED_RETRIES", "8"))               # 429s tolerated per batch
+
+# Conversation history: recent messages verbatim within a token budget,
+# older ones folded into a rolling summary (app/services/history.py)
+HISTORY_TOKEN_BUDGET  = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_MAX_MESSAGES  = int(os.getenv("HISTORY_MAX_MESSAGES", "40"))
+HISTORY_SUMMARY_WORDS = int(os.getenv("HISTORY_SUMMARY_WORDS", "200"))
+HISTORY_FOLD_BATCH    = int(os.getenv("HISTORY_FOLD_BATCH", "200"))
+HISTORY_CACHE_CHARS   = int(os.getenv("HISTORY_CACHE_CHARS", str(8_000_000)))  # in-process LRU; 0 = off
+
+# Semantic answer cache for the text path (opt-in per assistant)
+ANSWER_CACHE_EMBED_MODEL = os.getenv("ANSWER_CACHE_EMBED_MODEL", "text-embedding-3-small")
+ANSWER_CACHE_THRESHOLD   = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))   # cosine similarity
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))     # per assistant
+ANSWER_CACHE_TTL         = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+# Days either side of a requested slot searched for the nearest free one
+BOOKING_SEARCH_DAYS = int(os.getenv("BOOKING_SEARCH_DAYS", "14"))
+
+# Per-day booked-slot bitmaps cached in-process (app.services.availability)
+AVAILABILITY_CACHE_DAYS = int(os.getenv("AVAILABILITY_CACHE_DAYS", "100000"))  # assistant-days kept; 0 = off
+
+# Rendered bodies of the polled read APIs (ETags work with it off too)
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(8_000_000)))  # 0 = off
@@ -0,0 +1,207 @@
+# app/migrations.py
+"""
+Schema migrations, applied in order at startup (replaces db.create_all()).
+
+Each migration runs once per database and is recorded in schema_migrations.
+create_all() only creates missing tables: it never adds a column or an
+index to a table that already exists, so databases created before a model
+change silently lacked it. Here:
+
+  0001  creates any missing table (a fresh database gets the current models,
+        indexes included)
+  0002  retired: it added the columns of 0007-0012 in one step
+  0003  adds the indexes behind the per-call lookups
+  0004  one booking per (assistant, date, time)
+  0005  assistant.bookings_version (availability cache key)
+  0006  user.assistants_version (ETag of the assistants list)
+  0007  assistant.vad_threshold_db (local VAD gate)
+  0008  assistant.record_calls and the recording table (call recording)
+  0009  assistant.config_version (prompt prefix cache key)
+  0010  conversation.summary, summary_through (rolling history summary)
+  0011  assistant.answer_cache (semantic answer cache opt-in)
+  0012  conversation.message_count, backfilled (history cache version)
+
+Because 0001 builds fresh databases straight at the current models, every
+later step must check before it alters (_add_column, _create_index), so it
+is a no-op where the schema already has the change.
+
+All pending steps run in one transaction; on Postgres an advisory lock
+keeps several workers starting at once from racing. To add a migration,
+append (id, function) to MIGRATIONS; never reorder applied ones or change
+what they do. A step may be retired once later ones make the same change,
+as 0002 was: every step checks first, so nothing is applied twice.
+
+A change to the models ships its migration in the same commit, so every
+commit can run against a database from the one before it. After the steps,
+migrate() checks that every model column exists and refuses to start if
+one is missing, naming it, instead of failing on the first query. (Commits
+from before this runner relied on create_all: to bisect across them, start
+each step from a fresh database.)
+"""
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app import models
+
+LOCK_KEY = 0x5C4E_3A01      # pg_advisory_xact_lock key for the runner
+
+schema_migrations = sa.Table(
+    "schema_migrations", sa.MetaData(),
+    sa.Column("id", sa.String(80), primary_key=True),
+    sa.Column("applied_at", sa.DateTime, nullable=False),
+)
+
+
+def _columns(conn, table: str) -> set[str]:
+    return {c["name"] for c in sa.inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table: str, column: sa.Column):
+    """ALTER TABLE ADD COLUMN unless it is already there. NOT NULL needs a server_default."""
+    if column.name in _columns(conn, table):
+        return
+    dialect = conn.dialect
+    ddl = f"ALTER TABLE {dialect.identifier_preparer.quote(table)} ADD COLUMN " \
+          f"{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect=dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        if not isinstance(default, str):
+            default = default.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {default}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(sa.text(ddl))
+
+
+def _create_index(conn, index: sa.Index):
+    index.create(conn, checkfirst=True)
+
+
+def _create_table(conn, table: sa.Table):
+    table.create(conn, checkfirst=True)
+
+
+def _0001_initial_tables(conn):
+    db.metadata.create_all(conn, checkfirst=True)
+
+
+def _0003_hot_query_indexes(conn):
+    wanted = {"ix_assistant_twilio_number", "ix_conversation_assistant_caller",
+              "ix_message_conversation_id", "ix_booking_assistant_date"}
+    for model in (models.Assistant, models.Conversation, models.Message, models.Booking):
+        for index in model.__table__.indexes:
+            if index.name in wanted:
+                _create_index(conn, index)
+
+
+def _0004_booking_slot_unique(conn):
+    duplicates = conn.execute(sa.text(
+        "SELECT assistant_id, date, time, count(*) FROM booking "
+        "GROUP BY assistant_id, date, time HAVING count(*) > 1"
+    )).all()
+    if duplicates:
+        # double bookings are real customers; someone has to decide who keeps the slot
+        listed = ", ".join(f"assistant {a} {d} {t} x{n}" for a, d, t, n in duplicates[:20])
+        raise RuntimeError(f"migration 0004: {len(duplicates)} slots are booked more than once "
+                           f"({listed}); move or delete the extra bookings and restart")
+    for index in models.Booking.__table__.indexes:
+        if index.name == "uq_booking_slot":
+            _create_index(conn, index)
+    # the unique index covers (assistant_id, date) lookups
+    conn.execute(sa.text("DROP INDEX IF EXISTS ix_booking_assistant_date"))
+
+
+def _0005_assistant_bookings_version(conn):
+    _add_column(conn, "assistant",
+                sa.Column("bookings_version", sa.Integer, nullable=False, server_default="0"))
+
+
+def _0006_user_assistants_version(conn):
+    _add_column(conn, "user",
+                sa.Column("assistants_version", sa.Integer, nullable=False, server_default="0"))
+
+
+def _0007_assistant_vad_threshold_db(conn):
+    _add_column(conn, "assistant", sa.Column("vad_threshold_db", sa.Float, nullable=True))
+
+
+def _0008_call_recordings(conn):
+    _add_column(conn, "assistant",
+                sa.Column("record_calls", sa.Boolean, nullable=False, server_default=sa.false()))
+    _create_table(conn, models.Recording.__table__)
+
+
+def _0009_assistant_config_version(conn):
+    _add_column(conn, "assistant",
+                sa.Column("config_version", sa.Integer, nullable=False, server_default="1"))
+
+
+def _0010_conversation_summary(conn):
+    _add_column(conn, "conversation", sa.Column("summary", sa.Text))
+    _add_column(conn, "conversation", sa.Column("summary_through", sa.Integer))
+
+
+def _0011_assistant_answer_cache(conn):
+    _add_column(conn, "assistant",
+                sa.Column("answer_cache", sa.Boolean, nullable=False, server_default=sa.false()))
+
+
+def _0012_conversation_message_count(conn):
+    if "message_count" in _columns(conn, "conversation"):
+        return
+    _add_column(conn, "conversation",
+                sa.Column("message_count", sa.Integer, nullable=False, server_default="0"))
+    # any value works as a cache version, but the real count is more useful
+    conn.execute(sa.text(
+        "UPDATE conversation SET message_count = "
+        "(SELECT count(*) FROM message WHERE message.conversation_id = conversation.id)"
+    ))
+
+
+MIGRATIONS = [
+    ("0001_initial_tables", _0001_initial_tables),
+    ("0003_hot_query_indexes", _0003_hot_query_indexes),
+    ("0004_booking_slot_unique", _0004_booking_slot_unique),
+    ("0005_assistant_bookings_version", _0005_assistant_bookings_version),
+    ("0006_user_assistants_version", _0006_user_assistants_version),
+    ("0007_assistant_vad_threshold_db", _0007_assistant_vad_threshold_db),
+    ("0008_call_recordings", _0008_call_recordings),
+    ("0009_assistant_config_version", _0009_assistant_config_version),
+    ("0010_conversation_summary", _0010_conversation_summary),
+    ("0011_assistant_answer_cache", _0011_assistant_answer_cache),
+    ("0012_conversation_message_count", _0012_conversation_message_count),
+]
+
+
+def _missing_columns(conn) -> list[str]:
+    inspector = sa.inspect(conn)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        have = {c["name"] for c in inspector.get_columns(table.name)}
+        missing += [f"{table.name}.{c.name}" for c in table.columns if c.name not in have]
+    return missing
+
+
+def migrate(engine) -> list[str]:
+    """Apply pending migrations; returns the ids applied."""
+    applied_now = []
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(sa.text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        schema_migrations.create(conn, checkfirst=True)
+        done = set(conn.execute(sa.select(schema_migrations.c.id)).scalars())
+        for migration_id, step in MIGRATIONS:
+            if migration_id in done:
+                continue
+            step(conn)
+            conn.execute(schema_migrations.insert().values(
+                id=migration_id, applied_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+            applied_now.append(migration_id)
+            print(f"migrations: applied {migration_id}")
+        missing = _missing_columns(conn)
+        if missing:
+            raise RuntimeError(f"migrations: the models have columns this database lacks "
+                               f"({', '.join(missing)}); add a migration for them to MIGRATIONS")
+    return applied_now
@@ -9,6 +9,7 @@ class User(db.Model):
     google_id = db.Column(db.String(120), unique=True, nullable=True)
     google_token = db.Column(db.Text, nullable=True)
     google_refresh_token = db.Column(db.Text, nullable=True)
+    assistants_version = db.Column(db.Integer, nullable=False, default=0)  # bumped when any assistant changes
 
     assistants = db.relationship("Assistant", backref="owner", lazy=True)
 
@@ -21,8 +22,13 @@ class Assistant(db.Model):
     end_time = db.Column(db.String(5))
     booking_duration_minutes = db.Column(db.Integer)
     available_days = db.Column(db.Text)  # JSON string of available days
-    twilio_number = db.Column(db.String(20))
+    twilio_number = db.Column(db.String(20), index=True)  # looked up on every /voice webhook
     voice_type = db.Column(db.String(10), default="female")
+    vad_threshold_db = db.Column(db.Float, nullable=True)  # local VAD gate (dBFS); NULL = off
+    record_calls = db.Column(db.Boolean, nullable=False, default=False)  # stereo WAV per call
+    answer_cache = db.Column(db.Boolean, nullable=False, default=False)  # reuse answers to repeat questions
+    config_version = db.Column(db.Integer, nullable=False, default=1)  # bumped on every config change
+    bookings_version = db.Column(db.Integer, nullable=False, default=0)  # bumped on every booking
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 
 
@@ -35,6 +41,9 @@ class Booking(db.Model):
     details        = db.Column(db.Text)
     created_at     = db.Column(db.DateTime, server_default=db.func.now())
 
+    # one booking per slot; also serves the (assistant_id, date) availability lookups
+    __table_args__ = (db.Index("uq_booking_slot", "assistant_id", "date", "time", unique=True),)
+
 
 
 class Conversation(db.Model):
@@ -43,8 +52,14 @@ class Conversation(db.Model):
     assistant_id   = db.Column(db.Integer, db.ForeignKey("assistant.id"), nullable=False)
     caller_number  = db.Column(db.String(20), nullable=False)
     created_at     = db.Column(db.DateTime, server_default=db.func.now())
+    summary         = db.Column(db.Text)      # rolling summary of older messages
+    summary_through = db.Column(db.Integer)   # last Message.id folded into it
+    message_count   = db.Column(db.Integer, nullable=False, default=0, server_default="0")  # version for history caches
 
     messages       = db.relationship("Message", backref="conversation", lazy=True)
+    recordings     = db.relationship("Recording", backref="conversation", lazy=True)
+
+    __table_args__ = (db.Index("ix_conversation_assistant_caller", "assistant_id", "caller_number"),)
 
 
 class Message(db.Model):
@@ -54,3 +69,61 @@ class Message(db.Model):
     role            = db.Column(db.String(20), nullable=False)   # "user" or "assistant"
     content         = db.Column(db.Text,   nullable=False)
     created_at      = db.Column(db.DateTime, server_default=db.func.now())
+
+    # history windows: WHERE conversation_id = ? [AND id > ?] ORDER BY id
+    __table_args__ = (db.Index("ix_message_conversation_id", "conversation_id", "id"),)
+
+
+class Recording(db.Model):
+    __tablename__ = "recording"
+    id              = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey("conversation.id"), nullable=False)
+    segment         = db.Column(db.Integer, nullable=False)      # 0, 1, ... within one call
+    path            = db.Column(db.String(255), nullable=False)  # stereo WAV: L caller, R assistant
+    started_at      = db.Column(db.DateTime, nullable=False)     # start of the call
+    duration_ms     = db.Column(db.Integer, nullable=False)
+    size_bytes      = db.Column(db.Integer, nullable=False)
+    created_at      = db.Column(db.DateTime, server_default=db.func.now())
+
+
+class Usage(db.Model):
+    """One LLM response's tokens, cost and latency (realtime turn, chat turn, summary)."""
+    __tablename__ = "usage"
+    id                  = db.Column(db.Integer, primary_key=True)
+    assistant_id        = db.Column(db.Integer, db.ForeignKey("assistant.id"), nullable=False)
+    conversation_id     = db.Column(db.Integer, db.ForeignKey("conversation.id"), nullable=True, index=True)
+    source              = db.Column(db.String(20), nullable=False)   # "realtime", "chat", "summary"
+    model               = db.Column(db.String(100))
+    input_tokens        = db.Column(db.Integer, nullable=False, default=0)
+    cached_tokens       = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens       = db.Column(db.Integer, nullable=False, default=0)
+    audio_input_tokens  = db.Column(db.Integer, nullable=False, default=0)
+    audio_output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cost_usd            = db.Column(db.Float, nullable=False, default=0.0)
+    latency_ms          = db.Column(db.Float)    # request start (or response.created) → done
+    ttfb_ms             = db.Column(db.Float)    # → first token / first audio frame to the caller
+    created_at          = db.Column(db.DateTime, nullable=False)   # UTC
+
+    __table_args__ = (db.Index("ix_usage_assistant_created", "assistant_id", "created_at"),)
+
+
+class UsageRollup(db.Model):
+    """Usage summed per assistant, UTC day and source; kept up to date as Usage rows are written."""
+    __tablename__ = "usage_rollup"
+    id                  = db.Column(db.Integer, primary_key=True)
+    assistant_id        = db.Column(db.Integer, db.ForeignKey("assistant.id"), nullable=False)
+    day                 = db.Column(db.Date, nullable=False)
+    source              = db.Column(db.String(20), nullable=False)
+    requests            = db.Column(db.Integer, nullable=False, default=0)
+    input_tokens        = db.Column(db.BigInteger, nullable=False, default=0)
+    cached_tokens       = db.Column(db.BigInteger, nullable=False, default=0)
+    output_tokens       = db.Column(db.BigInteger, nullable=False, default=0)
+    audio_input_tokens  = db.Column(db.BigInteger, nullable=False, default=0)
+    audio_output_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    cost_usd            = db.Column(db.Float, nullable=False, default=0.0)
+    latency_ms_sum      = db.Column(db.Float, nullable=False, default=0.0)
+    latency_ms_max      = db.Column(db.Float, nullable=False, default=0.0)
+    ttfb_ms_sum         = db.Column(db.Float, nullable=False, default=0.0)
+    ttfb_count          = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint("assistant_id", "day", "source", name="uq_usage_rollup_key"),)
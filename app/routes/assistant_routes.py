@@ -1,18 +1,61 @@
 # app/routes/assistant_routes.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, make_response, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-from app.models import db, User, Assistant, Booking
+from app.config import BOOKING_SEARCH_DAYS
+from app.models import db, User, Assistant, Booking, Conversation, UsageRollup
 from app.services.twillio_helper import buy_twilio_number
 from app.services.rag import extract_and_index
-from app.services.booking import generate_time_slots, load_booked_slots
+from app.services import availability, booking_export
+from app.services.utils import invalidate_prompt_prefix
+from app.services.answer_cache import answer_cache
+from app.services.response_cache import response_cache
+from app.services import usage
 from flask import session
 
 assistant_bp = Blueprint("assistant", __name__)
 
+
+def _as_bool(v):
+    if not isinstance(v, bool):
+        raise TypeError("expected true or false")
+    return v
+
+
+def _bump_assistants_version(user_id: int):
+    """Call in the transaction that adds or changes one of the user's assistants."""
+    (User.query
+         .filter_by(id=user_id)
+         .update({"assistants_version": User.assistants_version + 1}, synchronize_session=False))
+
+
+def _conditional(key: tuple, render):
+    """
+    GET whose payload is fully determined by `key` (route, arguments and
+    the versions it was built from; see services/response_cache): 304 if
+    the client already has it, else the cached body, else render() (a
+    view return value), cached when it is a 200.
+    """
+    etag = response_cache.etag(key)
+    if etag in request.if_none_match:
+        response_cache.not_modified()
+        resp = Response(status=304)
+    else:
+        body = response_cache.get(key)
+        if body is None:
+            resp = make_response(render())
+            if resp.status_code != 200:
+                return resp
+            response_cache.put(key, resp.get_data())
+        else:
+            resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"      # always revalidate; the 304 is the cheap path
+    return resp
+
 @assistant_bp.route("/register", methods=["POST"])
 def register_business():
     """
@@ -27,6 +70,9 @@ def register_business():
       - available_days (JSON object)
       - voice_type ("male"|"female")
     Optionally:
+      - vad_threshold_db (float, e.g. -45) to enable the local silence gate
+      - record_calls ("true"|"false") to record calls as stereo WAV segments
+      - answer_cache ("true"|"false") to reuse answers to repeated text-path questions
       - files (one or more PDFs or text files) to index into RAG immediately.
     """
     print("🔍 Request:", request)
@@ -65,6 +111,11 @@ def register_business():
         except Exception as e:
             return jsonify(error="Twilio error", details=str(e)), 500
 
+    try:
+        vad_threshold_db = float(form["vad_threshold_db"]) if form.get("vad_threshold_db") else None
+    except ValueError:
+        return jsonify(error="vad_threshold_db must be a number"), 400
+
     # 3) Create the Assistant record
     assistant = Assistant(
         name=form["receptionist_name"],
@@ -76,9 +127,13 @@ def register_business():
         available_days=json.dumps(json.loads(form["available_days"])),
         twilio_number=twilio_number,
         voice_type=form["voice_type"],
+        vad_threshold_db=vad_threshold_db,
+        record_calls=form.get("record_calls", "false").lower() in ("1", "true", "yes", "on"),
+        answer_cache=form.get("answer_cache", "false").lower() in ("1", "true", "yes", "on"),
         user_id=user.id
     )
     db.session.add(assistant)
+    _bump_assistants_version(user.id)
     db.session.commit()
 
     # 4) Optional: immediately index any uploaded files via RAG
@@ -121,33 +176,51 @@ def get_available_slots(assistant_id):
         return jsonify(error="Invalid date format, use YYYY-MM-DD"), 400
 
     day = date.strftime("%A").lower()
+
+    def render():
+        cache = availability.availability_cache
+        if not cache.grid(assistant).weekdays[date.weekday()]:
+            return jsonify(date=date_str, day=day, slots=[], message=f"No slots on {day.capitalize()}"), 200
+
+        free = cache.load(assistant, date.date(), date.date()).free_labels(date.date())
+        return jsonify(
+            date=date_str,
+            day=day,
+            slots=free,
+            business_hours=f"{assistant.start_time} - {assistant.end_time}",
+            slot_duration=assistant.booking_duration_minutes
+        ), 200
+
+    return _conditional(("slots", assistant.id, assistant.config_version, assistant.bookings_version, date_str),
+                        render)
+
+
+@assistant_bp.route("/slots/<int:assistant_id>/nearest", methods=["GET"])
+def get_nearest_slots(assistant_id):
+    """
+    The free slots closest to a requested time, over open days only.
+    Query params:
+      - at (YYYY-MM-DDTHH:MM) optional, defaults to now
+      - k (int) how many, default 3 (max 50)
+      - days (int) searched either side of `at`, default BOOKING_SEARCH_DAYS (max 366)
+    """
+    assistant = Assistant.query.get_or_404(assistant_id)
+    at_str = request.args.get("at")
     try:
-        available_days = json.loads(assistant.available_days)
-    except:
-        available_days = {
-            "monday": True, "tuesday": True, "wednesday": True,
-            "thursday": True, "friday": True,
-            "saturday": False, "sunday": False
-        }
-
-    if not available_days.get(day, False):
-        return jsonify(date=date_str, day=day, slots=[], message=f"No slots on {day.capitalize()}"), 200
-
-    slots = generate_time_slots(
-        assistant.start_time,
-        assistant.end_time,
-        assistant.booking_duration_minutes,
-        available_days,
-        for_date=date.date()
-    )
-    booked = load_booked_slots(assistant.id, date.date())
+        at = datetime.strptime(at_str, "%Y-%m-%dT%H:%M") if at_str else datetime.now()
+    except ValueError:
+        return jsonify(error="Invalid at format, use YYYY-MM-DDTHH:MM"), 400
+    k = min(max(request.args.get("k", 3, type=int), 1), 50)
+    days = min(max(request.args.get("days", BOOKING_SEARCH_DAYS, type=int), 0), 366)
 
-    free = [s for s in slots if f"{date_str}_{s}" not in booked or booked[f"{date_str}_{s}"] is None]
+    nearest = availability.nearest_free(assistant, at, k=k, days=days, cached=True)
     return jsonify(
-        date=date_str,
-        day=day,
-        slots=free,
-        business_hours=f"{assistant.start_time} - {assistant.end_time}",
+        requested=at.strftime("%Y-%m-%dT%H:%M"),
+        slots=[{
+            "date":  s.strftime("%Y-%m-%d"),
+            "time":  s.strftime("%H:%M"),
+            "label": availability.spoken(s),
+        } for s in nearest],
         slot_duration=assistant.booking_duration_minutes
     ), 200
 
@@ -170,52 +243,123 @@ def get_assistant_bookings(assistant_id):
     except ValueError:
         return jsonify(error="Invalid date format, use YYYY-MM-DD"), 400
 
-    # fetch bookings
-    rows = Booking.query.filter_by(assistant_id=assistant_id) \
-        .filter(Booking.date >= start, Booking.date <= end) \
-        .order_by(Booking.date, Booking.time) \
-        .all()
+    def render():
+        rows = Booking.query.filter_by(assistant_id=assistant_id) \
+            .filter(Booking.date >= start, Booking.date <= end) \
+            .order_by(Booking.date, Booking.time) \
+            .all()
+
+        bookings = [{
+            "id":            b.id,
+            "date":          b.date.strftime("%Y-%m-%d"),
+            "time":          b.time.strftime("%H:%M"),
+            "customer_name": b.customer_name,
+            "details":       b.details,
+            "created_at":    b.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        } for b in rows]
+
+        # slots per open day, marked from the rows above (no query per day)
+        grid = availability.availability_cache.grid(assistant)
+        all_slots = availability.Availability(grid, start, end, ((b.date, b.time) for b in rows)).by_day()
+
+        return jsonify(
+            bookings=bookings,
+            slots=all_slots,
+            business_hours=f"{assistant.start_time} - {assistant.end_time}",
+            slot_duration=assistant.booking_duration_minutes
+        ), 200
+
+    return _conditional(("bookings", assistant.id, assistant.config_version, assistant.bookings_version,
+                         start.isoformat(), end.isoformat()), render)
+
+
+@assistant_bp.route("/bookings/<int:assistant_id>/export", methods=["GET"])
+def export_assistant_bookings(assistant_id):
+    """
+    Stream bookings in (date, time, id) order; each row has a `cursor`.
+    Query params:
+      - format     ndjson (default) or csv
+      - start_date (YYYY-MM-DD) optional
+      - end_date   (YYYY-MM-DD) optional
+      - after      a row's cursor: resume after it
+      - limit      (int) optional page size
+    """
+    Assistant.query.get_or_404(assistant_id)
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify(error="format must be ndjson or csv"), 400
+    sd = request.args.get("start_date")
+    ed = request.args.get("end_date")
+    try:
+        start = datetime.strptime(sd, "%Y-%m-%d").date() if sd else None
+        end   = datetime.strptime(ed, "%Y-%m-%d").date() if ed else None
+    except ValueError:
+        return jsonify(error="Invalid date format, use YYYY-MM-DD"), 400
+    try:
+        after = booking_export.parse_cursor(request.args["after"]) if request.args.get("after") else None
+    except ValueError:
+        return jsonify(error="Invalid cursor"), 400
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit <= 0:
+        return jsonify(error="limit must be positive"), 400
+
+    batches = booking_export.iter_batches(assistant_id, start, end, after, limit)
+    if fmt == "csv":
+        body, mimetype = booking_export.csv_lines(batches), "text/csv"
+    else:
+        body, mimetype = booking_export.ndjson(batches), "application/x-ndjson"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=bookings-{assistant_id}.{fmt}"})
+
+
+@assistant_bp.route("/usage/<int:assistant_id>", methods=["GET"])
+def get_assistant_usage(assistant_id):
+    """
+    Token, cost and latency totals from the pre-aggregated daily rollups.
+    Query params:
+      - start_date (YYYY-MM-DD, UTC), default=end-29d
+      - end_date   (YYYY-MM-DD, UTC), default=today
+      - conversation_id (int) optional: that conversation's totals instead
+    """
+    Assistant.query.get_or_404(assistant_id)
+
+    conversation_id = request.args.get("conversation_id", type=int)
+    if conversation_id is not None:
+        convo = Conversation.query.filter_by(id=conversation_id, assistant_id=assistant_id).first_or_404()
+        rows = usage.conversation_rows(convo.id)
+        return jsonify(
+            assistant_id=assistant_id,
+            conversation_id=convo.id,
+            caller_number=convo.caller_number,
+            totals=usage.rollup_totals(rows),
+            by_source={r.source: usage.rollup_totals([r]) for r in rows},
+        ), 200
 
-    bookings = [{
-        "id":            b.id,
-        "date":          b.date.strftime("%Y-%m-%d"),
-        "time":          b.time.strftime("%H:%M"),
-        "customer_name": b.customer_name,
-        "details":       b.details,
-        "created_at":    b.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    } for b in rows]
-
-    # build slots per day
-    all_slots = {}
-    current = start
+    sd = request.args.get("start_date")
+    ed = request.args.get("end_date")
     try:
-        available_days = json.loads(assistant.available_days)
-    except:
-        available_days = {}
-    while current <= end:
-        day = current.strftime("%A").lower()
-        if available_days.get(day, False):
-            day_slots = generate_time_slots(
-                assistant.start_time,
-                assistant.end_time,
-                assistant.booking_duration_minutes,
-                available_days,
-                for_date=current
-            )
-            booked_map = load_booked_slots(assistant.id, current)
-            formatted = []
-            for slot in day_slots:
-                t24 = datetime.strptime(slot, "%I:%M %p").strftime("%H:%M")
-                is_booked = f"{current.strftime('%Y-%m-%d')}_{slot}" in booked_map
-                formatted.append({"time": t24, "is_booked": is_booked})
-            all_slots[current.strftime("%Y-%m-%d")] = formatted
-        current += timedelta(days=1)
+        end   = datetime.strptime(ed, "%Y-%m-%d").date() if ed else datetime.now(timezone.utc).date()
+        start = datetime.strptime(sd, "%Y-%m-%d").date() if sd else end - timedelta(days=29)
+    except ValueError:
+        return jsonify(error="Invalid date format, use YYYY-MM-DD"), 400
+
+    rows = UsageRollup.query.filter_by(assistant_id=assistant_id) \
+        .filter(UsageRollup.day >= start, UsageRollup.day <= end) \
+        .order_by(UsageRollup.day, UsageRollup.source) \
+        .all()
+
+    by_source = {}
+    for r in rows:
+        by_source.setdefault(r.source, []).append(r)
 
     return jsonify(
-        bookings=bookings,
-        slots=all_slots,
-        business_hours=f"{assistant.start_time} - {assistant.end_time}",
-        slot_duration=assistant.booking_duration_minutes
+        assistant_id=assistant_id,
+        start_date=start.strftime("%Y-%m-%d"),
+        end_date=end.strftime("%Y-%m-%d"),
+        totals=usage.rollup_totals(rows),
+        by_source={src: usage.rollup_totals(rs) for src, rs in by_source.items()},
+        days=[{"date": r.day.strftime("%Y-%m-%d"), "source": r.source, **usage.rollup_totals([r])} for r in rows],
     ), 200
 
 
@@ -234,24 +378,30 @@ def list_assistants():
     if not user:
         return jsonify(error="No such user"), 404
 
-    assistants = Assistant.query.filter_by(user_id=user_id).all()
-
-    payload = []
-    for a in assistants:
-        payload.append({
-            "id": a.id,
-            "name": a.name,
-            "business_name": a.business_name,
-            "description": a.description,
-            "start_time": a.start_time,
-            "end_time": a.end_time,
-            "booking_duration_minutes": a.booking_duration_minutes,
-            "available_days": json.loads(a.available_days),
-            "twilio_number": a.twilio_number,
-            "voice_type": a.voice_type
-        })
-
-    return jsonify(assistants=payload), 200
+    def render():
+        assistants = Assistant.query.filter_by(user_id=user_id).all()
+
+        payload = []
+        for a in assistants:
+            payload.append({
+                "id": a.id,
+                "name": a.name,
+                "business_name": a.business_name,
+                "description": a.description,
+                "start_time": a.start_time,
+                "end_time": a.end_time,
+                "booking_duration_minutes": a.booking_duration_minutes,
+                "available_days": json.loads(a.available_days),
+                "twilio_number": a.twilio_number,
+                "voice_type": a.voice_type,
+                "vad_threshold_db": a.vad_threshold_db,
+                "record_calls": a.record_calls,
+                "answer_cache": a.answer_cache
+            })
+
+        return jsonify(assistants=payload), 200
+
+    return _conditional(("assistants", user.id, user.assistants_version), render)
 
 @assistant_bp.route("/assistant/<int:assistant_id>", methods=["PATCH"])
 def update_assistant(assistant_id):
@@ -266,6 +416,9 @@ def update_assistant(assistant_id):
       - booking_duration_minutes (int)
       - available_days (JSON object of day→bool)
       - voice_type ("male" or "female")
+      - vad_threshold_db (float dBFS, or null to turn the local silence gate off)
+      - record_calls (bool)
+      - answer_cache (bool)
     (Note: twilio_number and user’s phone_number cannot be changed here.)
     """
     data = request.get_json(force=True, silent=True) or {}
@@ -281,6 +434,9 @@ def update_assistant(assistant_id):
         "booking_duration_minutes":lambda v: setattr(assistant, "booking_duration_minutes", int(v)),
         "voice_type":              lambda v: setattr(assistant, "voice_type", v),
         "available_days":          lambda v: setattr(assistant, "available_days", json.dumps(v)),
+        "vad_threshold_db":        lambda v: setattr(assistant, "vad_threshold_db", None if v is None else float(v)),
+        "record_calls":            lambda v: setattr(assistant, "record_calls", _as_bool(v)),
+        "answer_cache":            lambda v: setattr(assistant, "answer_cache", _as_bool(v)),
     }
 
     changed = []
@@ -295,7 +451,14 @@ def update_assistant(assistant_id):
     if not changed:
         return jsonify(message="No updatable fields provided"), 400
 
+    # new config version: every worker's memoized prompt prefix, cached
+    # answers and cached responses are now stale
+    assistant.config_version = (assistant.config_version or 0) + 1
+    _bump_assistants_version(assistant.user_id)
     db.session.commit()
+    invalidate_prompt_prefix(assistant.id)
+    answer_cache.invalidate(assistant.id)
+    availability.availability_cache.invalidate(assistant.id)
 
     # Return the updated assistant record
     assistant_data = {
@@ -308,6 +471,9 @@ def update_assistant(assistant_id):
         "booking_duration_minutes":   assistant.booking_duration_minutes,
         "voice_type":                 assistant.voice_type,
         "available_days":             json.loads(assistant.available_days),
+        "vad_threshold_db":           assistant.vad_threshold_db,
+        "record_calls":               assistant.record_calls,
+        "answer_cache":               assistant.answer_cache,
     }
 
     return jsonify(
@@ -3,15 +3,16 @@
 from flask import Blueprint, request, redirect, session, jsonify
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
 from app.models import db, User
-import os, secrets, requests
+from app.services.http_pool import http_pool
+import os, secrets
 
 auth_bp = Blueprint("auth", __name__)
 
 GOOGLE_CLIENT_ID     = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI  = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:5000/api/auth/google/callback")
+USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
 SCOPES = [
     "https://www.googleapis.com/auth/userinfo.email",
     "https://www.googleapis.com/auth/userinfo.profile",
@@ -76,9 +77,12 @@ def google_callback():
     flow.fetch_token(authorization_response=request.url)
     creds = flow.credentials
 
-    # 3) Fetch user info
-    service   = build("oauth2", "v2", credentials=creds)
-    profile   = service.userinfo().get().execute()
+    # 3) Fetch user info (direct call: no discovery-document round trip)
+    resp = http_pool.get(
+        USERINFO_URL, headers={"Authorization": f"Bearer {creds.token}"}, deadline=10
+    )
+    resp.raise_for_status()
+    profile   = resp.json()
     google_id = profile["id"]
     email     = profile.get("email")
     name      = profile.get("name")
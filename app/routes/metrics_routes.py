@@ -0,0 +1,73 @@
+# app/routes/metrics_routes.py
+
+from flask import Blueprint, Response, jsonify
+from app.routes.voice_routes import active_calls
+from app.services import metrics, vad, recording, rag
+from app.services.write_behind import write_behind
+from app.services.session_pool import session_pool
+from app.services.http_pool import http_pool
+from app.services.history import summarizer, history_cache
+from app.services.answer_cache import answer_cache
+from app.services.availability import availability_cache
+from app.services.response_cache import response_cache
+
+metrics_bp = Blueprint("metrics", __name__)
+
+# point-in-time values in each source's metrics(); everything else is a running total
+GAUGES = {
+    "write_behind":       ("queue_depth", "last_flush_ms", "max_flush_ms"),
+    "realtime_prewarm":   ("parked",),
+    "http_pool":          ("open_connections", "idle_connections", "in_flight"),
+    "prompt_cache":       ("provider_hit_ratio",),
+    "history_summarizer": ("queue_depth", "last_fold_ms"),
+    "history_cache":      ("entries", "chars", "hit_ratio"),
+    "answer_cache":       ("entries", "hit_ratio"),
+    "availability_cache": ("templates", "assistants", "days", "hit_ratio"),
+    "response_cache":     ("entries", "bytes", "hit_ratio"),
+}
+
+
+def _lines(prefix: str, values: dict) -> list[str]:
+    gauges = GAUGES.get(prefix, ())
+    return (metrics.counter_lines(prefix, {k: v for k, v in values.items() if k not in gauges})
+            + metrics.gauge_lines(prefix, {k: v for k, v in values.items() if k in gauges}))
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's call metrics."""
+    extra = [
+        "# HELP voice_active_calls Calls currently being handled by this worker.",
+        "# TYPE voice_active_calls gauge",
+        f"voice_active_calls {len(active_calls)}",
+    ]
+    extra += _lines("write_behind", write_behind.metrics())
+    extra += _lines("realtime_prewarm", session_pool.metrics())
+    extra += _lines("vad", vad.stats)
+    extra += _lines("recording", recording.stats)
+    extra += _lines("rag_embed", rag.stats)
+    extra += _lines("http_pool", http_pool.metrics())
+    extra += _lines("prompt_cache", metrics.prompt_cache_metrics())
+    extra += _lines("history_summarizer", summarizer.metrics())
+    extra += _lines("history_cache", history_cache.metrics())
+    extra += _lines("answer_cache", answer_cache.metrics())
+    extra += _lines("availability_cache", availability_cache.metrics())
+    extra += _lines("response_cache", response_cache.metrics())
+
+    return Response(
+        metrics.render_prometheus(extra),
+        mimetype="text/plain; version=0.0.4"
+    )
+
+
+@metrics_bp.route("/metrics/calls", methods=["GET"])
+def call_timelines():
+    """Event timelines of live calls and the most recent finished ones."""
+    live = [h.timeline.as_dict() for h in list(active_calls.values())]
+    return jsonify(active=live, recent=list(metrics.recent_calls)), 200
+
+
+@metrics_bp.route("/metrics/http", methods=["GET"])
+def http_pool_stats():
+    """Outbound HTTP pool: connections and per-host request/retry counters."""
+    return jsonify(http_pool.stats()), 200
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
+from app.models import db, Assistant
 from app.services.rag import extract_and_index
+from app.services.answer_cache import answer_cache
 
 rag_bp = Blueprint("rag", __name__, url_prefix="/api/rag")
 
@@ -41,4 +43,11 @@ def index_files():
 
     # 3) Extract, chunk, embed & index
     result = extract_and_index(assistant_id, user_id, docs)
+
+    # 4) New documents: answers cached from the old ones are stale
+    assistant = db.session.get(Assistant, assistant_id)
+    if assistant is not None:
+        assistant.config_version = (assistant.config_version or 0) + 1
+        db.session.commit()
+    answer_cache.invalidate(assistant_id)
     return jsonify(result), 200
@@ -4,7 +4,8 @@ from twilio.twiml.voice_response import VoiceResponse, Connect
 from app.extensions import db
 from app.services.memory import save_memory_entry
 from app import sock
-from app.services.realtime_processing import CallHandler
+from app.services.realtime_processing import CallHandler, ThreadedSocket, build_session_update
+from app.services.session_pool import session_pool
 import asyncio
 
 voice_bp = Blueprint("voice", __name__)
@@ -28,6 +29,10 @@ def voice_entrypoint():
         db.session.add(convo)
         db.session.commit()
 
+    # Start the upstream realtime session now, while Twilio fetches the TwiML
+    # and opens the media stream (shared-event-loop mode only)
+    if session_pool.active:
+        session_pool.prewarm(convo.id, build_session_update(assistant, convo.id))
     
     # Build TwiML to connect into our WebSocket
     resp = VoiceResponse()
@@ -50,13 +55,18 @@ def call_websocket(ws, conversation_id):
     WebSocket handler for real-time call processing.
     This remains a synchronous function so Flask-Sock will invoke it directly.
     We then drive your async CallHandler with asyncio.run().
+
+    This is the thread-per-call serving mode; see app/asgi.py for the
+    shared-event-loop mode that serves the same path.
     """
     # Look up models
     convo = Conversation.query.get_or_404(conversation_id)
     assistant = Assistant.query.get_or_404(convo.assistant_id)
+    # don't pin a pooled connection for the whole call
+    db.session.close()
 
     handler = CallHandler(
-        websocket=ws,
+        websocket=ThreadedSocket(ws),
         assistant=assistant,
         conversation_id=conversation_id
     )
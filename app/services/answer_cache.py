@@ -0,0 +1,242 @@
+# app/services/answer_cache.py
+"""
+Semantic answer cache for the text path, opt-in per assistant
+(Assistant.answer_cache).
+
+Most text-path questions are the same handful (hours, location, prices,
+"do you take walk-ins"), and each one is a full LLM round trip. The cache
+keeps each assistant's recent (question embedding, answer) pairs. A new
+question gets the answer of the closest cached one when cosine similarity
+is at least ANSWER_CACHE_THRESHOLD. A normalized exact-text match is checked
+first and skips the embedding call. On an exact miss, lookup() only starts
+the embedding (on a small pool) and returns a probe; the caller starts the
+completion, streamed, alongside it and match() waits on the embedding
+alone, so a miss costs no extra latency and a semantic hit answers as soon
+as it is known. On a hit the caller hangs up on the completion once its
+first token is in: the provider stops generating, but the prompt was sent
+and is still billed, and no Usage row is written for it (the usage chunk
+never comes). An exact hit sends nothing.
+
+Only a conversation's opening question is looked up or stored. A reply is
+written with the whole conversation in the prompt, so a later turn's can
+carry that caller's name, context or promises; the first turn's prompt
+has nothing of the caller but the question.
+
+Nothing touching booking state is cached: questions that mention
+availability, bookings, days or times are never looked up, and replies that
+carried booking data or talk about slots are never stored. Very short
+utterances ("yes", "that works") depend on the conversation and are skipped
+too.
+
+Entries expire after ANSWER_CACHE_TTL seconds and are evicted LRU beyond
+ANSWER_CACHE_MAX_ENTRIES per assistant. Entries are tagged with the
+assistant's config_version, which is bumped on every settings change and
+when documents are re-indexed; the first lookup under a new version empties
+that assistant's cache, in every worker.
+"""
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.config import (
+    ANSWER_CACHE_EMBED_MODEL, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL
+)
+from app.services import rag
+
+MIN_WORDS = 3
+EMBED_WORKERS = 8
+
+BOOKING_QUESTION = re.compile(
+    r"\b(book\w*|appointment\w*|reserv\w*|schedul\w*|reschedul\w*|cancel\w*|slots?|availab\w*|"
+    r"free|today|tomorrow|tonight|weekend|next week|this week|"
+    r"mon(day)?|tue(s|sday)?|wed(nesday)?|thu(rs|rsday)?|fri(day)?|sat(urday)?|sun(day)?|"
+    r"\d{1,2}(:\d{2})?\s*(am|pm)|\d{1,2}:\d{2}|my name|confirm\w*)\b",
+    re.I,
+)
+BOOKING_REPLY = re.compile(
+    r"\b(booked|slots?|openings?|confirm\w*|reserved|all set|availability|available (on|at))\b",
+    re.I,
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+class _Entry:
+    __slots__ = ("key", "vector", "answer", "llm_ms", "expires")
+
+    def __init__(self, key, vector, answer, llm_ms, expires):
+        self.key     = key
+        self.vector  = vector
+        self.answer  = answer
+        self.llm_ms  = llm_ms
+        self.expires = expires
+
+
+class Probe:
+    """A question missing an exact match: its key and its embedding, in flight."""
+    __slots__ = ("key", "embedding")
+
+    def __init__(self, key, embedding):
+        self.key       = key
+        self.embedding = embedding      # Future: unit vector, or None if embedding failed
+
+    @property
+    def vector(self):
+        return self.embedding.result()
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = 0.92, max_entries: int = 256, ttl: float = 3600,
+                 embed_model: str = "text-embedding-3-small"):
+        self.threshold   = threshold
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self.embed_model = embed_model
+        self._caches: dict[int, tuple[int, OrderedDict]] = {}   # assistant id → (version, entries)
+        self._ids  = itertools.count()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="answer-cache")
+        self.counters = {
+            "lookups": 0, "hits": 0, "exact_hits": 0, "misses": 0, "skipped": 0,
+            "stores": 0, "evictions": 0, "expired": 0, "invalidations": 0,
+            "embed_failures": 0, "embed_ms": 0.0, "saved_ms": 0.0,
+        }
+
+    def lookup(self, assistant, text: str, first_turn: bool) -> tuple[str | None, Probe | None]:
+        """
+        (cached answer, None) on an exact hit, (None, probe) when the
+        semantic match is still to come (see match()), (None, None) when
+        this question must not be cached. `first_turn`: the conversation has
+        no history (or summary) yet.
+        """
+        if not assistant.answer_cache:
+            return None, None
+        key = _normalize(text)
+        if not first_turn or len(key.split()) < MIN_WORDS or BOOKING_QUESTION.search(key):
+            self._count("skipped")
+            return None, None
+        self._count("lookups")
+
+        entry = self._exact(assistant, key)
+        if entry is not None:
+            self._hit(entry, "exact_hits", 0.0)
+            return entry.answer, None
+        return None, Probe(key, self._pool.submit(self._embed, text))
+
+    def match(self, assistant, probe: Probe) -> str | None:
+        """Wait for the probe's embedding; the cached answer of a similar question, or None."""
+        started = time.perf_counter()
+        vector = probe.vector
+        entry = self._nearest(assistant, vector) if vector is not None else None
+        if entry is None:
+            self._count("misses")
+            return None
+        # only the wait counts against the hit: the embedding ran alongside other work
+        self._hit(entry, "hits", (time.perf_counter() - started) * 1000)
+        return entry.answer
+
+    def store(self, assistant, probe: Probe | None, reply: str, booking_data, llm_ms: float):
+        """Remember `reply` for the question behind `probe`, unless it is booking talk."""
+        if probe is None or booking_data or not reply or BOOKING_REPLY.search(reply):
+            return
+        if probe.vector is None:
+            return
+        with self._lock:
+            entries = self._entries(assistant)
+            entries[next(self._ids)] = _Entry(probe.key, probe.vector, reply, llm_ms,
+                                              time.monotonic() + self.ttl)
+            self.counters["stores"] += 1
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, assistant_id: int):
+        with self._lock:
+            if self._caches.pop(assistant_id, None) is not None:
+                self.counters["invalidations"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            c["entries"] = sum(len(e) for _, e in self._caches.values())
+        answered = c["hits"] + c["exact_hits"]
+        c["hit_ratio"] = answered / c["lookups"] if c["lookups"] else 0.0
+        return c
+
+    # ── internals ────────────────────────────────────────────────────────────
+
+    def _entries(self, assistant) -> OrderedDict:
+        """This assistant's entries under its current config_version. Lock held."""
+        version = assistant.config_version or 0
+        cached = self._caches.get(assistant.id)
+        if cached is None or cached[0] != version:
+            if cached is not None:
+                self.counters["invalidations"] += 1
+            cached = self._caches[assistant.id] = (version, OrderedDict())
+        return cached[1]
+
+    def _embed(self, text: str):
+        started = time.perf_counter()
+        try:
+            vector = np.asarray(rag.embed(text, self.embed_model), dtype=np.float32)
+        except Exception as e:
+            print(f"answer cache: embedding failed: {e}")
+            self._count("embed_failures")
+            return None
+        vector /= np.linalg.norm(vector) or 1.0
+        self._count("embed_ms", (time.perf_counter() - started) * 1000)
+        return vector
+
+    def _expire(self, entries: OrderedDict):
+        now = time.monotonic()
+        for k in [k for k, e in entries.items() if e.expires <= now]:
+            del entries[k]
+            self.counters["expired"] += 1
+
+    def _exact(self, assistant, key: str):
+        with self._lock:
+            entries = self._entries(assistant)
+            self._expire(entries)
+            for k, e in entries.items():
+                if e.key == key:
+                    entries.move_to_end(k)
+                    return e
+        return None
+
+    def _nearest(self, assistant, vector):
+        with self._lock:
+            entries = self._entries(assistant)
+            self._expire(entries)
+            if not entries:
+                return None
+            keys = list(entries)
+            sims = np.stack([entries[k].vector for k in keys]) @ vector
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            entries.move_to_end(keys[best])
+            return entries[keys[best]]
+
+    def _hit(self, entry: _Entry, counter: str, cost_ms: float):
+        with self._lock:
+            self.counters[counter] += 1
+            self.counters["saved_ms"] += max(0.0, entry.llm_ms - cost_ms)
+
+    def _count(self, counter: str, n=1):
+        with self._lock:
+            self.counters[counter] += n
+
+
+answer_cache = AnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    ttl=ANSWER_CACHE_TTL,
+    embed_model=ANSWER_CACHE_EMBED_MODEL,
+)
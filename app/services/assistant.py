@@ -1,31 +1,146 @@
 # app/services/assistant.py
 
-import json
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from app.services.memory import load_memory, save_memory_entry
-from app.services.llm import query_openrouter
-from app.services.utils import generate_prompt, extract_booking_data
-from app.services.booking import handle_booking
+from app.services.memory import save_memory_entry
+from app.services.history import load_history, history_json
+from app.services.llm import query_openrouter, stream_openrouter
+from app.services.utils import (
+    generate_prompt, extract_booking_data, BookingStreamScanner, SentenceChunker
+)
+from app.services.booking import handle_booking, slot_taken_message
+from app.services.answer_cache import answer_cache
 from app.models import Assistant
 
-def process_input(user_text: str, assistant: Assistant, conversation_id: int):
- 
-    history = load_memory(conversation_id)
+# first deltas of completions raced against an answer-cache lookup (opening turns only)
+_completions = ThreadPoolExecutor(max_workers=64, thread_name_prefix="completion")
 
-    history_json = json.dumps(history, ensure_ascii=False)
 
-    prompt      = generate_prompt(history_json, assistant)
+def _build_messages(user_text: str, assistant: Assistant, summary, history):
+    # recent turns go in as chat messages below; the prompt only carries the summary
+    prompt      = generate_prompt(history_json(summary, []), assistant)
 
     messages = [
         {"role": "system", "content": prompt},
         *history,
         {"role": "user",   "content": user_text}
     ]
+    return messages
+
+
+def process_input(user_text: str, assistant: Assistant, conversation_id: int):
+    summary, history = load_history(conversation_id)
+    cached, probe = answer_cache.lookup(assistant, user_text, first_turn=not (summary or history))
+    if cached is not None:
+        _finish_turn(user_text, cached, None, assistant, conversation_id)
+        return cached, None
+
+    messages = _build_messages(user_text, assistant, summary, history)
 
     # 4) Send to LLM and strip out any [BOOKING:...] block
-    reply, booking_data = extract_booking_data(query_openrouter(messages))
-    save_memory_entry(conversation_id, "user", user_text)
-    save_memory_entry(conversation_id, "assistant", reply)
+    started = time.perf_counter()
+    if probe is None:
+        raw = query_openrouter(messages, assistant_id=assistant.id, conversation_id=conversation_id)
+    else:
+        stream = stream_openrouter(messages, assistant_id=assistant.id, conversation_id=conversation_id)
+        cached, deltas = _race(assistant, probe, stream)
+        if cached is not None:
+            _finish_turn(user_text, cached, None, assistant, conversation_id)
+            return cached, None
+        raw = "".join(deltas).strip()
+    reply, booking_data = extract_booking_data(raw)
+    answer_cache.store(assistant, probe, reply, booking_data, (time.perf_counter() - started) * 1000)
+    taken = _finish_turn(user_text, reply, booking_data, assistant, conversation_id)
+    if taken:
+        return f"{reply} {taken}", None
+    return reply, booking_data
+
+
+def process_input_stream(user_text: str, assistant: Assistant, conversation_id: int):
+    """
+    Streaming process_input: yields the reply one complete sentence at a
+    time as the completion streams in, so TTS can start on the first one.
+    The booking JSON block is cut from the stream as it arrives and never
+    yielded. Memory and the booking are saved once the generator is
+    exhausted; its return value is (reply, booking_data).
+
+    Only the building block so far: no route calls this (or process_input)
+    yet. A text endpoint speaking its replies would hand each sentence to
+    tts.generate_openai_tts as it is yielded.
+    """
+    chunker = SentenceChunker()
+    summary, history = load_history(conversation_id)
+    cached, probe = answer_cache.lookup(assistant, user_text, first_turn=not (summary or history))
+    if cached is not None:
+        yield from _sentences(chunker, cached)
+        _finish_turn(user_text, cached, None, assistant, conversation_id)
+        return cached, None
+
+    messages = _build_messages(user_text, assistant, summary, history)
+
+    scanner = BookingStreamScanner()
+    raw = []
+    started = time.perf_counter()
+    deltas = stream_openrouter(messages, assistant_id=assistant.id, conversation_id=conversation_id)
+    if probe is not None:
+        cached, deltas = _race(assistant, probe, deltas)
+        if cached is not None:
+            yield from _sentences(chunker, cached)
+            _finish_turn(user_text, cached, None, assistant, conversation_id)
+            return cached, None
+
+    for delta in deltas:
+        raw.append(delta)
+        scanner.feed(delta)
+        yield from chunker.feed(scanner.take_spoken())
+
+    reply, booking_data = scanner.finish()
+    yield from chunker.feed(scanner.take_spoken())
+    tail = chunker.flush()
+    if tail:
+        yield tail
+
+    if booking_data is None:
+        # same contract as extract_booking_data: no booking → raw reply
+        reply = "".join(raw).strip()
+    answer_cache.store(assistant, probe, reply, booking_data, (time.perf_counter() - started) * 1000)
+    taken = _finish_turn(user_text, reply, booking_data, assistant, conversation_id)
+    if taken:
+        yield taken
+        return f"{reply} {taken}", None
+    return reply, booking_data
+
+
+def _race(assistant: Assistant, probe, stream):
+    """
+    Send the completion and finish the semantic lookup side by side, so a
+    miss never waits on the embedding. Returns (cached answer, None) on a
+    hit, else (None, the completion's deltas).
+    """
+    # the request goes out now and its first delta is awaited on a worker
+    first = _completions.submit(next, stream, None)
+    cached = answer_cache.match(assistant, probe)
+    if cached is not None:
+        # hang up once the request is under way (a generator can't be closed
+        # mid-next): the provider stops generating and bills no more output
+        first.add_done_callback(lambda _: stream.close())
+        return cached, None
+    head = first.result()
+    return None, itertools.chain(() if head is None else (head,), stream)
+
+
+def _sentences(chunker: SentenceChunker, text: str):
+    yield from chunker.feed(text)
+    tail = chunker.flush()
+    if tail:
+        yield tail
+
+
+def _finish_turn(user_text, reply, booking_data, assistant: Assistant, conversation_id: int) -> str | None:
+    """Save the turn and its booking. Returns what to tell the caller if the slot was taken."""
+    taken = None
 
     # 5) If booking_data present, parse and persist it
     if booking_data and "booking_confirmed" in booking_data:
@@ -47,13 +162,16 @@ def process_input(user_text: str, assistant: Assistant, conversation_id: int):
         customer_name = b.get("name", "Unknown")
         details       = b.get("details", "")
 
-        # your new DB-backed booking handler
-        handle_booking(
-            assistant_id=assistant.id,
+        booking_id, nearest = handle_booking(
+            assistant,
             date=date_obj,
             time=time_obj,
             customer_name=customer_name,
             details=details
         )
+        if booking_id is None:
+            taken = slot_taken_message(date_obj, time_obj, nearest)
 
-    return reply, booking_data
+    save_memory_entry(conversation_id, "user", user_text)
+    save_memory_entry(conversation_id, "assistant", f"{reply} {taken}" if taken else reply)
+    return taken
@@ -0,0 +1,162 @@
+# app/services/audio_out.py
+"""
+Paced outbound audio for one call.
+
+Realtime audio deltas arrive much faster than real time. Instead of pushing
+them straight into Twilio's playback buffer, OutboundAudio splits them into
+20 ms μ-law frames and sends them at playback pace, keeping only `lead_ms`
+queued at Twilio, so a `clear` on barge-in silences the assistant almost at
+once. A Twilio `mark` follows every few frames; when Twilio echoes a mark
+back, the playback clock is re-synced to what was really played. That
+gives conversation.item.truncate the true audio_end_ms of the interrupted
+item instead of a guess.
+"""
+import asyncio
+import base64
+import json
+import time
+from collections import deque
+
+from app.services import relay
+
+FRAME_BYTES = 160   # 20 ms of 8 kHz G.711 μ-law
+FRAME_MS    = 20
+
+
+class OutboundAudio:
+    def __init__(self, send, lead_ms: int = 60, mark_every: int = 5, on_send=None, tap=None):
+        self._send       = send          # async callable taking a text frame
+        self.lead        = lead_ms / 1000
+        self.mark_every  = mark_every
+        self.on_send     = on_send       # called after each frame goes out
+        self.tap         = tap           # tap(frame, play_at) for each frame sent
+        self.stream_sid  = None          # see property below
+
+        self._frames: deque = deque()    # (item_id, base64 frame) not yet sent
+        self._wakeup     = asyncio.Event()
+        self._task       = None
+
+        self._play_cursor = 0.0          # monotonic time all sent audio finishes playing
+        self._sent_total  = 0            # ms of audio sent during the call
+        self._sent_ms: dict[str, int] = {}   # item_id → ms of it sent
+        self._marks: dict[str, int] = {}     # pending mark name → _sent_total at the mark
+        self._current     = None         # item whose audio was sent last
+        self._mark_seq    = 0
+
+    @property
+    def stream_sid(self):
+        return self._stream_sid
+
+    @stream_sid.setter
+    def stream_sid(self, sid):
+        self._stream_sid = sid
+        self._media_prefix = relay.media_prefix(sid)   # serialized once per call
+
+    # ── lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # ── producer side ────────────────────────────────────────────────────────
+
+    def enqueue(self, item_id: str, delta: str):
+        """Queue one response.audio.delta (base64 μ-law) for paced playback."""
+        audio = base64.b64decode(delta)
+        for i in range(0, len(audio), FRAME_BYTES):
+            frame = base64.b64encode(audio[i:i + FRAME_BYTES]).decode()
+            self._frames.append((item_id, frame))
+        self._wakeup.set()
+
+    async def interrupt(self):
+        """
+        Drop unsent audio and clear Twilio's buffer. Returns (item_id,
+        played_ms) for the item that was cut off, or (None, 0) if nothing
+        was still playing.
+        """
+        item_id, played = None, 0
+        if self._current is not None:
+            sent = self._sent_ms.get(self._current, 0)
+            played = self.played_ms(self._current)
+            if played < sent or self._frames:
+                item_id = self._current
+
+        self._frames.clear()
+        self._marks.clear()   # Twilio echoes cleared marks back; ignore them
+        self._play_cursor = time.monotonic()
+        self._current = None
+        await self._send(json.dumps({"event": "clear", "streamSid": self.stream_sid}))
+        return item_id, played
+
+    def on_mark(self, name: str):
+        """Twilio has played everything up to the mark `name`."""
+        reached = self._marks.pop(name, None)
+        if reached is None:
+            return
+        # older marks are implied by this one
+        for older in [n for n, ms in self._marks.items() if ms <= reached]:
+            del self._marks[older]
+        buffered = (self._sent_total - reached) / 1000
+        self._play_cursor = time.monotonic() + buffered
+
+    def played_ms(self, item_id: str) -> int:
+        """How much of `item_id` the caller has actually heard."""
+        sent = self._sent_ms.get(item_id, 0)
+        if item_id != self._current:
+            return sent
+        buffered = max(0.0, self._play_cursor - time.monotonic()) * 1000
+        return int(sent - min(sent, buffered))
+
+    # ── pacer ────────────────────────────────────────────────────────────────
+
+    async def _run(self):
+        since_mark = 0
+        try:
+            while True:
+                if not self._frames:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                ahead = self._play_cursor - time.monotonic()
+                if ahead > self.lead:
+                    await asyncio.sleep(ahead - self.lead)
+                    continue  # re-check: an interrupt may have emptied the queue
+
+                item_id, frame = self._frames.popleft()
+                await self._send(relay.media_message(self._media_prefix, frame))
+                play_at = max(self._play_cursor, time.monotonic())
+                if self.tap:
+                    self.tap(frame, play_at)
+                self._play_cursor = play_at + FRAME_MS / 1000
+                self._sent_total += FRAME_MS
+                self._sent_ms[item_id] = self._sent_ms.get(item_id, 0) + FRAME_MS
+                self._current = item_id
+                if self.on_send:
+                    self.on_send()
+
+                since_mark += 1
+                if since_mark >= self.mark_every or not self._frames:
+                    since_mark = 0
+                    await self._mark()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in outbound audio pacer: {e}")
+
+    async def _mark(self):
+        self._mark_seq += 1
+        name = f"a{self._mark_seq}"
+        self._marks[name] = self._sent_total
+        await self._send(json.dumps({
+            "event": "mark",
+            "streamSid": self.stream_sid,
+            "mark": {"name": name},
+        }))
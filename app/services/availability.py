@@ -0,0 +1,345 @@
+# app/services/availability.py
+"""
+Slot availability as bitmaps.
+
+An assistant's bookable slots are the same every open day: start_time,
+start_time + duration, ... before end_time. SlotGrid holds that template
+once (minutes, "9:00 AM" and "09:00" labels). Availability is a date range
+of it as two numpy bool arrays shaped [day, slot]:
+
+  open    the weekday is in available_days
+  booked  a booking exists at exactly that slot's time
+
+loaded with one range query for all the bookings, so a 90-day range costs
+one query and a few array operations instead of a query, a slot list and
+strftime/strptime per day. Bookings at a time that isn't on the grid
+don't mark a slot, same as the per-day lookups they replace.
+
+availability_cache keeps the templates and each assistant's per-day
+booked rows in process, for the reads on every turn and every /api/slots
+hit; see AvailabilityCache.
+"""
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+
+from app.config import AVAILABILITY_CACHE_DAYS, BOOKING_SEARCH_DAYS
+from app.extensions import db
+from app.models import Booking
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+DEFAULT_DAYS = {d: i < 5 for i, d in enumerate(WEEKDAYS)}      # Mon–Fri
+
+
+def available_days(assistant) -> dict[str, bool]:
+    try:
+        return json.loads(assistant.available_days)
+    except (TypeError, ValueError):
+        return dict(DEFAULT_DAYS)
+
+
+def _minutes(hhmm: str) -> int:
+    h, m = map(int, hhmm.split(":"))
+    return h * 60 + m
+
+
+class SlotGrid:
+    """One assistant's daily slot template."""
+
+    def __init__(self, start_time: str, end_time: str, duration_minutes: int, days: dict[str, bool]):
+        self.start    = _minutes(start_time)
+        self.duration = duration_minutes or 0
+        end = _minutes(end_time)
+        self.size     = -(-(end - self.start) // self.duration) if self.duration > 0 and end > self.start else 0
+        self.minutes  = [self.start + i * self.duration for i in range(self.size)]
+        self.labels   = [f"{(m // 60 - 1) % 12 + 1}:{m % 60:02d} {'AM' if m < 720 else 'PM'}" for m in self.minutes]
+        self.hhmm     = [f"{m // 60:02d}:{m % 60:02d}" for m in self.minutes]
+        self.minute_array = np.array(self.minutes, dtype=np.int64)
+        self.weekdays = np.array([bool(days.get(d, False)) for d in WEEKDAYS])
+
+    @classmethod
+    def for_assistant(cls, assistant) -> "SlotGrid":
+        return cls(assistant.start_time, assistant.end_time, assistant.booking_duration_minutes,
+                   available_days(assistant))
+
+    def index(self, minute: int) -> int | None:
+        """Slot index for a minute of the day, if a slot starts exactly then."""
+        offset = minute - self.start
+        if self.duration <= 0 or offset < 0 or offset % self.duration:
+            return None
+        i = offset // self.duration
+        return i if i < self.size else None
+
+
+class Availability:
+    """Open/booked bitmaps for days start..end (inclusive) of one grid."""
+
+    def __init__(self, grid: SlotGrid, start: date, end: date, booked_at=(), booked: np.ndarray | None = None):
+        self.grid  = grid
+        self.start = start
+        self.days  = max((end - start).days + 1, 0)
+        weekday    = (start.weekday() + np.arange(self.days)) % 7
+        self.open_days = grid.weekdays[weekday]
+        self.open  = np.repeat(self.open_days[:, None], grid.size, axis=1)
+        self.booked = booked if booked is not None else np.zeros((self.days, grid.size), dtype=bool)
+        self.mark(booked_at)
+
+    def mark(self, booked_at):
+        """Set booked bits for (date, time) pairs; off-grid or out-of-range ones are ignored."""
+        pairs = list(booked_at)
+        if not pairs or not self.grid.size:
+            return
+        day = np.fromiter(((d - self.start).days for d, _ in pairs), dtype=np.int64, count=len(pairs))
+        minute = np.fromiter((t.hour * 60 + t.minute for _, t in pairs), dtype=np.int64, count=len(pairs))
+        offset = minute - self.grid.start
+        slot = offset // self.grid.duration
+        ok = ((day >= 0) & (day < self.days) & (offset >= 0)
+              & (offset % self.grid.duration == 0) & (slot < self.grid.size))
+        self.booked[day[ok], slot[ok]] = True
+
+    @property
+    def free(self) -> np.ndarray:
+        return self.open & ~self.booked
+
+    def day_date(self, i: int) -> date:
+        return self.start + timedelta(days=i)
+
+    def row(self, d: date) -> int | None:
+        i = (d - self.start).days
+        return i if 0 <= i < self.days else None
+
+    def free_labels(self, d: date) -> list[str]:
+        """Free slots on one day, "9:00 AM" style."""
+        i = self.row(d)
+        if i is None:
+            return []
+        labels = self.grid.labels
+        return [labels[j] for j in np.flatnonzero(self.free[i])]
+
+    def booked_labels(self, d: date) -> list[str]:
+        i = self.row(d)
+        if i is None:
+            return []
+        labels = self.grid.labels
+        return [labels[j] for j in np.flatnonzero(self.open[i] & self.booked[i])]
+
+    def nearest(self, when: datetime, k: int = 1, not_before: datetime | None = None) -> list[datetime]:
+        """The k free slots closest to `when` (earlier one first on a tie), none before `not_before`."""
+        if not self.grid.size or k <= 0:
+            return []
+        origin = datetime.combine(self.start, time())
+        minutes = (np.arange(self.days, dtype=np.int64) * 1440)[:, None] + self.grid.minute_array
+        ok = self.free
+        if not_before is not None:
+            ok = ok & (minutes >= (not_before - origin).total_seconds() / 60)
+        candidates = np.flatnonzero(ok)                  # ascending in time
+        at = minutes.ravel()[candidates]
+        distance = np.abs(at - (when - origin).total_seconds() / 60)
+        if k < len(candidates):
+            # only the k best need ordering; widen to every tie with the k-th
+            kth = np.partition(distance, k - 1)[k - 1]
+            keep = np.flatnonzero(distance <= kth)
+            at, distance = at[keep], distance[keep]
+        picked = at[np.argsort(distance, kind="stable")[:k]]
+        return [origin + timedelta(minutes=int(m)) for m in picked]
+
+    def by_day(self) -> dict[str, list[dict]]:
+        """{"YYYY-MM-DD": [{"time": "09:00", "is_booked": bool}, ...]} for every open day."""
+        hhmm = self.grid.hhmm
+        out = {}
+        for i in np.flatnonzero(self.open_days):
+            out[self.day_date(int(i)).isoformat()] = [
+                {"time": t, "is_booked": b} for t, b in zip(hhmm, self.booked[i].tolist())
+            ]
+        return out
+
+
+def nearest_free(assistant, when: datetime, k: int = 1, days: int = BOOKING_SEARCH_DAYS,
+                 cached: bool = False) -> list[datetime]:
+    """
+    The k free slots closest to `when` within `days` either side of it,
+    never in the past. One range query for the window, or the availability
+    cache with cached=True (reads; booking decisions go to the database).
+    """
+    now = datetime.now()
+    start = max(when.date() - timedelta(days=days), now.date())
+    end = when.date() + timedelta(days=days)
+    if end < start:
+        return []
+    if cached:
+        slots = availability_cache.load(assistant, start, end)
+    else:
+        slots = load(assistant, start, end, availability_cache.grid(assistant))
+    return slots.nearest(when, k, not_before=now)
+
+
+def spoken(at: datetime) -> str:
+    """A slot the way it's offered to callers: "2:30 PM on Tuesday, March 4"."""
+    return f"{at.strftime('%I:%M %p').lstrip('0')} on {at.strftime('%A, %B')} {at.day}"
+
+
+def load(assistant, start: date, end: date, grid: SlotGrid | None = None) -> Availability:
+    """Availability for start..end with every booking in the range from one query."""
+    rows = db.session.execute(
+        db.select(Booking.date, Booking.time)
+          .where(Booking.assistant_id == assistant.id, Booking.date >= start, Booking.date <= end)
+    ).all()
+    return Availability(grid or SlotGrid.for_assistant(assistant), start, end, rows)
+
+
+MAX_TEMPLATES = 1024
+
+
+class _Days:
+    """One assistant's cached booked rows, valid for one version pair."""
+    __slots__ = ("version", "grid", "rows")
+
+    def __init__(self, version: tuple[int, int], grid: SlotGrid):
+        self.version = version
+        self.grid = grid
+        self.rows: dict[date, np.ndarray] = {}
+
+
+def _version(assistant) -> tuple[int, int]:
+    return assistant.config_version or 0, assistant.bookings_version or 0
+
+
+class AvailabilityCache:
+    """
+    In-process cache for slot reads (prompt builds, /api/slots).
+
+    Templates: one SlotGrid per (start_time, end_time, duration,
+    available_days), shared by every assistant with the same hours.
+
+    Days: each assistant's booked bitmap per date, served while the
+    assistant row's (config_version, bookings_version) is the one they were
+    loaded under. handle_booking bumps bookings_version in the booking's
+    transaction and then sets the bit here (mark_booked), so this worker
+    keeps its hits; a booking or config change made by another worker shows
+    up as a version this one hasn't seen and the days are reloaded. Missing
+    days of a range come from one range query. At most max_days rows are
+    kept, least recently read assistant evicted first; 0 turns it off.
+    """
+
+    def __init__(self, max_days: int = 100_000):
+        self.max_days = max_days
+        self._grids: dict[tuple, SlotGrid] = {}
+        self._assistants: OrderedDict[int, _Days] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.counters = {
+            "template_hits": 0, "template_misses": 0,
+            "day_hits": 0, "day_misses": 0, "stale": 0,
+            "write_throughs": 0, "invalidations": 0, "evictions": 0,
+        }
+
+    def grid(self, assistant) -> SlotGrid:
+        """The assistant's SlotGrid, built once per distinct set of hours."""
+        key = (assistant.start_time, assistant.end_time, assistant.booking_duration_minutes,
+               assistant.available_days)
+        with self._lock:
+            grid = self._grids.get(key)
+            self.counters["template_hits" if grid is not None else "template_misses"] += 1
+        if grid is not None:
+            return grid
+        grid = SlotGrid.for_assistant(assistant)
+        if self.max_days > 0:
+            with self._lock:
+                if len(self._grids) >= MAX_TEMPLATES:
+                    self._grids.clear()
+                self._grids[key] = grid
+        return grid
+
+    def load(self, assistant, start: date, end: date) -> Availability:
+        """Same as availability.load(), with cached days served from memory."""
+        grid = self.grid(assistant)
+        if self.max_days <= 0:
+            return load(assistant, start, end, grid)
+        version = _version(assistant)
+        days = [start + timedelta(days=i) for i in range(max((end - start).days + 1, 0))]
+        with self._lock:
+            cached = self._current(assistant.id, version, grid)
+            rows = [cached.rows.get(d) for d in days]
+            missing = [d for d, r in zip(days, rows) if r is None]
+            self.counters["day_hits"] += len(days) - len(missing)
+            self.counters["day_misses"] += len(missing)
+
+        if missing:
+            fresh = load(assistant, missing[0], missing[-1], grid)
+            for i, d in enumerate(days):
+                if rows[i] is None:
+                    rows[i] = fresh.booked[fresh.row(d)].copy()
+            with self._lock:
+                # not if a booking or invalidation landed while we were reading
+                if self._assistants.get(assistant.id) is cached and cached.version == version:
+                    for d, r in zip(days, rows):
+                        if d not in cached.rows:
+                            cached.rows[d] = r
+                            self._size += 1
+                    self._evict()
+
+        booked = np.stack(rows) if rows else np.zeros((0, grid.size), dtype=bool)
+        return Availability(grid, start, end, booked=booked)
+
+    def mark_booked(self, assistant_id: int, day: date, at: time, version: tuple[int, int]):
+        """A booking this worker just committed; `version` is the assistant's after it."""
+        with self._lock:
+            cached = self._assistants.get(assistant_id)
+            if cached is None:
+                return
+            if cached.version != (version[0], version[1] - 1):
+                self._drop(assistant_id)          # missed another worker's booking
+                self.counters["invalidations"] += 1
+                return
+            cached.version = version
+            row = cached.rows.get(day)
+            i = cached.grid.index(at.hour * 60 + at.minute)
+            if row is not None and i is not None:
+                row[i] = True
+            self.counters["write_throughs"] += 1
+
+    def invalidate(self, assistant_id: int):
+        with self._lock:
+            if self._drop(assistant_id):
+                self.counters["invalidations"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            c["templates"] = len(self._grids)
+            c["assistants"] = len(self._assistants)
+            c["days"] = self._size
+        reads = c["day_hits"] + c["day_misses"]
+        c["hit_ratio"] = c["day_hits"] / reads if reads else 0.0
+        return c
+
+    # ── internals (lock held) ────────────────────────────────────────────────
+
+    def _current(self, assistant_id: int, version: tuple[int, int], grid: SlotGrid) -> _Days:
+        cached = self._assistants.get(assistant_id)
+        if cached is None or cached.version != version or cached.grid is not grid:
+            if cached is not None:
+                self.counters["stale"] += 1
+                self._size -= len(cached.rows)
+            cached = self._assistants[assistant_id] = _Days(version, grid)
+        self._assistants.move_to_end(assistant_id)
+        return cached
+
+    def _drop(self, assistant_id: int) -> bool:
+        cached = self._assistants.pop(assistant_id, None)
+        if cached is None:
+            return False
+        self._size -= len(cached.rows)
+        return True
+
+    def _evict(self):
+        while self._size > self.max_days and len(self._assistants) > 1:
+            _, cached = self._assistants.popitem(last=False)
+            self._size -= len(cached.rows)
+            self.counters["evictions"] += 1
+
+
+availability_cache = AvailabilityCache(AVAILABILITY_CACHE_DAYS)
@@ -1,29 +1,76 @@
 import os
 import json
 from datetime import datetime, date, time, timedelta
-from app.models import Booking
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Assistant, Booking
 from app.extensions import db
+from app.services import availability
 
 def load_booked_slots(assistant_id: int, date: datetime.date):
     """Return a dict of slot-strings → Booking rows for that assistant & date."""
     rows = Booking.query.filter_by(assistant_id=assistant_id, date=date).all()
     return {row.time.strftime("%I:%M %p").lstrip("0"): row for row in rows}
 
-def handle_booking(assistant_id: int, date: datetime.date, time: datetime.time,
-                  customer_name: str, details: str):
-    """Persist a new booking to the database."""
-    booking = Booking(
-        assistant_id=assistant_id, 
-        date=date, 
-        time=time,
-        customer_name=customer_name, 
-        details=details
-    )
-    print(f"Booking: {booking}")
-    db.session.add(booking)
+def handle_booking(assistant, date: datetime.date, time: datetime.time,
+                   customer_name: str, details: str) -> tuple[int | None, datetime | None]:
+    """
+    Book a slot. Returns (booking id, None), or (None, nearest free slot)
+    when another caller already has it (nearest is None if nothing is free).
+
+    uq_booking_slot allows one booking per (assistant, date, time): the
+    insert itself reports the conflict (ON CONFLICT DO NOTHING returns no
+    row; IntegrityError elsewhere), so two callers confirming the same slot
+    at once can't both get it. The nearest free slot is looked up in the
+    same transaction, after the conflict.
+
+    A booking bumps the assistant's bookings_version in its transaction,
+    which retires every worker's cached days for the assistant; this
+    worker's cache gets the new slot written through instead.
+    """
+    row = dict(assistant_id=assistant.id, date=date, time=time,
+               customer_name=customer_name, details=details)
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(Booking).values(**row)
+        booking_id = db.session.execute(
+            insert.on_conflict_do_nothing(index_elements=["assistant_id", "date", "time"])
+                  .returning(Booking.id)
+        ).scalar()
+    else:
+        try:
+            with db.session.begin_nested():
+                booking = Booking(**row)
+                db.session.add(booking)
+            booking_id = booking.id
+        except IntegrityError:
+            booking_id = None
+
+    if booking_id is not None:
+        (Assistant.query
+                  .filter_by(id=assistant.id)
+                  .update({"bookings_version": Assistant.bookings_version + 1}, synchronize_session=False))
+        version = db.session.execute(
+            db.select(Assistant.config_version, Assistant.bookings_version).filter_by(id=assistant.id)
+        ).one()
+        db.session.commit()
+        availability.availability_cache.mark_booked(assistant.id, date, time, tuple(version))
+        print(f"Booking saved: {customer_name} on {date} at {time}")
+        return booking_id, None
+
+    nearest = availability.nearest_free(assistant, datetime.combine(date, time))
     db.session.commit()
-    print(f"Booking saved: {customer_name} on {date} at {time}")
-    return booking
+    print(f"Booking conflict: {date} at {time} is taken; nearest free {nearest[0] if nearest else None}")
+    return None, nearest[0] if nearest else None
+
+def slot_taken_message(date_obj, time_obj, nearest: datetime | None) -> str:
+    """What the caller hears when the slot they confirmed went to someone else."""
+    asked = availability.spoken(datetime.combine(date_obj, time_obj))
+    if nearest is None:
+        return f"I'm sorry, {asked} was just taken by another caller, and I can't see a free slot near it."
+    return (f"I'm sorry, {asked} was just taken by another caller. "
+            f"The nearest free slot is {availability.spoken(nearest)}. Would that work?")
 
 def generate_time_slots(
     start_time_24: str,
@@ -0,0 +1,340 @@
+# app/services/history.py
+"""
+Token-budgeted conversation history with a rolling summary.
+
+Conversations are keyed on (assistant, caller_number) and never end, so a
+repeat caller's history grows with every call. Instead of every Message
+row, a call (or text turn) gets:
+  - Conversation.summary: a rolling summary of every message up to
+    Conversation.summary_through
+  - the newest messages after that, verbatim, as many as fit in
+    HISTORY_TOKEN_BUDGET (and at most HISTORY_MAX_MESSAGES)
+
+When unsummarized messages no longer fit, load_history hands the
+conversation to the summarizer thread and returns right away; the
+summarizer folds the older messages into the summary with one LLM call per
+HISTORY_FOLD_BATCH messages, leaving half the budget verbatim so the next
+fold is a while off. Until a fold lands, the messages it covers are simply
+left out. Folds commit with a compare-and-set on summary_through, so two
+workers folding the same conversation can't both apply.
+
+That window is also kept in an in-process LRU (HistoryCache), so a call
+start or text turn usually needs only the Conversation row. Every Message
+insert bumps Conversation.message_count in the same transaction
+(save_memory_entry, and the write-behind hook below for the realtime path),
+so (message_count, summary_through) versions the window: a cached window
+is only used while both still match the row, whichever worker wrote last.
+save_memory_entry appends to the cached window instead of dropping it.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+from app.config import (
+    HISTORY_TOKEN_BUDGET, HISTORY_MAX_MESSAGES, HISTORY_SUMMARY_WORDS, HISTORY_FOLD_BATCH, HISTORY_CACHE_CHARS
+)
+from app.extensions import db
+from app.models import Conversation, Message
+from app.services.llm import query_openrouter
+from app.services.write_behind import write_behind
+
+CHARS_PER_TOKEN = 4       # rough, for English
+MESSAGE_OVERHEAD = 4      # role + framing tokens per chat message
+
+SUMMARY_PROMPT = """
+You keep the memory of a phone receptionist's conversations with one caller.
+Update the summary with the new messages. Keep what matters on the next call:
+the caller's name and contact details, bookings made or cancelled (dates and
+times), preferences, complaints and open questions. Drop greetings and small
+talk. Write at most {words} words of plain text and reply with the summary only.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD
+
+
+def _newest_within(contents: list[str], budget: int, max_messages: int) -> int:
+    """How many of `contents` (newest first) fit in `budget` tokens."""
+    used = 0
+    for n, content in enumerate(contents[:max_messages]):
+        used += estimate_tokens(content)
+        if used > budget:
+            return n
+    return min(len(contents), max_messages)
+
+
+def load_history(conversation_id: int) -> tuple[str | None, list[dict]]:
+    """(summary, recent messages oldest first) for the prompt."""
+    # fresh row every time: its message_count is what validates the cache
+    convo = db.session.get(Conversation, conversation_id, populate_existing=True)
+    summary, through = (convo.summary, convo.summary_through or 0) if convo else (None, 0)
+
+    window = history_cache.get(conversation_id, convo.message_count, through) if convo else None
+    if window is None:
+        rows = (
+            Message.query
+                   .filter(Message.conversation_id == conversation_id, Message.id > through)
+                   .order_by(Message.id.desc())
+                   .limit(HISTORY_MAX_MESSAGES + 1)
+                   .all()
+        )
+        window = [{"role": m.role, "content": m.content} for m in reversed(rows)]
+        if convo:
+            history_cache.put(conversation_id, convo.message_count, through, window)
+
+    keep = _newest_within([m["content"] for m in reversed(window)], HISTORY_TOKEN_BUDGET, HISTORY_MAX_MESSAGES)
+    if keep < len(window):
+        summarizer.schedule(conversation_id)
+
+    return summary, window[len(window) - keep:]
+
+
+def bump_message_count(conversation_id: int, n: int = 1):
+    """Call in the transaction that inserts `n` messages; invalidates every worker's cached window."""
+    (Conversation.query
+                 .filter_by(id=conversation_id)
+                 .update({"message_count": Conversation.message_count + n}, synchronize_session=False))
+
+
+def _count_queued_messages(rows: list[dict]):
+    """write-behind hook for Message batches from the realtime path."""
+    per_conversation: dict = {}
+    for r in rows:
+        per_conversation[r["conversation_id"]] = per_conversation.get(r["conversation_id"], 0) + 1
+    for conversation_id, n in per_conversation.items():
+        bump_message_count(conversation_id, n)
+        history_cache.invalidate(conversation_id)
+
+
+write_behind.on_insert(Message, _count_queued_messages)
+
+
+def history_json(summary: str | None, messages: list[dict]) -> str:
+    """The history as it goes into the system prompt."""
+    if summary:
+        messages = [{"role": "summary", "content": summary}, *messages]
+    return json.dumps(messages, ensure_ascii=False)
+
+
+class _Window:
+    __slots__ = ("count", "through", "messages", "chars")
+
+    def __init__(self, count, through, messages):
+        self.count    = count
+        self.through  = through
+        self.messages = messages         # oldest first, at most HISTORY_MAX_MESSAGES + 1
+        self.chars    = sum(len(m["content"]) for m in messages)
+
+
+class HistoryCache:
+    """LRU of per-conversation history windows, bounded by total characters."""
+
+    def __init__(self, max_chars: int = 8_000_000, window: int = 41):
+        self.max_chars = max_chars
+        self.window    = window
+        self._windows: OrderedDict[int, _Window] = OrderedDict()
+        self._chars = 0
+        self._lock  = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stale": 0, "appends": 0,
+                         "append_conflicts": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, conversation_id: int, count: int, through: int) -> list[dict] | None:
+        """The cached window if it is still at this (message_count, summary_through)."""
+        with self._lock:
+            w = self._windows.get(conversation_id)
+            if w is None:
+                self.counters["misses"] += 1
+                return None
+            if w.count != count or w.through != through:
+                self.counters["stale"] += 1      # another worker wrote, or a fold landed
+                self._drop(conversation_id)
+                return None
+            self._windows.move_to_end(conversation_id)
+            self.counters["hits"] += 1
+            return list(w.messages)
+
+    def put(self, conversation_id: int, count: int, through: int, messages: list[dict]):
+        if self.max_chars <= 0:
+            return
+        with self._lock:
+            self._drop(conversation_id)
+            w = self._windows[conversation_id] = _Window(count, through, list(messages))
+            self._chars += w.chars
+            self._evict()
+
+    def append(self, conversation_id: int, role: str, content: str, count: int):
+        """
+        Write-through for one message just committed, which took the
+        conversation to `count`. Only applies on top of the window at
+        count - 1; anything else means we missed a write, so drop it.
+        """
+        with self._lock:
+            w = self._windows.get(conversation_id)
+            if w is None:
+                return
+            if w.count != count - 1:
+                self.counters["append_conflicts"] += 1
+                self._drop(conversation_id)
+                return
+            w.messages.append({"role": role, "content": content})
+            w.chars += len(content)
+            self._chars += len(content)
+            while len(w.messages) > self.window:
+                dropped = len(w.messages.pop(0)["content"])
+                w.chars -= dropped
+                self._chars -= dropped
+            w.count = count
+            self._windows.move_to_end(conversation_id)
+            self.counters["appends"] += 1
+            self._evict()
+
+    def invalidate(self, conversation_id: int):
+        with self._lock:
+            if self._drop(conversation_id):
+                self.counters["invalidations"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            c["entries"], c["chars"] = len(self._windows), self._chars
+        looked_up = c["hits"] + c["misses"] + c["stale"]
+        c["hit_ratio"] = round(c["hits"] / looked_up, 4) if looked_up else 0
+        return c
+
+    def _drop(self, conversation_id: int) -> bool:
+        w = self._windows.pop(conversation_id, None)
+        if w is None:
+            return False
+        self._chars -= w.chars
+        return True
+
+    def _evict(self):
+        while self._chars > self.max_chars and self._windows:
+            _, w = self._windows.popitem(last=False)
+            self._chars -= w.chars
+            self.counters["evictions"] += 1
+
+
+history_cache = HistoryCache(HISTORY_CACHE_CHARS, HISTORY_MAX_MESSAGES + 1)
+
+
+class Summarizer:
+    def __init__(self):
+        self._app     = None
+        self._thread  = None
+        self._pending = deque()          # conversation ids, each at most once
+        self._queued  = set()
+        self._busy    = False
+        self._cond    = threading.Condition()
+        self.counters = {"scheduled": 0, "folds": 0, "folded_messages": 0, "failures": 0, "conflicts": 0}
+        self.last_fold_ms = 0.0
+
+    def init_app(self, app):
+        self._app = app
+        app.extensions["summarizer"] = self
+
+    def schedule(self, conversation_id: int):
+        """Queue a fold for this conversation; never blocks."""
+        if self._app is None:
+            return
+        with self._cond:
+            if conversation_id in self._queued:
+                return
+            self._queued.add(conversation_id)
+            self._pending.append(conversation_id)
+            self.counters["scheduled"] += 1
+            self._cond.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-summarizer", daemon=True)
+                self._thread.start()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait until every scheduled fold has finished. False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            depth = len(self._pending)
+        return {**self.counters, "queue_depth": depth, "last_fold_ms": self.last_fold_ms}
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._pending)
+                    conversation_id = self._pending.popleft()
+                    self._busy = True
+                try:
+                    self.fold(conversation_id)
+                except Exception as e:
+                    db.session.rollback()
+                    self.counters["failures"] += 1
+                    print(f"history: summarizing conversation {conversation_id} failed: {e}")
+                finally:
+                    db.session.remove()
+                    with self._cond:
+                        self._queued.discard(conversation_id)
+                        self._busy = False
+                        self._cond.notify_all()
+
+    def fold(self, conversation_id: int):
+        """Fold everything older than half the budget's worth of newest messages."""
+        convo = db.session.get(Conversation, conversation_id)
+        if convo is None:
+            return
+        summary, through = convo.summary, convo.summary_through or 0
+
+        newest = (
+            Message.query
+                   .filter(Message.conversation_id == conversation_id, Message.id > through)
+                   .order_by(Message.id.desc())
+                   .limit(HISTORY_MAX_MESSAGES)
+                   .all()
+        )
+        keep = _newest_within([m.content for m in newest], HISTORY_TOKEN_BUDGET // 2, HISTORY_MAX_MESSAGES // 2)
+        if keep == 0 and newest:
+            keep = 1                     # always leave the last message verbatim
+        keep_from = newest[keep - 1].id if keep else None
+
+        while True:
+            q = Message.query.filter(Message.conversation_id == conversation_id, Message.id > through)
+            if keep_from is not None:
+                q = q.filter(Message.id < keep_from)
+            batch = q.order_by(Message.id).limit(HISTORY_FOLD_BATCH).all()
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            summary = self._summarize(convo, summary, batch)
+            updated = (
+                Conversation.query
+                            .filter(Conversation.id == conversation_id,
+                                    db.func.coalesce(Conversation.summary_through, 0) == through)
+                            .update({"summary": summary, "summary_through": batch[-1].id},
+                                    synchronize_session=False)
+            )
+            db.session.commit()
+            history_cache.invalidate(conversation_id)
+            if not updated:
+                self.counters["conflicts"] += 1    # another worker folded first
+                return
+            self.last_fold_ms = (time.perf_counter() - started) * 1000
+            self.counters["folds"] += 1
+            self.counters["folded_messages"] += len(batch)
+            through = batch[-1].id
+
+    def _summarize(self, convo, summary: str | None, batch) -> str:
+        transcript = "\n".join(f"{m.role}: {m.content}" for m in batch)
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=HISTORY_SUMMARY_WORDS)},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none yet)'}\n\n"
+                                        f"New messages:\n{transcript}"},
+        ]
+        return query_openrouter(messages, temperature=0.2, assistant_id=convo.assistant_id,
+                                conversation_id=convo.id, source="summary")
+
+
+summarizer = Summarizer()
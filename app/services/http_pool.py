@@ -0,0 +1,259 @@
+# app/services/http_pool.py
+"""
+One shared, pooled HTTP client for outbound provider calls (OpenRouter,
+OpenAI embeddings, Google userinfo).
+
+Module-level requests.post() opens a new TCP + TLS connection per call.
+HttpPool keeps one httpx.Client for the whole process instead:
+  - keep-alive connections pooled per host, HTTP/2 when the h2 package is
+    installed and the server offers it (many requests, one connection)
+  - at most `max_per_host` requests in flight per host; further callers
+    wait for a slot (they count as `waits` in stats)
+  - 429 / 5xx and connection failures are retried with full-jitter
+    exponential backoff, honouring Retry-After (a request can narrow the
+    retried statuses with extensions={"retry_status": {...}}, e.g. to see
+    its 429s and pace itself)
+  - every call can carry a `deadline` (seconds): timeouts, slot waits and
+    retries all fit inside it, and a retry that wouldn't fit isn't tried
+
+The cap, retries and statistics live in the transport, so the OpenAI SDK
+gets them too when it is handed `http_pool.client`.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from app.config import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_PER_HOST, HTTP_RETRIES, HTTP_KEEPALIVE_EXPIRY, HTTP_TIMEOUT
+)
+
+try:
+    import h2  # noqa: F401  (httpx only needs it importable)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class _HostStats:
+    __slots__ = ("requests", "retries", "failures", "waits", "in_flight",
+                 "connections_opened", "http2_responses", "semaphore")
+
+    def __init__(self, limit: int):
+        self.requests = self.retries = self.failures = self.waits = 0
+        self.in_flight = self.connections_opened = self.http2_responses = 0
+        self.semaphore = threading.BoundedSemaphore(limit)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that gives the host slot back once it is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class PooledTransport(httpx.BaseTransport):
+    def __init__(self, max_per_host: int = 16, retries: int = 3, backoff: float = 0.25,
+                 backoff_max: float = 4.0, http2: bool = HTTP2, verify=True,
+                 limits: httpx.Limits | None = None):
+        self.max_per_host = max_per_host
+        self.retries      = retries
+        self.backoff      = backoff
+        self.backoff_max  = backoff_max
+        self.http2        = http2
+        self._inner = httpx.HTTPTransport(http2=http2, verify=verify,
+                                          limits=limits or httpx.Limits())
+        self._hosts: dict[str, _HostStats] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> _HostStats:
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                stats = self._hosts[host] = _HostStats(self.max_per_host)
+            return stats
+
+    def _count(self, stats: _HostStats, field: str, n: int = 1):
+        with self._lock:
+            setattr(stats, field, getattr(stats, field) + n)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._host(request.url.host)
+        deadline = request.extensions.get("deadline")   # absolute, time.monotonic()
+        retry_status = request.extensions.get("retry_status", RETRY_STATUS)
+        self._count(stats, "requests")
+
+        # count handshakes: reuse = requests - connections_opened
+        trace = request.extensions.get("trace")
+        def on_trace(event, info):
+            if event == "connection.connect_tcp.complete":
+                self._count(stats, "connections_opened")
+            if trace:
+                trace(event, info)
+        request.extensions["trace"] = on_trace
+
+        attempt = 0
+        while True:
+            self._acquire(stats, deadline)
+            released = False
+            def release():
+                nonlocal released
+                if not released:
+                    released = True
+                    self._count(stats, "in_flight", -1)
+                    stats.semaphore.release()
+
+            try:
+                response = self._inner.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError):
+                release()
+                delay = self._delay(attempt, None)
+                if not self._may_retry(attempt, delay, deadline):
+                    self._count(stats, "failures")
+                    raise
+            except Exception:
+                release()
+                self._count(stats, "failures")
+                raise
+            else:
+                if response.status_code not in retry_status:
+                    if response.extensions.get("http_version") == b"HTTP/2":
+                        self._count(stats, "http2_responses")
+                    return httpx.Response(
+                        response.status_code,
+                        headers=response.headers,
+                        stream=_ReleasingStream(response.stream, release),
+                        extensions=response.extensions,
+                    )
+                delay = self._delay(attempt, response.headers.get("Retry-After"))
+                if not self._may_retry(attempt, delay, deadline):
+                    self._count(stats, "failures")
+                    return httpx.Response(
+                        response.status_code,
+                        headers=response.headers,
+                        stream=_ReleasingStream(response.stream, release),
+                        extensions=response.extensions,
+                    )
+                response.read()
+                response.close()
+                release()
+
+            self._count(stats, "retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def _acquire(self, stats: _HostStats, deadline):
+        if not stats.semaphore.acquire(blocking=False):
+            self._count(stats, "waits")
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not stats.semaphore.acquire(timeout=timeout):
+                self._count(stats, "failures")
+                raise httpx.PoolTimeout("per-host concurrency cap: no slot before the deadline")
+        self._count(stats, "in_flight")
+
+    def _delay(self, attempt: int, retry_after) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass  # HTTP-date form: fall back to our own backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def _may_retry(self, attempt: int, delay: float, deadline) -> bool:
+        if attempt >= self.retries:
+            return False
+        return deadline is None or time.monotonic() + delay < deadline
+
+    def close(self):
+        self._inner.close()
+
+    def stats(self) -> dict:
+        pool = self._inner._pool
+        with self._lock:
+            hosts = {
+                host: {
+                    "requests": s.requests, "retries": s.retries, "failures": s.failures,
+                    "waits": s.waits, "in_flight": s.in_flight,
+                    "connections_opened": s.connections_opened,
+                    "http2_responses": s.http2_responses,
+                }
+                for host, s in self._hosts.items()
+            }
+        return {
+            "http2_enabled": self.http2,
+            "open_connections": len(pool.connections),
+            "idle_connections": sum(c.is_idle() for c in pool.connections),
+            "hosts": hosts,
+        }
+
+
+class HttpPool:
+    def __init__(self, timeout: float = 30.0, **transport_options):
+        self.timeout = timeout
+        self.transport = PooledTransport(**transport_options)
+        self.client = httpx.Client(transport=self.transport, timeout=timeout)
+
+    def request(self, method: str, url: str, *, deadline: float | None = None, **kwargs) -> httpx.Response:
+        """One request; `deadline` is the total budget in seconds, retries included."""
+        return self.client.request(method, url, **self._with_deadline(deadline, kwargs))
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, url: str, *, deadline: float | None = None, **kwargs):
+        """
+        Streaming request. `deadline` covers getting the response headers;
+        after that each read only has to finish within the read timeout.
+        """
+        with self.client.stream(method, url, **self._with_deadline(deadline, kwargs)) as r:
+            yield r
+
+    def _with_deadline(self, deadline, kwargs: dict) -> dict:
+        if deadline is None:
+            return kwargs
+        kwargs.setdefault("timeout", min(deadline, self.timeout))
+        extensions = dict(kwargs.pop("extensions", None) or {})
+        extensions["deadline"] = time.monotonic() + deadline
+        kwargs["extensions"] = extensions
+        return kwargs
+
+    def stats(self) -> dict:
+        return self.transport.stats()
+
+    def metrics(self) -> dict:
+        """Flat totals for /metrics."""
+        s = self.stats()
+        totals = {"open_connections": s["open_connections"], "idle_connections": s["idle_connections"]}
+        totals.update(dict.fromkeys(_HostStats.__slots__[:-1], 0))
+        for host in s["hosts"].values():
+            for k, v in host.items():
+                totals[k] = totals.get(k, 0) + v
+        return totals
+
+
+http_pool = HttpPool(
+    timeout=HTTP_TIMEOUT,
+    max_per_host=HTTP_MAX_PER_HOST,
+    retries=HTTP_RETRIES,
+    limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+)
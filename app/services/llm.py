@@ -1,8 +1,16 @@
 import os
-import requests
+import json
+import time
 from app.config import OPENROUTER_API_KEY, OPENROUTER_URL, MODEL_ID
+from app.services.http_pool import http_pool
+from app.services import usage
 
-def query_openrouter(messages, model='google/gemini-2.0-flash-001', temperature=0.7):
+def query_openrouter(messages, model='google/gemini-2.0-flash-001', temperature=0.7,
+                     assistant_id=None, conversation_id=None, source="chat"):
+    """
+    One chat completion. Pass assistant_id / conversation_id to have its
+    tokens, cost and latency accounted to them.
+    """
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
@@ -10,8 +18,60 @@ def query_openrouter(messages, model='google/gemini-2.0-flash-001', temperature=
     payload = {
         "model": model,
         "messages": messages,
-        "temperature": temperature
+        "temperature": temperature,
+        "usage": {"include": True}   # OpenRouter adds the billed cost
     }
-    r = requests.post(OPENROUTER_URL, json=payload, headers=headers, timeout=15)
+    started = time.perf_counter()
+    r = http_pool.post(OPENROUTER_URL, json=payload, headers=headers, deadline=15)
     r.raise_for_status()
-    return r.json()["choices"][0]["message"]["content"].strip()
\ No newline at end of file
+    data = r.json()
+    usage.record(data.get("usage"), assistant_id=assistant_id, conversation_id=conversation_id,
+                 source=source, model=data.get("model", model),
+                 latency_ms=(time.perf_counter() - started) * 1000)
+    return data["choices"][0]["message"]["content"].strip()
+
+
+def stream_openrouter(messages, model='google/gemini-2.0-flash-001', temperature=0.7,
+                      assistant_id=None, conversation_id=None, source="chat"):
+    """
+    Same request as query_openrouter with `stream: true`; yields the content
+    deltas as OpenRouter's server-sent events arrive.
+    """
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "stream": True,
+        "stream_options": {"include_usage": True},  # usage arrives in the last chunk
+        "usage": {"include": True}
+    }
+    started = time.perf_counter()
+    first_token = None
+    with http_pool.stream("POST", OPENROUTER_URL, json=payload, headers=headers, deadline=15) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line.startswith("data:"):
+                continue  # blank separators and ": OPENROUTER PROCESSING" keep-alives
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            event = json.loads(data)
+            if "error" in event:
+                raise RuntimeError(f"OpenRouter stream error: {event['error']}")
+            if event.get("usage"):
+                now = time.perf_counter()
+                usage.record(event["usage"], assistant_id=assistant_id, conversation_id=conversation_id,
+                             source=source, model=event.get("model", model),
+                             latency_ms=(now - started) * 1000,
+                             ttfb_ms=None if first_token is None else (first_token - started) * 1000)
+            if not event.get("choices"):
+                continue
+            delta = event["choices"][0].get("delta", {}).get("content")
+            if delta:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                yield delta
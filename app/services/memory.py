@@ -1,14 +1,16 @@
 import os
 import json
-from app.models import Message
+from app.models import Conversation, Message
 from app.extensions import db
+from app.services.write_behind import write_behind
+from app.services.history import bump_message_count, history_cache
 
 def load_memory(conversation_id: int) -> list[dict]:
     """Load conversation history from database."""
     rows = (
         Message.query
                .filter_by(conversation_id=conversation_id)
-               .order_by(Message.created_at)
+               .order_by(Message.id)   # insertion order; served by ix_message_conversation_id
                .all()
     )
     return [{"role": m.role, "content": m.content} for m in rows]
@@ -21,5 +23,17 @@ def save_memory_entry(conversation_id: int, role: str, content: str):
         content=content
     )
     db.session.add(msg)
+    bump_message_count(conversation_id)
+    count = db.session.scalar(db.select(Conversation.message_count).filter_by(id=conversation_id))
     db.session.commit()
+    history_cache.append(conversation_id, role, content, count)   # write-through
     return msg
+
+def queue_memory_entry(conversation_id: int, role: str, content: str):
+    """Queue a message for write-behind persistence (non-blocking; realtime path)."""
+    write_behind.put(
+        Message,
+        conversation_id=conversation_id,
+        role=role,
+        content=content
+    )
@@ -0,0 +1,167 @@
+# app/services/metrics.py
+"""
+In-process call metrics: a per-call event timeline plus Prometheus-style
+histograms aggregated across calls, rendered by /metrics.
+
+Metrics are per worker process; scrape every worker (or sum in Prometheus).
+"""
+import threading
+import time
+from collections import deque
+
+# seconds; tuned for voice latencies (tens of ms … a few s)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    self._counts[i] += 1
+                    break
+
+    def render(self) -> list[str]:
+        with self._lock:
+            counts, total, n = list(self._counts), self._sum, self._count
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for upper, c in zip(self.buckets, counts):
+            cumulative += c
+            lines.append(f'{self.name}_bucket{{le="{upper}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {n}')
+        lines.append(f"{self.name}_sum {total:.6f}")
+        lines.append(f"{self.name}_count {n}")
+        return lines
+
+
+turn_latency = Histogram(
+    "call_turn_latency_seconds",
+    "Caller speech stopped to first assistant audio frame sent to Twilio.")
+barge_in_reaction = Histogram(
+    "call_barge_in_reaction_seconds",
+    "Caller started talking over the assistant to Twilio playback cleared.")
+upstream_connect = Histogram(
+    "call_upstream_connect_seconds",
+    "Realtime session connected and configured (or pre-warmed one claimed).")
+first_audio = Histogram(
+    "call_first_audio_seconds",
+    "Twilio stream start to first assistant audio frame sent to Twilio.")
+
+prompt_build = Histogram(
+    "prompt_build_seconds",
+    "System prompt built (cached static prefix + slots/history tail).",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+HISTOGRAMS = [turn_latency, barge_in_reaction, upstream_connect, first_audio, prompt_build]
+
+# prompt caching: our prefix memo, and what the providers report as cached
+prompt_cache = {
+    "prefix_hits": 0, "prefix_misses": 0,
+    "input_tokens": 0, "cached_tokens": 0,
+}
+_prompt_cache_lock = threading.Lock()
+
+
+def record_prompt_usage(usage: dict | None):
+    """
+    Add one response's token usage to prompt_cache. Understands both the
+    Realtime shape (input_tokens / input_token_details.cached_tokens) and
+    the chat-completions one (prompt_tokens / prompt_tokens_details).
+    """
+    if not usage:
+        return
+    if "input_tokens" in usage:
+        total = usage.get("input_tokens") or 0
+        cached = (usage.get("input_token_details") or {}).get("cached_tokens") or 0
+    else:
+        total = usage.get("prompt_tokens") or 0
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    with _prompt_cache_lock:
+        prompt_cache["input_tokens"] += total
+        prompt_cache["cached_tokens"] += cached
+
+
+def prompt_cache_metrics() -> dict:
+    with _prompt_cache_lock:
+        out = dict(prompt_cache)
+    out["provider_hit_ratio"] = round(out["cached_tokens"] / out["input_tokens"], 4) if out["input_tokens"] else 0
+    return out
+
+# finished call timelines, newest last, for ad-hoc inspection
+recent_calls: deque = deque(maxlen=100)
+
+
+class CallTimeline:
+    """Ordered (event, ms since call start) marks for one call."""
+
+    MAX_EVENTS = 2000
+
+    def __init__(self, conversation_id: int):
+        self.conversation_id = conversation_id
+        self.started_at = time.time()
+        self._t0 = time.monotonic()
+        self._first: dict[str, float] = {}
+        self.events: list[tuple[str, float]] = []
+
+    def mark(self, event: str) -> float:
+        """Record `event` now; returns the monotonic timestamp."""
+        now = time.monotonic()
+        self._first.setdefault(event, now)
+        if len(self.events) < self.MAX_EVENTS:
+            self.events.append((event, round((now - self._t0) * 1000, 1)))
+        return now
+
+    def first(self, event: str) -> float | None:
+        """Monotonic time of the first `event`, if it happened."""
+        return self._first.get(event)
+
+    def as_dict(self) -> dict:
+        return {
+            "conversation_id": self.conversation_id,
+            "started_at":      self.started_at,
+            "events":          [{"event": e, "ms": ms} for e, ms in self.events],
+        }
+
+
+def counter_lines(prefix: str, values: dict, help_text: str = "") -> list[str]:
+    """Render a flat dict of running totals as counters named <prefix>_<key>_total."""
+    lines = []
+    for key, value in values.items():
+        name = f"{prefix}_{key}_total"
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def gauge_lines(prefix: str, values: dict, help_text: str = "") -> list[str]:
+    """Render a flat dict of point-in-time numbers as gauges named <prefix>_<key>."""
+    lines = []
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def render_prometheus(extra: list[str]) -> str:
+    lines = []
+    for h in HISTOGRAMS:
+        lines.extend(h.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
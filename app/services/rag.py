@@ -2,18 +2,27 @@
 
 import os
 import base64
-import requests
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from openai import OpenAI
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-from app.config import OPENROUTER_API_KEY, OPENROUTER_URL
+from app.config import (
+    OPENROUTER_API_KEY, OPENROUTER_URL,
+    EMBED_BATCH_SIZE, EMBED_BATCH_CHARS, EMBED_CONCURRENCY, EMBED_RETRIES,
+)
+from app.services.http_pool import http_pool, RETRY_STATUS
 
 # ─── OpenAI embedding client ─────────────────────────────────────────────────
 OPENAI_KEY    = os.getenv("OPENAI_KEY")
-_embed_client = OpenAI(api_key=OPENAI_KEY)
+# shares the pooled client; retries happen there, not in the SDK as well
+_embed_client = OpenAI(api_key=OPENAI_KEY, http_client=http_pool.client, max_retries=0)
 EMBED_MODEL   = "text-embedding-3-large"
 
 # ─── Qdrant client ─────────────────────────────────────────────────────────────
@@ -22,6 +31,123 @@ QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 _qdrant        = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
 
+def embed(text: str, model: str = EMBED_MODEL) -> list[float]:
+    """One embedding vector for `text`."""
+    return _embed_client.embeddings.create(input=text, model=model).data[0].embedding
+
+
+# embed_many() totals, for /metrics; updated from its worker threads
+stats = {"batches": 0, "inputs": 0, "rate_limited": 0}
+_stats_lock = threading.Lock()
+
+
+class _Throttle:
+    """
+    Pacing for one embed_many() call: at most `limit` batches in flight.
+    A 429 halves the limit (not below 1) and holds every worker back for
+    Retry-After, or a jittered backoff when there is none; each run of
+    `limit` successes then lets one more batch in, up to where it started.
+    """
+
+    def __init__(self, limit: int):
+        self.max_limit = self.limit = max(1, limit)
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self._streak = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while True:
+                wait = self.resume_at - time.monotonic()
+                if wait <= 0 and self.in_flight < self.limit:
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else None)
+            self.in_flight += 1
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def succeeded(self):
+        with self._cond:
+            self._streak += 1
+            if self._streak >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._streak = 0
+                self._cond.notify_all()
+
+    def rate_limited(self, retry_after: str | None, attempt: int):
+        try:
+            delay = min(float(retry_after), 60.0)
+        except (TypeError, ValueError):
+            delay = random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._streak = 0
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+
+def _batches(texts: list[str]) -> list[list[str]]:
+    """Consecutive runs of at most EMBED_BATCH_SIZE texts / EMBED_BATCH_CHARS characters."""
+    batches, current, chars = [], [], 0
+    for text in texts:
+        if current and (len(current) >= EMBED_BATCH_SIZE or chars + len(text) > EMBED_BATCH_CHARS):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(text)
+        chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_batch(texts: list[str], model: str, throttle: _Throttle) -> list[list[float]]:
+    url = f"{str(_embed_client.base_url).rstrip('/')}/embeddings"
+    body = {"model": model, "input": texts, "encoding_format": "base64"}
+    headers = {"Authorization": f"Bearer {OPENAI_KEY}"}
+    attempt = 0
+    while True:
+        with throttle:
+            # 429s come back to us (the throttle paces the whole document); 5xx still retry in the pool
+            resp = http_pool.post(url, json=body, headers=headers, deadline=120,
+                                  extensions={"retry_status": RETRY_STATUS - {429}})
+        if resp.status_code == 429 and attempt < EMBED_RETRIES:
+            with _stats_lock:
+                stats["rate_limited"] += 1
+            throttle.rate_limited(resp.headers.get("Retry-After"), attempt)
+            attempt += 1
+            continue
+        resp.raise_for_status()
+        throttle.succeeded()
+        with _stats_lock:
+            stats["batches"] += 1
+            stats["inputs"] += len(texts)
+        data = sorted(resp.json()["data"], key=lambda d: d["index"])
+        return [np.frombuffer(base64.b64decode(d["embedding"]), dtype=np.float32).tolist()
+                if isinstance(d["embedding"], str) else d["embedding"]
+                for d in data]
+
+
+def embed_many(texts: list[str], model: str = EMBED_MODEL) -> list[list[float]]:
+    """
+    Embedding vectors for `texts`, in the same order: batched requests of
+    up to EMBED_BATCH_SIZE inputs, EMBED_CONCURRENCY of them in flight,
+    fewer while the provider answers 429 (see _Throttle).
+    """
+    batches = _batches(texts)
+    if not batches:
+        return []
+    throttle = _Throttle(EMBED_CONCURRENCY)
+    pool = ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches)))
+    try:
+        futures = [pool.submit(_embed_batch, batch, model, throttle) for batch in batches]
+        return [vector for f in futures for vector in f.result()]
+    finally:
+        pool.shutdown(cancel_futures=True)      # one batch failed: don't send the rest
+
+
 def extract_text_from_pdf_with_gemini(pdf_buffer: bytes) -> str:
     """
     Send a PDF to OpenRouter’s chat/completions endpoint (Gemini 2.5),
@@ -69,7 +195,7 @@ def extract_text_from_pdf_with_gemini(pdf_buffer: bytes) -> str:
         "Content-Type":  "application/json"
     }
 
-    resp = requests.post(OPENROUTER_URL, json=payload, headers=headers, timeout=120)
+    resp = http_pool.post(OPENROUTER_URL, json=payload, headers=headers, deadline=120)
     if resp.status_code != 200:
         print("OpenRouter 400 body:", resp.text)
     resp.raise_for_status()
@@ -102,7 +228,7 @@ def extract_and_index(
     For each doc (bytes=PDF or str=text):
       - extract text if needed
       - chunk recursively
-      - embed each chunk
+      - embed the chunks in batches
       - upsert into Qdrant under "assistant_{assistant_id}_user_{user_id}"
     Returns how many chunks were indexed.
     """
@@ -116,11 +242,8 @@ def extract_and_index(
     if not all_chunks:
         return {"indexed": 0}
 
-    # 2) Embed
-    embeddings = []
-    for chunk in all_chunks:
-        resp = _embed_client.embeddings.create(input=chunk, model=EMBED_MODEL)
-        embeddings.append(resp.data[0].embedding)
+    # 2) Embed (batched, a few batches at a time)
+    embeddings = embed_many(all_chunks)
 
     # 3) Prepare Qdrant PointStructs
     points = []
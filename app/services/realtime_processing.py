@@ -1,16 +1,54 @@
 import json
 import asyncio
-import websockets
 from openai import AsyncOpenAI
 from app.models import Assistant, Conversation
-from app.services.memory import load_memory, save_memory_entry
-from app.services.utils import generate_prompt, extract_booking_data
-from app.services.booking import handle_booking
+from app.services.memory import queue_memory_entry
+from app.services.history import load_history, history_json
+from app.services.utils import generate_prompt, extract_booking_data, BookingStreamScanner
+from app.services.booking import handle_booking, slot_taken_message
+from app.services.write_behind import write_behind
+from app.extensions import db
+from app.services.session_pool import session_pool, connect_realtime
+from app.services import metrics
+from app.services.audio_out import OutboundAudio
+from app.services.vad import SilenceGate
+from app.services import relay
+from app.services.recording import CallRecorder
+from app.services import usage
+from app.config import (
+    AUDIO_LEAD_MS, RECORDING_DIR, RECORDING_SEGMENT_BYTES, RECORDING_QUEUE_FRAMES, OPENAI_REALTIME_URL
+)
 from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+import time
 import os
 
 client = AsyncOpenAI(api_key=os.getenv("OPENAI_KEY"))
 
+# response.done carries no model name; the session's is in the endpoint URL
+REALTIME_MODEL = parse_qs(urlparse(OPENAI_REALTIME_URL).query).get("model", [None])[0]
+
+# the reply's text as it streams: the transcript of its audio, or the text
+# of a text-only response; the booking scanner reads both
+TEXT_DELTA_EVENTS = ("response.audio_transcript.delta", "response.text.delta")
+
+
+class ThreadedSocket:
+    """
+    Adapts a blocking websocket (flask-sock) to the async send/receive
+    interface CallHandler expects, by pushing each call onto a worker thread.
+    Native asyncio websockets (Quart) are handed to CallHandler directly.
+    """
+    def __init__(self, ws):
+        self._ws = ws
+
+    async def send(self, data):
+        await asyncio.to_thread(self._ws.send, data)
+
+    async def receive(self):
+        return await asyncio.to_thread(self._ws.receive)
+
+
 class CallHandler:
     def __init__(self, websocket, assistant: Assistant, conversation_id: int):
         self.websocket = websocket
@@ -19,51 +57,123 @@ class CallHandler:
         self.stream_sid = None
         self.openai_ws = None
 
+        # latency timeline (see app/services/metrics.py)
+        self.timeline = metrics.CallTimeline(conversation_id)
+        self._turn_started = None        # when the caller last stopped speaking
+        self._turn_ttfb = None           # speech stopped → first assistant frame, seconds
+        self._response_started = None    # response.created, for usage latency
+        self._assistant_speaking = False # audio of the current response reached Twilio
+        self._bookings = set()           # in-flight _save_booking tasks
+
+        # optional local VAD: skip silent inbound frames (per-assistant threshold)
+        self.vad = None
+        if assistant.vad_threshold_db is not None:
+            self.vad = SilenceGate(assistant.vad_threshold_db)
+
+        # optional stereo recording of both sides (per-assistant opt-in)
+        self.recorder = None
+        if assistant.record_calls:
+            self.recorder = CallRecorder(
+                conversation_id, RECORDING_DIR,
+                segment_bytes=RECORDING_SEGMENT_BYTES, max_frames=RECORDING_QUEUE_FRAMES,
+            )
+
+        # paced assistant audio towards Twilio (marks, accurate truncation)
+        self.audio_out = OutboundAudio(
+            websocket.send, lead_ms=AUDIO_LEAD_MS, on_send=self._after_audio_sent,
+            tap=self.recorder.outbound if self.recorder else None,
+        )
+
     async def process(self):
         """Main processing loop for a call (multi-turn)."""
-        uri = "wss://api.openai.com/v1/realtime?model=gpt-4o-mini-realtime-preview-2024-12-17"
-        headers = {
-            "Authorization": f"Bearer {os.getenv('OPENAI_KEY')}",
-            "OpenAI-Beta": "realtime=v1",
-        }
-
         try:
-            async with websockets.connect(uri, additional_headers=headers) as ws:
-                self.openai_ws = ws
-
-                # 1) configure realtime session (server-VAD + interruption support)
+            # 1) take the session /voice pre-warmed, or connect and configure
+            #    the realtime session now (server-VAD + interruption support)
+            connect_started = self.timeline.mark("upstream_connect_start")
+            self.openai_ws = await session_pool.claim(self.conversation_id)
+            if self.openai_ws is None:
+                self.openai_ws = await connect_realtime()
                 await self.initialize_session()
-
-                # 2) start reading Twilio audio in background
-                twilio_task = asyncio.create_task(self.receive_from_twilio())
-
-                # 3) loop through successive AI responses
-                while True:
-                    finished = await self._one_ai_turn()
-                    if finished:  # booking confirmed → end the call
-                        break
-
-                twilio_task.cancel()
+            metrics.upstream_connect.observe(self.timeline.mark("upstream_ready") - connect_started)
+
+            # 2) start the outbound pacer and read Twilio audio in background
+            self.audio_out.start()
+            if self.recorder:
+                self.recorder.start()
+            twilio_task = asyncio.create_task(self.receive_from_twilio())
+
+            # 3) loop through successive AI responses until either side
+            #    hangs up; on a shared event loop a call must never outlive
+            #    its Twilio stream.
+            ai_task = asyncio.create_task(self._ai_turns())
+            done, pending = await asyncio.wait(
+                {twilio_task, ai_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in pending:
+                task.cancel()
 
         except Exception as e:
             print(f"WebSocket connection error: {e}")
         finally:
+            if self.recorder:
+                # first: finalizing is shielded, so the segment is closed
+                # even when the hang-up cancels the rest of this cleanup
+                await self.recorder.stop()
+            await self.audio_out.stop()
+            if self._bookings:
+                await asyncio.gather(*self._bookings, return_exceptions=True)
             if self.openai_ws:
                 await self.openai_ws.close()
+            # call is over: make sure its transcript and booking are on disk
+            await asyncio.to_thread(write_behind.flush, 10.0)
+            self.timeline.mark("call_end")
+            metrics.recent_calls.append(self.timeline.as_dict())
+
+    async def _ai_turns(self):
+        """Run successive AI responses until a booking ends the call."""
+        while True:
+            finished = await self._one_ai_turn()
+            if finished:  # booking confirmed → end the call
+                return
 
     async def _one_ai_turn(self):
         """Wait for one complete AI response; return True if booking confirmed."""
-        assistant_response = ""
+        scanner = BookingStreamScanner()  # booking-JSON detector for the current response
         audio_stopped = False  # Flag to track if we've stopped sending audio
+        booked = False         # booking already saved straight from the stream
+        first_delta = True     # no audio received yet for the current response
 
         async for raw in self.openai_ws:
+            # hot path: audio deltas are sliced, not parsed
+            audio = relay.audio_delta(raw)
+            if audio is not None:
+                if first_delta:
+                    first_delta = False
+                    self.timeline.mark("first_audio_delta")
+                if not audio_stopped:
+                    self.audio_out.enqueue(*audio)
+                continue
+
             response = json.loads(raw)
             t = response.get("type")
 
             if t == "conversation.item.input_audio_transcription.completed":
                 final = response.get("transcript")
                 if final:
-                    save_memory_entry(self.conversation_id, "user", final)
+                    queue_memory_entry(self.conversation_id, "user", final)
+                continue
+
+            if t == "response.done":
+                self._record_usage((response.get("response") or {}).get("usage"))
+
+            if t == "response.created":
+                # fresh response: reset the detector and resume audio
+                self._response_started = time.perf_counter()
+                scanner = BookingStreamScanner()
+                audio_stopped = False
+                booked = False
+                first_delta = True
+                self._assistant_speaking = False
                 continue
 
             try:
@@ -74,33 +184,14 @@ class CallHandler:
                         for content_item in item['content']:
                             if 'transcript' in content_item:
                                 transcript = content_item['transcript']
-                                save_memory_entry(self.conversation_id, "assistant", transcript)
+                                queue_memory_entry(self.conversation_id, "assistant", transcript)
                                 clean, booking_data = extract_booking_data(transcript)
 
                                 # save_memory_entry(self.conversation_id, "assistant", clean)
 
-                                if booking_data and "booking_confirmed" in booking_data:
-                                    b = booking_data["booking_confirmed"]
-                                    # parse date/time
-                                    if b.get("date"):
-                                        date_obj = datetime.strptime(b["date"], "%Y-%m-%d").date()
-                                    else:
-                                        date_obj = datetime.now().date()
-
-                                    raw_time = b["time"].strip()
-                                    try:
-                                        time_obj = datetime.strptime(raw_time, "%I:%M %p").time()
-                                    except ValueError:
-                                        time_obj = datetime.strptime(raw_time, "%H:%M").time()
-
-                                    # Save the booking to database
-                                    handle_booking(
-                                        assistant_id=self.assistant.id,
-                                        date=date_obj,
-                                        time=time_obj,
-                                        customer_name=b.get("name", "Unknown"),
-                                        details=b.get("details", ""),
-                                        )
+                                if booking_data and "booking_confirmed" in booking_data and not booked:
+                                    self._start_booking(booking_data["booking_confirmed"])
+                                    booked = True
 
             except KeyError as e:
                 print(f"")
@@ -111,30 +202,27 @@ class CallHandler:
                 continue
 
             if t == "response.audio.delta" and response.get("delta"):
-                # Only send audio frames if we haven't stopped audio output
+                if first_delta:
+                    first_delta = False
+                    self.timeline.mark("first_audio_delta")
+                # Only queue audio frames if we haven't stopped audio output;
+                # the pacer forwards them to Twilio at playback speed
                 if not audio_stopped:
-                    frame = {
-                        "event": "media",
-                        "streamSid": self.stream_sid,
-                        "media": {"payload": response["delta"]},
-                    }
-                    await asyncio.to_thread(self.websocket.send, json.dumps(frame))
+                    self.audio_out.enqueue(response.get("item_id"), response["delta"])
                 continue
 
-            if t == "response.content.delta":
-                delta = response.get("delta", "")
-                assistant_response += delta
-                
-                # Check if we're entering potential JSON data during response generation
-                if not audio_stopped and ("{" in delta or "}" in delta):
-                    print('json detected')
-                    # Check if the response now contains JSON-like content
-                    if "{\"booking_confirmed\":" in assistant_response or "booking_confirmed" in assistant_response:
-                        # Stop audio output to prevent reading JSON aloud
-                        audio_stopped = True
-                        clear_evt = {"event": "clear", "streamSid": self.stream_sid}
-                        await asyncio.to_thread(self.websocket.send, json.dumps(clear_evt))
-                
+            if t in TEXT_DELTA_EVENTS:
+                booking_data = scanner.feed(response.get("delta", ""))
+
+                # Stop audio the moment the booking JSON starts, so it is never read aloud
+                if scanner.triggered and not audio_stopped:
+                    audio_stopped = True
+                    await self.audio_out.interrupt()
+
+                # ...and save the booking as soon as its block closes
+                if booking_data and "booking_confirmed" in booking_data and not booked:
+                    self._start_booking(booking_data["booking_confirmed"])
+                    booked = True
                 continue
 
             if t == "input_audio_buffer.speech_final":
@@ -142,44 +230,168 @@ class CallHandler:
                 txt = response.get("text")
                 if txt:
                     # Store user message in database
-                    save_memory_entry(self.conversation_id, "user", txt)
+                    queue_memory_entry(self.conversation_id, "user", txt)
+                continue
+
+            if t == "input_audio_buffer.speech_stopped":
+                self._turn_started = self.timeline.mark("speech_stopped")
                 continue
 
             if t == "input_audio_buffer.speech_started":
                 # User interrupted the AI
-                item_id = response.get("item_id")
+                speech_at = self.timeline.mark("speech_started")
                 audio_start_ms = response.get("audio_start_ms", 0)
 
-                # Tell OpenAI to truncate its current response
-                await self.openai_ws.send(json.dumps({
-                    "type": "conversation.item.truncate",
-                    "item_id": item_id,
-                    "content_index": 0,
-                    "audio_end_ms": audio_start_ms,
-                }))
-
                 # Clear Twilio's playback buffer so the AI audio stops immediately
-                clear_evt = {"event": "clear", "streamSid": self.stream_sid}
-                await asyncio.to_thread(self.websocket.send, json.dumps(clear_evt))
+                item_id, played_ms = await self.audio_out.interrupt()
+
+                # Tell OpenAI to truncate its current response at what the
+                # caller actually heard
+                if item_id is not None:
+                    await self.openai_ws.send(json.dumps({
+                        "type": "conversation.item.truncate",
+                        "item_id": item_id,
+                        "content_index": 0,
+                        "audio_end_ms": played_ms,
+                    }))
+
+                if self._assistant_speaking:
+                    self._record_barge_in(speech_at, audio_start_ms)
                 continue
 
         return True
 
+    def _after_audio_sent(self):
+        if not self._assistant_speaking:
+            self._record_first_frame()
+
+    def _record_first_frame(self):
+        """First assistant audio frame of a response has gone out to Twilio."""
+        first_of_call = self.timeline.first("first_frame_to_twilio") is None
+        now = self.timeline.mark("first_frame_to_twilio")
+        self._assistant_speaking = True
+
+        if self._turn_started is not None:
+            self._turn_ttfb = now - self._turn_started
+            metrics.turn_latency.observe(self._turn_ttfb)
+            self._turn_started = None
+        stream_started = self.timeline.first("twilio_start")
+        if first_of_call and stream_started is not None:
+            metrics.first_audio.observe(now - stream_started)
+
+    def _record_usage(self, response_usage: dict | None):
+        """Account one response's tokens/cost to this call (write-behind, never blocks)."""
+        latency = None
+        if self._response_started is not None:
+            latency = (time.perf_counter() - self._response_started) * 1000
+            self._response_started = None
+        ttfb = None if self._turn_ttfb is None else self._turn_ttfb * 1000
+        self._turn_ttfb = None
+        try:
+            usage.record(response_usage, assistant_id=self.assistant.id, conversation_id=self.conversation_id,
+                         source="realtime", model=REALTIME_MODEL, latency_ms=latency, ttfb_ms=ttfb)
+        except Exception as e:
+            print(f"Error recording usage: {e}")
+
+    def _record_barge_in(self, speech_at: float, audio_start_ms: int):
+        """Caller talked over the assistant and Twilio playback was cleared."""
+        cleared = self.timeline.mark("barge_in_cleared")
+        self._assistant_speaking = False
+
+        # audio_start_ms is on the inbound audio clock, which starts with the
+        # first media frame; map it to wall time to include server-VAD delay.
+        # OpenAI's clock only counts what it was sent: add back gated silence
+        if self.vad:
+            audio_start_ms = self.vad.inbound_ms(audio_start_ms)
+        onset = speech_at
+        inbound_started = self.timeline.first("first_inbound_media")
+        if inbound_started is not None:
+            onset = min(onset, inbound_started + audio_start_ms / 1000)
+        metrics.barge_in_reaction.observe(max(0.0, cleared - onset))
+
+    def _start_booking(self, b: dict):
+        """Book in the background: the upstream events must keep flowing meanwhile."""
+        task = asyncio.create_task(self._save_booking(b))
+        self._bookings.add(task)
+        task.add_done_callback(self._bookings.discard)
+
+    async def _save_booking(self, b: dict):
+        """
+        Parse the model's booking_confirmed payload and book it. If another
+        caller got the slot first, have the model tell the caller and offer
+        the nearest free slot instead.
+        """
+        try:
+            # parse date/time
+            if b.get("date"):
+                date_obj = datetime.strptime(b["date"], "%Y-%m-%d").date()
+            else:
+                date_obj = datetime.now().date()
+
+            raw_time = b["time"].strip()
+            try:
+                time_obj = datetime.strptime(raw_time, "%I:%M %p").time()
+            except ValueError:
+                time_obj = datetime.strptime(raw_time, "%H:%M").time()
+
+            # booked now (off the loop), not queued: the caller must hear
+            # about a conflict while still on the line
+            booking_id, nearest = await asyncio.to_thread(
+                self._book, date_obj, time_obj, b.get("name", "Unknown"), b.get("details", "")
+            )
+            if booking_id is not None:
+                return
+            await self.openai_ws.send(json.dumps({
+                "type": "conversation.item.create",
+                "item": {
+                    "type": "message",
+                    "role": "system",
+                    "content": [{"type": "input_text", "text":
+                        "The booking you just confirmed was NOT made: another caller took that slot "
+                        "a moment ago. Tell the caller, in your own words: "
+                        + slot_taken_message(date_obj, time_obj, nearest)}],
+                },
+            }))
+            await self.openai_ws.send(json.dumps({"type": "response.create"}))
+        except Exception as e:
+            print(f"Error saving booking: {e}")
+
+    def _book(self, date_obj, time_obj, name: str, details: str):
+        try:
+            return handle_booking(self.assistant, date=date_obj, time=time_obj,
+                                  customer_name=name, details=details)
+        finally:
+            db.session.remove()     # don't hold a pooled connection for the rest of the call
+
     async def receive_from_twilio(self):
         """Forward incoming Twilio audio frames to OpenAI."""
         try:
             while True:
-                raw = await asyncio.to_thread(self.websocket.receive)
-                data = json.loads(raw)
-
-                if data["event"] == "media" and self.openai_ws:
-                    await self.openai_ws.send(json.dumps({
-                        "type": "input_audio_buffer.append",
-                        "audio": data["media"]["payload"],
-                    }))
+                raw = await self.websocket.receive()
+
+                # hot path: media frames are sliced, not parsed
+                payload = relay.twilio_media_payload(raw)
+                if payload is None:
+                    data = json.loads(raw)
+                    if data["event"] == "media":
+                        payload = data["media"]["payload"]
+
+                if payload is not None:
+                    if self.recorder:
+                        self.recorder.inbound(payload)
+                    if self.openai_ws:
+                        if self.timeline.first("first_inbound_media") is None:
+                            self.timeline.mark("first_inbound_media")
+                        for audio in (self.vad.feed(payload) if self.vad else (payload,)):
+                            await self.openai_ws.send(relay.append_message(audio))
 
                 elif data["event"] == "start":
+                    self.timeline.mark("twilio_start")
                     self.stream_sid = data["start"]["streamSid"]
+                    self.audio_out.stream_sid = self.stream_sid
+
+                elif data["event"] == "mark":
+                    self.audio_out.on_mark(data["mark"]["name"])
 
                 elif data["event"] == "stop":
                     # so here we simply stop reading frames until next turn.
@@ -194,33 +406,43 @@ class CallHandler:
 
     async def initialize_session(self):
         """Configure the Realtime API session with server-VAD & interruptions."""
-        history = load_memory(self.conversation_id)
-        history_json = json.dumps(history, ensure_ascii=False)
-        instructions = generate_prompt(history_json, self.assistant)
-
-        voice = "alloy" if self.assistant.voice_type.lower() == "male" else "coral"
-
-        session_update = {
-            "type": "session.update",
-            "session": {
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.5,
-                    "prefix_padding_ms": 100,
-                    "silence_duration_ms": 200,
-                    "create_response": True,
-                    "interrupt_response": True
-                },
-                "input_audio_format": "g711_ulaw",
-                "output_audio_format": "g711_ulaw",
-                "input_audio_transcription": {
-                                            "model": "whisper-1",
-                                            "language": "en"    
-                                        },
-                "voice": voice,
-                "instructions": instructions,
-                "modalities": ["text", "audio"],
-                "temperature": 0.7,
-            },
-        }
+        session_update = build_session_update(self.assistant, self.conversation_id)
+        # never hold a pooled DB connection across an await: on a shared loop
+        # a call waiting here would starve the pool and block every other call
+        db.session.close()
         await self.openai_ws.send(json.dumps(session_update))
+
+
+def build_session_update(assistant: Assistant, conversation_id: int) -> dict:
+    """
+    The session.update event for a call. Needs the DB (history + slots), so
+    callers build it in a Flask app context before going async.
+    """
+    summary, history = load_history(conversation_id)
+    instructions = generate_prompt(history_json(summary, history), assistant)
+
+    voice = "alloy" if assistant.voice_type.lower() == "male" else "coral"
+
+    return {
+        "type": "session.update",
+        "session": {
+            "turn_detection": {
+                "type": "server_vad",
+                "threshold": 0.5,
+                "prefix_padding_ms": 100,
+                "silence_duration_ms": 200,
+                "create_response": True,
+                "interrupt_response": True
+            },
+            "input_audio_format": "g711_ulaw",
+            "output_audio_format": "g711_ulaw",
+            "input_audio_transcription": {
+                                        "model": "whisper-1",
+                                        "language": "en"    
+                                    },
+            "voice": voice,
+            "instructions": instructions,
+            "modalities": ["text", "audio"],
+            "temperature": 0.7,
+        },
+    }
@@ -0,0 +1,251 @@
+# app/services/recording.py
+"""
+Opt-in call recording to segmented stereo WAV files.
+
+CallRecorder taps both directions of a call: inbound Twilio payloads (left
+channel, before the VAD gate, i.e. everything the caller said) and the
+assistant frames the outbound pacer actually sent to Twilio (right channel,
+placed at their playback time, so audio cut off by a barge-in is not in the
+recording).
+
+The relay loop only appends base64 frames to a bounded queue; it never
+decodes, touches the disk or waits. When the queue is full, frames are
+dropped and counted. A per-call writer task drains the queue every
+`interval` seconds and hands the batch to a worker thread, which decodes
+μ-law to 16-bit PCM, mixes both channels on the inbound sample clock and
+copies the result into a memory-mapped, preallocated WAV segment. A segment
+that reaches `segment_bytes` is finalized (header, truncate) and the next
+one is opened; every finished segment is linked to the Conversation as a
+Recording row through the write-behind queue.
+"""
+import asyncio
+import base64
+import mmap
+import os
+import struct
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from app.models import Recording
+from app.services.vad import decode_ulaw
+from app.services.write_behind import write_behind
+
+RATE         = 8000
+FRAME        = 160              # samples per 20 ms Twilio frame
+SAMPLE_BYTES = 4                # stereo, 16-bit
+HEADER_BYTES = 44
+HOLD         = RATE * 2         # commit outbound audio at most 2 s ahead of inbound
+
+INBOUND, OUTBOUND = 0, 1        # left, right
+
+# process-wide counters for /metrics
+stats = {"frames_queued": 0, "frames_dropped": 0, "segments": 0, "bytes_written": 0}
+
+
+def _wav_header(data_bytes: int) -> bytes:
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, 2, RATE, RATE * SAMPLE_BYTES, SAMPLE_BYTES, 16,
+        b"data", data_bytes,
+    )
+
+
+class _Segment:
+    """One WAV file, preallocated to its full size and written through mmap."""
+
+    def __init__(self, path: str, segment_bytes: int):
+        self.path = path
+        self.capacity = (segment_bytes - HEADER_BYTES) // SAMPLE_BYTES * SAMPLE_BYTES
+        self.written = 0
+
+        size = HEADER_BYTES + self.capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            try:
+                os.posix_fallocate(fd, 0, size)   # reserve the blocks up front
+            except (AttributeError, OSError):
+                os.ftruncate(fd, size)            # no fallocate here: sparse file
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._mm[:HEADER_BYTES] = _wav_header(0)
+
+    @property
+    def room(self) -> int:
+        return self.capacity - self.written
+
+    def write(self, data) -> None:
+        start = HEADER_BYTES + self.written
+        self._mm[start:start + len(data)] = data
+        self.written += len(data)
+
+    def close(self) -> None:
+        self._mm[:HEADER_BYTES] = _wav_header(self.written)
+        self._mm.flush()
+        self._mm.close()
+        os.truncate(self.path, HEADER_BYTES + self.written)
+
+
+class _Mixer:
+    """Stereo int16 window over the call's sample clock, from `base` on."""
+
+    def __init__(self):
+        self.base = 0
+        self.buf = np.zeros((RATE * 4, 2), dtype=np.int16)
+        self.end = 0          # furthest sample written, either channel
+        self.inbound_end = 0  # furthest inbound sample (the master clock)
+
+    def place(self, channel: int, offset: int, pcm: np.ndarray) -> None:
+        start = offset - self.base
+        if start < 0:                     # arrived after its span was written out
+            pcm = pcm[-start:]
+            start = 0
+        stop = start + len(pcm)
+        if stop > len(self.buf):
+            grown = np.zeros((max(stop, 2 * len(self.buf)), 2), dtype=np.int16)
+            grown[:len(self.buf)] = self.buf
+            self.buf = grown
+        self.buf[start:stop, channel] = pcm
+        self.end = max(self.end, self.base + stop)
+        if channel == INBOUND:
+            self.inbound_end = max(self.inbound_end, self.base + stop)
+
+    def take(self, upto: int) -> bytes:
+        n = upto - self.base
+        if n <= 0:
+            return b""
+        out = self.buf[:n].tobytes()
+        self.buf[:-n] = self.buf[n:]
+        self.buf[-n:] = 0
+        self.base = upto
+        return out
+
+
+class CallRecorder:
+    def __init__(self, conversation_id: int, directory: str,
+                 segment_bytes: int = 16 * 1024 * 1024, max_frames: int = 3000,
+                 interval: float = 0.5):
+        self.conversation_id = conversation_id
+        self.directory       = os.path.join(directory, str(conversation_id))
+        self.segment_bytes   = segment_bytes
+        self.max_frames      = max_frames
+        self.interval        = interval
+
+        self.started_at = datetime.utcnow()
+        self._queue: deque = deque()      # (channel, sample offset, base64 frame)
+        self._t0 = None                   # monotonic time of sample 0
+        self._inbound_frames = 0
+        self._stopping = asyncio.Event()
+        self._task = None
+
+        # writer-thread state
+        self._mixer   = _Mixer()
+        self._segment = None
+        self._seq     = 0
+        self.segments: list[str] = []
+
+    # ── relay side (event loop, never blocks) ───────────────────────────────
+
+    def inbound(self, payload: str) -> None:
+        """One 20 ms Twilio media payload from the caller."""
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+        self._push(INBOUND, self._inbound_frames * FRAME, payload)
+        self._inbound_frames += 1
+
+    def outbound(self, payload: str, play_at: float) -> None:
+        """One assistant frame sent to Twilio, to be heard at monotonic `play_at`."""
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+        self._push(OUTBOUND, round((play_at - self._t0) * RATE), payload)
+
+    def _push(self, channel: int, offset: int, payload: str) -> None:
+        if len(self._queue) >= self.max_frames:
+            stats["frames_dropped"] += 1
+            return
+        self._queue.append((channel, offset, payload))
+        stats["frames_queued"] += 1
+
+    # ── writer ───────────────────────────────────────────────────────────────
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Write out everything still queued and finalize the last segment.
+        Cancelling the caller does not interrupt the writer.
+        """
+        if self._task:
+            self._stopping.set()
+            await asyncio.shield(self._task)
+
+    async def _run(self):
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                if self._queue:
+                    await asyncio.to_thread(self._write, self._drain(), False)
+            await asyncio.to_thread(self._write, self._drain(), True)
+        except Exception as e:
+            print(f"Error in call recorder {self.conversation_id}: {e}")
+
+    def _drain(self) -> list:
+        batch = list(self._queue)
+        self._queue.clear()
+        return batch
+
+    def _write(self, batch: list, final: bool) -> None:
+        """Worker thread: decode, mix, and append to the current segment."""
+        mixer = self._mixer
+        for channel, offset, payload in batch:
+            mixer.place(channel, offset, decode_ulaw(base64.b64decode(payload)))
+        upto = mixer.end if final else max(mixer.inbound_end, mixer.end - HOLD)
+        self._append(memoryview(mixer.take(upto)))
+        if final:
+            self._close_segment()
+
+    def _append(self, data: memoryview) -> None:
+        while data:
+            if self._segment is None:
+                self._open_segment()
+            n = min(self._segment.room, len(data))
+            self._segment.write(data[:n])
+            data = data[n:]
+            if not self._segment.room:
+                self._close_segment()
+
+    def _open_segment(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self.started_at:%Y%m%dT%H%M%S}-{self._seq:03d}.wav"
+        self._segment = _Segment(os.path.join(self.directory, name), self.segment_bytes)
+
+    def _close_segment(self) -> None:
+        segment, self._segment = self._segment, None
+        if segment is None:
+            return
+        segment.close()
+        if not segment.written:
+            os.remove(segment.path)
+            return
+
+        self.segments.append(segment.path)
+        stats["segments"] += 1
+        stats["bytes_written"] += HEADER_BYTES + segment.written
+        write_behind.put(
+            Recording,
+            conversation_id=self.conversation_id,
+            segment=self._seq,
+            path=segment.path,
+            started_at=self.started_at,
+            duration_ms=segment.written // SAMPLE_BYTES * 1000 // RATE,
+            size_bytes=HEADER_BYTES + segment.written,
+        )
+        self._seq += 1
@@ -0,0 +1,72 @@
+# app/services/relay.py
+"""
+Fast path for the per-frame audio relay.
+
+Every 20 ms of every call, Twilio sends a `media` event and OpenAI sends a
+`response.audio.delta`. Parsing each into a dict and serializing a new one
+is most of the per-frame CPU. Both peers send compact JSON with the event
+type as the first key, so these helpers recognize the hot messages by a
+prefix check, slice the base64 out (base64 never contains a quote or a
+backslash), and build the outgoing message from pre-serialized pieces.
+
+Anything that doesn't match exactly returns None, and the caller falls back
+to json.loads; control events always take that path.
+"""
+import json
+
+TWILIO_MEDIA_PREFIX = '{"event":"media"'
+AUDIO_DELTA_PREFIX  = '{"type":"response.audio.delta"'
+
+_PAYLOAD_KEY = '"payload":"'
+_DELTA_KEY   = '"delta":"'
+_ITEM_KEY    = '"item_id":"'
+
+_APPEND_HEAD = '{"type":"input_audio_buffer.append","audio":"'
+_TAIL        = '"}'
+
+
+def _string_at(raw: str, key: str) -> str | None:
+    """Value of the string field `key` (with its opening quote), unescaped only."""
+    start = raw.find(key)
+    if start < 0:
+        return None
+    start += len(key)
+    end = raw.find('"', start)
+    if end < 0:
+        return None
+    value = raw[start:end]
+    if "\\" in value:
+        return None
+    return value
+
+
+def twilio_media_payload(raw) -> str | None:
+    """Base64 payload of a Twilio media event, or None if not one (or unsure)."""
+    if type(raw) is not str or not raw.startswith(TWILIO_MEDIA_PREFIX):
+        return None
+    return _string_at(raw, _PAYLOAD_KEY)
+
+
+def audio_delta(raw) -> tuple[str | None, str] | None:
+    """(item_id, base64 delta) of a response.audio.delta, or None."""
+    if type(raw) is not str or not raw.startswith(AUDIO_DELTA_PREFIX):
+        return None
+    delta = _string_at(raw, _DELTA_KEY)
+    if not delta:
+        return None
+    return _string_at(raw, _ITEM_KEY), delta
+
+
+def append_message(audio: str) -> str:
+    """input_audio_buffer.append for one base64 audio chunk."""
+    return _APPEND_HEAD + audio + _TAIL
+
+
+def media_prefix(stream_sid) -> str:
+    """Everything of a Twilio outbound media event before the payload."""
+    return '{"event":"media","streamSid":' + json.dumps(stream_sid) + ',"media":{"payload":"'
+
+
+def media_message(prefix: str, payload: str) -> str:
+    """Twilio outbound media event from media_prefix() and a base64 frame."""
+    return prefix + payload + '"}}'
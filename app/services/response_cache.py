@@ -0,0 +1,76 @@
+# app/services/response_cache.py
+"""
+Rendered bodies of the polled read APIs, keyed on the versions they were
+built from.
+
+A key is the route, its arguments and the version columns its payload
+depends on (user.assistants_version, assistant.config_version and
+bookings_version). Writers bump those columns in the same transaction as
+the change, so a key never maps to two different payloads in any worker.
+That makes the key's hash a valid ETag: a client holding it gets a 304
+without the body being rebuilt, and a poll without it is served from the
+cached bytes. Nothing here needs invalidating; old keys just stop being
+asked for and fall out of the LRU.
+
+Bump FORMAT when a cached route's payload changes shape, so ETags from
+before a deploy don't match the new bodies.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.config import RESPONSE_CACHE_BYTES
+
+FORMAT = 1
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 8_000_000):
+        self.max_bytes = max_bytes
+        self._bodies: OrderedDict[tuple, bytes] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"not_modified": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def etag(key: tuple) -> str:
+        return hashlib.blake2s(repr((FORMAT, key)).encode(), digest_size=12).hexdigest()
+
+    def get(self, key: tuple) -> bytes | None:
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is None:
+                self.counters["misses"] += 1
+                return None
+            self._bodies.move_to_end(key)
+            self.counters["hits"] += 1
+            return body
+
+    def put(self, key: tuple, body: bytes):
+        if self.max_bytes <= 0 or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._bodies.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._bodies[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, dropped = self._bodies.popitem(last=False)
+                self._bytes -= len(dropped)
+                self.counters["evictions"] += 1
+
+    def not_modified(self):
+        with self._lock:
+            self.counters["not_modified"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            c["entries"], c["bytes"] = len(self._bodies), self._bytes
+        polls = c["not_modified"] + c["hits"] + c["misses"]
+        c["hit_ratio"] = round((c["not_modified"] + c["hits"]) / polls, 4) if polls else 0
+        return c
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
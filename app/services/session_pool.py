@@ -0,0 +1,143 @@
+# app/services/session_pool.py
+"""
+Per-worker pool of pre-warmed OpenAI Realtime sessions.
+
+/voice already knows the assistant and conversation, so it starts the
+upstream websocket connect + session.update right away; by the time Twilio
+has fetched the TwiML and opened the media stream, CallHandler can claim a
+ready session instead of paying the connect round trips itself.
+
+A websocket can only be used on the event loop that opened it, so the pool
+works in the shared-event-loop (ASGI) mode only: app/asgi.py binds it to the
+server loop at startup. Unbound (thread-per-call mode) it is a no-op and
+CallHandler connects as before. Unclaimed sessions are closed after `ttl`.
+
+Being per worker, a pre-warmed session is only used when Twilio's media
+stream lands on the same worker as the /voice webhook. Nothing routes it
+there: with --workers N the other workers connect as if there were no
+pool and the warmed session expires unused (an extra upstream session).
+benchmarks/prewarm_latency.py --workers N reports how many calls hit it.
+"""
+import asyncio
+import json
+import os
+import time
+
+import websockets
+
+from app.config import OPENAI_REALTIME_URL
+
+
+async def connect_realtime():
+    """Open a websocket to the Realtime API."""
+    headers = {
+        "Authorization": f"Bearer {os.getenv('OPENAI_KEY')}",
+        "OpenAI-Beta": "realtime=v1",
+    }
+    # no permessage-deflate: base64 audio barely compresses and zlib on
+    # every 20 ms frame costs more CPU than the relay itself
+    return await websockets.connect(OPENAI_REALTIME_URL, additional_headers=headers,
+                                    compression=None)
+
+
+class _Warm:
+    __slots__ = ("task", "expiry", "started")
+
+    def __init__(self, task, expiry, started):
+        self.task = task          # resolves to the initialized websocket
+        self.expiry = expiry      # TimerHandle closing the session if unclaimed
+        self.started = started
+
+
+class RealtimeSessionPool:
+    def __init__(self, ttl: float = 15.0, enabled: bool = True):
+        self.ttl = ttl
+        self.enabled = enabled
+        self._loop = None
+        self._sessions: dict[int, _Warm] = {}
+        self.counters = {"prewarmed": 0, "claimed": 0, "expired": 0, "failed": 0}
+
+    def init_app(self, app):
+        self.ttl = app.config.get("REALTIME_PREWARM_TTL", self.ttl)
+        self.enabled = app.config.get("REALTIME_PREWARM", self.enabled)
+        app.extensions["session_pool"] = self
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach the pool to the loop that runs every CallHandler of this worker."""
+        self._loop = loop
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and self._loop is not None
+
+    # ── called from the /voice webhook (any thread) ──────────────────────────
+
+    def prewarm(self, conversation_id: int, session_update: dict):
+        """Start connecting + configuring a session for this conversation."""
+        if not self.active:
+            return
+        payload = json.dumps(session_update)
+        self._loop.call_soon_threadsafe(self._start, conversation_id, payload)
+
+    # ── on the bound loop ────────────────────────────────────────────────────
+
+    def _start(self, conversation_id: int, payload: str):
+        self._discard(conversation_id)
+        task = self._loop.create_task(self._warm(payload))
+        expiry = self._loop.call_later(self.ttl, self._expire, conversation_id)
+        self._sessions[conversation_id] = _Warm(task, expiry, time.monotonic())
+        self.counters["prewarmed"] += 1
+
+    async def _warm(self, payload: str):
+        ws = await connect_realtime()
+        try:
+            await ws.send(payload)
+        except Exception:
+            await ws.close()
+            raise
+        return ws
+
+    async def claim(self, conversation_id: int):
+        """
+        Take the pre-warmed, already-initialized websocket for this call, or
+        None if there is none (or it failed) so the caller connects itself.
+        """
+        if asyncio.get_running_loop() is not self._loop:
+            return None
+        warm = self._sessions.pop(conversation_id, None)
+        if warm is None:
+            return None
+        warm.expiry.cancel()
+        try:
+            ws = await warm.task
+        except Exception as e:
+            print(f"Pre-warmed session for conversation {conversation_id} failed: {e}")
+            self.counters["failed"] += 1
+            return None
+        self.counters["claimed"] += 1
+        return ws
+
+    def _expire(self, conversation_id: int):
+        if conversation_id in self._sessions:
+            self.counters["expired"] += 1
+            self._discard(conversation_id)
+
+    def _discard(self, conversation_id: int):
+        warm = self._sessions.pop(conversation_id, None)
+        if warm is None:
+            return
+        warm.expiry.cancel()
+        warm.task.add_done_callback(self._close_result)
+        warm.task.cancel()
+
+    @staticmethod
+    def _close_result(task):
+        if task.cancelled() or task.exception() is not None:
+            return
+        asyncio.ensure_future(task.result().close())
+
+    def metrics(self) -> dict:
+        return {**self.counters, "parked": len(self._sessions)}
+
+
+session_pool = RealtimeSessionPool()
@@ -0,0 +1,206 @@
+# app/services/usage.py
+"""
+Per-conversation token, cost and latency accounting.
+
+record() is called once per LLM response: OpenRouter completions (text
+turns, history summaries) and Realtime response.done events. Each call
+queues one Usage row on the write-behind queue, so nothing waits on the DB.
+Whenever a batch of Usage rows is inserted, the same transaction adds them
+to UsageRollup (assistant, UTC day, source) with an upsert, so dashboards
+read a few rollup rows instead of scanning raw usage.
+
+Cost is OpenRouter's own figure when the response carries one
+(usage.cost); otherwise it is estimated from PRICES (USD per million
+tokens, list prices; update them when providers change theirs). Unknown
+models cost 0.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import case
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+from app.models import Usage, UsageRollup
+from app.services import metrics
+from app.services.write_behind import write_behind
+
+# USD per 1M tokens
+PRICES = {
+    "gpt-4o-mini-realtime-preview": {"input": 0.60, "cached": 0.30, "output": 2.40,
+                                     "audio_input": 10.00, "audio_cached": 0.30, "audio_output": 20.00},
+    "gpt-4o-realtime-preview":      {"input": 5.00, "cached": 2.50, "output": 20.00,
+                                     "audio_input": 40.00, "audio_cached": 2.50, "audio_output": 80.00},
+    "google/gemini-2.0-flash-001":  {"input": 0.10, "cached": 0.025, "output": 0.40},
+}
+
+TOKEN_FIELDS = ("input_tokens", "cached_tokens", "output_tokens", "audio_input_tokens", "audio_output_tokens")
+SUM_FIELDS = ("requests", *TOKEN_FIELDS, "cost_usd", "latency_ms_sum", "ttfb_ms_sum", "ttfb_count")
+
+
+def _price(model: str | None) -> dict | None:
+    if not model:
+        return None
+    for name, price in PRICES.items():
+        # dated snapshots ("...-2024-12-17") price like their base model
+        if model == name or model.startswith(name + "-"):
+            return price
+    return None
+
+
+def tokens(usage: dict) -> dict:
+    """
+    Token counts from either usage shape: Realtime (input_tokens,
+    input_token_details with text/audio split) or chat completions
+    (prompt_tokens, completion_tokens). input/output_tokens are text only.
+    """
+    if "input_tokens" in usage:
+        inp, out = usage.get("input_token_details") or {}, usage.get("output_token_details") or {}
+        audio_in = inp.get("audio_tokens") or 0
+        return {
+            "input_tokens":        (usage.get("input_tokens") or 0) - audio_in,
+            "cached_tokens":       inp.get("cached_tokens") or 0,
+            "output_tokens":       (usage.get("output_tokens") or 0) - (out.get("audio_tokens") or 0),
+            "audio_input_tokens":  audio_in,
+            "audio_output_tokens": out.get("audio_tokens") or 0,
+        }
+    return {
+        "input_tokens":        usage.get("prompt_tokens") or 0,
+        "cached_tokens":       (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+        "output_tokens":       usage.get("completion_tokens") or 0,
+        "audio_input_tokens":  0,
+        "audio_output_tokens": 0,
+    }
+
+
+def cost(model: str | None, usage: dict, counts: dict) -> float:
+    if usage.get("cost") is not None:
+        return float(usage["cost"])       # OpenRouter bills this amount
+    price = _price(model)
+    if price is None:
+        return 0.0
+    cached = (usage.get("input_token_details") or {}).get("cached_tokens_details") or {}
+    cached_audio = cached.get("audio_tokens") or 0
+    cached_text = counts["cached_tokens"] - cached_audio
+    total = (
+        (counts["input_tokens"] - cached_text) * price["input"]
+        + cached_text * price["cached"]
+        + counts["output_tokens"] * price["output"]
+    )
+    if counts["audio_input_tokens"] or counts["audio_output_tokens"]:
+        total += (
+            (counts["audio_input_tokens"] - cached_audio) * price.get("audio_input", price["input"])
+            + cached_audio * price.get("audio_cached", price["cached"])
+            + counts["audio_output_tokens"] * price.get("audio_output", price["output"])
+        )
+    return total / 1_000_000
+
+
+def record(usage: dict | None, *, assistant_id: int | None, conversation_id: int | None,
+           source: str, model: str | None, latency_ms: float | None, ttfb_ms: float | None = None):
+    """Account one response. Unattributed calls only feed the prompt-cache metrics."""
+    if not usage:
+        return
+    metrics.record_prompt_usage(usage)
+    if assistant_id is None:
+        return
+    counts = tokens(usage)
+    write_behind.put(
+        Usage,
+        assistant_id=assistant_id,
+        conversation_id=conversation_id,
+        source=source,
+        model=model,
+        cost_usd=cost(model, usage, counts),
+        latency_ms=latency_ms,
+        ttfb_ms=ttfb_ms,
+        created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+        **counts,
+    )
+
+
+def _rollup(rows: list[dict]):
+    """write-behind hook: add a batch of Usage rows to UsageRollup."""
+    deltas: dict = defaultdict(lambda: dict.fromkeys(SUM_FIELDS, 0) | {"latency_ms_max": 0.0})
+    for r in rows:
+        d = deltas[(r["assistant_id"], r["created_at"].date(), r["source"])]
+        d["requests"] += 1
+        for f in TOKEN_FIELDS:
+            d[f] += r.get(f) or 0
+        d["cost_usd"] += r.get("cost_usd") or 0.0
+        latency = r.get("latency_ms") or 0.0
+        d["latency_ms_sum"] += latency
+        d["latency_ms_max"] = max(d["latency_ms_max"], latency)
+        if r.get("ttfb_ms") is not None:
+            d["ttfb_ms_sum"] += r["ttfb_ms"]
+            d["ttfb_count"] += 1
+
+    values = [{"assistant_id": a, "day": day, "source": src, **d} for (a, day, src), d in deltas.items()]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(UsageRollup)
+        new = insert.excluded
+        set_ = {f: getattr(UsageRollup, f) + new[f] for f in SUM_FIELDS}
+        set_["latency_ms_max"] = case((new.latency_ms_max > UsageRollup.latency_ms_max, new.latency_ms_max),
+                                      else_=UsageRollup.latency_ms_max)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=["assistant_id", "day", "source"], set_=set_), values)
+        return
+
+    # other databases: read-modify-write, fine for the single write-behind writer
+    for v in values:
+        row = UsageRollup.query.filter_by(assistant_id=v["assistant_id"], day=v["day"], source=v["source"]).first()
+        if row is None:
+            db.session.add(UsageRollup(**v))
+            continue
+        for f in SUM_FIELDS:
+            setattr(row, f, getattr(row, f) + v[f])
+        row.latency_ms_max = max(row.latency_ms_max, v["latency_ms_max"])
+    db.session.flush()
+
+
+write_behind.on_insert(Usage, _rollup)
+
+
+def rollup_totals(rows) -> dict:
+    """Sum UsageRollup rows (or rows shaped like them) and derive averages."""
+    total = dict.fromkeys(SUM_FIELDS, 0) | {"latency_ms_max": 0.0}
+    for r in rows:
+        for f in SUM_FIELDS:
+            total[f] += getattr(r, f)
+        total["latency_ms_max"] = max(total["latency_ms_max"], r.latency_ms_max)
+    return summarize(total)
+
+
+def summarize(t: dict) -> dict:
+    """Public shape of a rollup: sums plus averages, without the internal sums."""
+    return {
+        "requests":            t["requests"],
+        "input_tokens":        t["input_tokens"],
+        "cached_tokens":       t["cached_tokens"],
+        "output_tokens":       t["output_tokens"],
+        "audio_input_tokens":  t["audio_input_tokens"],
+        "audio_output_tokens": t["audio_output_tokens"],
+        "cost_usd":            round(t["cost_usd"], 6),
+        "avg_latency_ms":      round(t["latency_ms_sum"] / t["requests"], 1) if t["requests"] else None,
+        "max_latency_ms":      round(t["latency_ms_max"], 1),
+        "avg_ttfb_ms":         round(t["ttfb_ms_sum"] / t["ttfb_count"], 1) if t["ttfb_count"] else None,
+    }
+
+
+def conversation_rows(conversation_id: int):
+    """One conversation's raw usage, aggregated per source in SQL (index on conversation_id)."""
+    return (
+        db.session.query(
+            Usage.source,
+            db.func.count().label("requests"),
+            *(db.func.coalesce(db.func.sum(getattr(Usage, f)), 0).label(f) for f in (*TOKEN_FIELDS, "cost_usd")),
+            db.func.coalesce(db.func.sum(Usage.latency_ms), 0).label("latency_ms_sum"),
+            db.func.coalesce(db.func.max(Usage.latency_ms), 0).label("latency_ms_max"),
+            db.func.coalesce(db.func.sum(Usage.ttfb_ms), 0).label("ttfb_ms_sum"),
+            db.func.count(Usage.ttfb_ms).label("ttfb_count"),
+        )
+        .filter(Usage.conversation_id == conversation_id)
+        .group_by(Usage.source)
+        .all()
+    )
@@ -2,43 +2,66 @@
 
 import json
 import re
+import threading
+import time
 from datetime import datetime
-from app.services.booking import load_booked_slots, generate_time_slots
+from app.config import BOOKING_SEARCH_DAYS
+from app.services import availability, metrics
+
+
+# Static part of the system prompt per assistant, keyed on its config_version:
+# assistant_id → (config_version, prefix). Stale entries in other workers are
+# never served (the version read with the assistant row won't match).
+_prefix_cache: dict[int, tuple[int, str]] = {}
+_prefix_lock = threading.Lock()
 
 
 def generate_prompt(history_json: str, assistant=None) -> str:
     """
-    Build the system prompt for the LLM, including business info,
-    today’s slots (with bookings), conversation history, and
-    detailed booking workflow instructions.
+    Build the system prompt for the LLM: the assistant's static prefix
+    (business info, hours, guidelines and booking workflow; memoized), then
+    a dynamic tail with today's slots (with bookings) and the conversation
+    history. Keeping everything that changes at the end lets provider
+    prompt caches reuse the prefix across turns and calls.
     """
     if not assistant:
         return "You are an AI assistant. How can I help?"
 
-    available_days = json.loads(assistant.available_days)
-    
-    today = datetime.now().date()
-    all_slots = generate_time_slots(
-        assistant.start_time,
-        assistant.end_time,
-        assistant.booking_duration_minutes,
-        available_days,
-        for_date=today
-    )
-
-
-   # 3) Load today's bookings, separate into booked and available lists
-    booked_rows    = load_booked_slots(assistant.id, today)
-    booked_slots   = [slot for slot in all_slots if slot in booked_rows]
-    available_slots = [slot for slot in all_slots if slot not in booked_rows]
-    # 4) Convert business hours to 12-hour format
+    started = time.perf_counter()
+    prompt = static_prompt_prefix(assistant) + dynamic_prompt_tail(history_json, assistant)
+    metrics.prompt_build.observe(time.perf_counter() - started)
+    return prompt
+
+
+def static_prompt_prefix(assistant) -> str:
+    """The per-assistant part of the prompt, rebuilt only when its config changes."""
+    version = assistant.config_version or 0
+    cached = _prefix_cache.get(assistant.id)
+    if cached is not None and cached[0] == version:
+        metrics.prompt_cache["prefix_hits"] += 1
+        return cached[1]
+
+    metrics.prompt_cache["prefix_misses"] += 1
+    prefix = _build_static_prefix(assistant)
+    with _prefix_lock:
+        _prefix_cache[assistant.id] = (version, prefix)
+    return prefix
+
+
+def invalidate_prompt_prefix(assistant_id: int):
+    """Drop the memoized prefix (its config changed in this worker)."""
+    with _prefix_lock:
+        _prefix_cache.pop(assistant_id, None)
+
+
+def _build_static_prefix(assistant) -> str:
+    # Convert business hours to 12-hour format
     start_dt = datetime.strptime(assistant.start_time, "%H:%M")
     end_dt   = datetime.strptime(assistant.end_time,   "%H:%M")
     start_12 = start_dt.strftime("%I:%M %p").lstrip("0")
     end_12   = end_dt.strftime("%I:%M %p").lstrip("0")
 
-    # 5) Assemble the prompt
-    prompt = f"""You are {assistant.name}, a warm, conversational voice assistant for {assistant.business_name}. {assistant.description}
+    return f"""You are {assistant.name}, a warm, conversational voice assistant for {assistant.business_name}. {assistant.description}
 
             Your capabilities are :
             - Greet callers and visitors with a friendly tone.
@@ -50,11 +73,6 @@ def generate_prompt(history_json: str, assistant=None) -> str:
             - Open: {start_12}
             - Close: {end_12}
             - Appointments last {assistant.booking_duration_minutes} minutes.
-            - Available slots today: {', '.join(available_slots) if available_slots else 'None'}.
-            - Booked slots today: {', '.join(booked_slots) if booked_slots else 'None'}.
-
-            Conversation History
-            {history_json}
 
             Response Generation Guidelines:
             - Keep responses brief and focused (30-60 words when possible)
@@ -101,34 +119,221 @@ def generate_prompt(history_json: str, assistant=None) -> str:
 
             Note: in the booking workflow, you do not need to ask for the user's name again if it is already collected. Also do not gather all information at once—ask for the name first, then the time slot, then the reason for the visit.
             """
-    
-    return prompt
 
-def extract_booking_data(response: str):
-    import json
-
-    # 1) Look for the opening fence
-    start_tag = '```json'
-    end_tag   = '```'
-
-    start_idx = response.find(start_tag)
-    if start_idx != -1:
-        # find the close fence after the opening
-        end_idx = response.find(end_tag, start_idx + len(start_tag))
-        if end_idx != -1:
-            # extract the raw JSON payload
-            raw_json = response[start_idx + len(start_tag):end_idx].strip()
-            try:
-                booking_data = json.loads(raw_json)
-                # remove the entire fenced block from the “clean” text
-                clean = response[:start_idx] + response[end_idx + len(end_tag):]
-                return clean.strip(), booking_data
-            except json.JSONDecodeError:
-                # fall through to fallback if the JSON is invalid
-                pass
-
-    # 2) (Optional) your old [BOOKING: …] fallback
-    #    …unchanged…
-
-    return response, None
 
+def dynamic_prompt_tail(history_json: str, assistant) -> str:
+    """Today's slot availability, the next free slots and the conversation so far."""
+    now   = datetime.now()
+    today = now.date()
+    slots = availability.availability_cache.load(assistant, today, today)
+    available_slots = slots.free_labels(today)
+    booked_slots    = slots.booked_labels(today)
+    # so "offer the nearest free slot" also works when today is full or closed
+    next_free = [availability.spoken(at) for at in availability.nearest_free(assistant, now, k=3, cached=True)]
+
+    return f"""
+            TODAY'S SLOTS
+            - Available slots today: {', '.join(available_slots) if available_slots else 'None'}.
+            - Booked slots today: {', '.join(booked_slots) if booked_slots else 'None'}.
+            - Next free slots: {'; '.join(next_free) if next_free else f'None in the next {BOOKING_SEARCH_DAYS} days'}.
+
+            Conversation History
+            {history_json}
+            """
+
+
+class BookingStreamScanner:
+    """
+    Incremental detector for the booking JSON the model appends to a
+    confirmed reply: a ```json fence, or a bare {"booking_confirmed": ...}.
+
+    Feed it each streamed delta. Work per delta is proportional to the delta
+    alone (only a few carried-over characters are re-read), `triggered` flips
+    as soon as the block starts so audio can be cut, and feed() returns the
+    parsed booking on the delta that closes the block.
+    """
+
+    FENCE_OPEN  = "```json"
+    FENCE_CLOSE = "```"
+    KEY         = "booking_confirmed"
+
+    def __init__(self):
+        self.triggered = False      # booking block has started
+        self.booking   = None       # parsed JSON once the block closes
+        self._state    = "speech"   # speech → fence | brace → after
+        self._spoken: list[str] = []
+        self._released = 0          # _spoken entries already handed out by take_spoken()
+        self._block:  list[str] = []
+        self._held   = ""           # speech suffix that may be a split fence
+        self._window = ""           # last block chars, for split matches
+        self._depth  = 0
+        self._in_str = False
+        self._escape = False
+
+    def feed(self, delta: str):
+        """Consume one delta; return the booking dict if this delta closed it."""
+        had_booking = self.booking is not None
+        text, self._held = self._held + delta, ""
+        while text:
+            if self._state == "speech":
+                text = self._scan_speech(text)
+            elif self._state == "fence":
+                text = self._scan_fence(text)
+            elif self._state == "brace":
+                text = self._scan_brace(text)
+            else:
+                self._spoken.append(text)
+                text = ""
+        if self.booking is not None and not had_booking:
+            return self.booking
+        return None
+
+    def take_spoken(self) -> str:
+        """Speech confirmed since the last call (never part of the booking block)."""
+        text = "".join(self._spoken[self._released:])
+        self._released = len(self._spoken)
+        return text
+
+    def finish(self):
+        """End of stream: return (clean_text, booking_or_None)."""
+        if self._state == "brace" and not self.triggered:
+            # a stray "{" that never closed was just speech
+            self._spoken.append("".join(self._block))
+            self._block = []
+        self._spoken.append(self._held)
+        self._held = ""
+        return "".join(self._spoken).strip(), self.booking
+
+    def _scan_speech(self, text: str) -> str:
+        fence = text.find(self.FENCE_OPEN)
+        brace = text.find("{")
+        if fence != -1 and (brace == -1 or fence < brace):
+            self._spoken.append(text[:fence])
+            self._state, self.triggered, self._window = "fence", True, ""
+            return text[fence + len(self.FENCE_OPEN):]
+        if brace != -1:
+            self._spoken.append(text[:brace])
+            self._state, self._window = "brace", ""
+            return text[brace:]
+
+        # hold back a trailing "`", "``", ... in case the fence is split
+        keep = 0
+        for k in range(min(len(self.FENCE_OPEN) - 1, len(text)), 0, -1):
+            if text.endswith(self.FENCE_OPEN[:k]):
+                keep = k
+                break
+        self._spoken.append(text[:len(text) - keep])
+        self._held = text[len(text) - keep:]
+        return ""
+
+    def _scan_fence(self, text: str) -> str:
+        window = self._window + text
+        idx = window.find(self.FENCE_CLOSE)
+        if idx == -1:
+            self._block.append(text)
+            self._window = window[-(len(self.FENCE_CLOSE) - 1):]
+            return ""
+
+        # the close fence may have started in an earlier delta (cut < 0)
+        cut = idx - len(self._window)
+        raw = "".join(self._block) + text[:max(cut, 0)]
+        if cut < 0:
+            raw = raw[:cut]
+        self._close(raw)
+        return text[cut + len(self.FENCE_CLOSE):]
+
+    def _scan_brace(self, text: str) -> str:
+        for i, ch in enumerate(text):
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._append_block(text[:i + 1])
+                    raw, self._block = "".join(self._block), []
+                    if self.triggered:
+                        self._close(raw)
+                    else:
+                        self._spoken.append(raw)
+                        self._state = "speech"
+                    return text[i + 1:]
+        self._append_block(text)
+        return ""
+
+    def _append_block(self, segment: str):
+        self._block.append(segment)
+        window = self._window + segment
+        if not self.triggered and self.KEY in window:
+            self.triggered = True
+        self._window = window[-(len(self.KEY) - 1):]
+
+    def _close(self, raw: str):
+        self._state = "after"
+        self._block = []
+        try:
+            self.booking = json.loads(raw.strip())
+        except json.JSONDecodeError:
+            self.booking = None
+
+
+class SentenceChunker:
+    """
+    Re-cuts streamed text into complete sentences, so each one can go to TTS
+    while the rest of the reply is still being generated. A sentence ends at
+    . ! ? or … followed by whitespace, or at a newline; common abbreviations
+    ("Dr.", "a.m.") and decimals ("3.5") don't end one.
+    """
+
+    END = re.compile(r"(?<=[.!?…])([\"')\]]*)\s+|\n+")
+    ABBREVIATIONS = ("mr.", "mrs.", "ms.", "dr.", "st.", "jr.", "sr.", "vs.",
+                     "e.g.", "i.e.", "a.m.", "p.m.", "etc.", "no.")
+
+    def __init__(self, min_chars: int = 12):
+        self.min_chars = min_chars  # shorter sentences are joined to the next
+        self._buf = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Add text; return the sentences it completed."""
+        self._buf += text
+        out, start = [], 0
+        for m in self.END.finditer(self._buf):
+            closers = m.group(1) or ""  # keep a closing quote/bracket with its sentence
+            sentence = self._buf[start:m.start() + len(closers)].strip()
+            if len(sentence) < self.min_chars or self._abbreviation(sentence):
+                continue
+            out.append(sentence)
+            start = m.end()
+        self._buf = self._buf[start:]
+        return out
+
+    def flush(self) -> str:
+        """End of stream: whatever is left, possibly an unterminated sentence."""
+        rest, self._buf = self._buf.strip(), ""
+        return rest
+
+    def _abbreviation(self, sentence: str) -> bool:
+        last = sentence.rsplit(None, 1)[-1].lower()
+        return last in self.ABBREVIATIONS
+
+
+def extract_booking_data(response: str):
+    """
+    Split a complete reply into (clean_text, booking_data).
+    Uses the same BookingStreamScanner as the realtime path; if no valid
+    booking block is found the reply is returned unchanged.
+    """
+    scanner = BookingStreamScanner()
+    scanner.feed(response)
+    clean, booking_data = scanner.finish()
+    if booking_data is None:
+        return response, None
+    return clean, booking_data
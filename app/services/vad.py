@@ -0,0 +1,117 @@
+# app/services/vad.py
+"""
+Local voice-activity gate for inbound Twilio audio.
+
+Twilio streams 8 kHz G.711 μ-law in 20 ms frames whether or not the caller
+is talking. SilenceGate decodes each frame through a 256-entry NumPy lookup
+table, computes its energy (dBFS) and zero-crossing rate with vectorized ops
+over the frame's samples, and only lets speech through to OpenAI. Frames are
+scored as they arrive: a batch of one through 2-D NumPy code costs several
+times the scalar reductions here, and waiting to batch would delay speech. A
+run of silence is skipped entirely, except for:
+  - pre-roll: the last `preroll_ms` of silence is replayed right before
+    speech, so server VAD still sees the onset, and
+  - hang-over: `hangover_ms` of silence after speech is still forwarded,
+    so server VAD can detect the end of the turn.
+
+OpenAI's audio clock (audio_start_ms, audio_end_ms) only counts the frames
+it was sent; inbound_ms() maps it back onto the Twilio stream.
+"""
+import base64
+import math
+from bisect import bisect_right
+from collections import deque
+
+import numpy as np
+
+FRAME_MS = 20
+
+
+def _ulaw_table() -> np.ndarray:
+    """G.711 μ-law byte → 16-bit linear PCM."""
+    u = ~np.arange(256, dtype=np.uint8)
+    sign     = u & 0x80
+    exponent = ((u >> 4) & 0x07).astype(np.int32)
+    mantissa = (u & 0x0F).astype(np.int32)
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(sign, -magnitude, magnitude).astype(np.int16)
+
+
+ULAW_TO_PCM = _ulaw_table()
+
+# process-wide counters for /metrics
+stats = {"frames_in": 0, "frames_forwarded": 0}
+
+
+def decode_ulaw(data: bytes) -> np.ndarray:
+    return ULAW_TO_PCM[np.frombuffer(data, dtype=np.uint8)]
+
+
+class SilenceGate:
+    def __init__(self, threshold_db: float, preroll_ms: int = 200,
+                 hangover_ms: int = 400, zcr_max: float = 0.35):
+        self.threshold_db = threshold_db
+        self.zcr_max = zcr_max
+        self.hangover = hangover_ms // FRAME_MS
+        self._preroll: deque = deque(maxlen=max(1, preroll_ms // FRAME_MS))
+        self._remaining = 0  # silent frames still to forward after speech
+
+        self._seen = 0       # inbound frames so far
+        self._sent = 0       # frames forwarded upstream so far
+        # from upstream frame _gap_at[i] on, upstream lags inbound by _gap[i] frames
+        self._gap_at = [0]
+        self._gap = [0]
+
+    def feed(self, payload: str) -> list[str]:
+        """
+        Take one inbound base64 μ-law payload; return the payloads to send
+        upstream now (empty while a silence run is being skipped).
+        """
+        frame = (self._seen, payload)
+        self._seen += 1
+        speech = self._is_speech(decode_ulaw(base64.b64decode(payload)))
+
+        if speech:
+            out = [*self._preroll, frame]
+            self._preroll.clear()
+            self._remaining = self.hangover
+        elif self._remaining > 0:
+            self._remaining -= 1
+            out = [frame]
+        else:
+            self._preroll.append(frame)
+            out = []
+
+        if out and out[0][0] - self._sent != self._gap[-1]:
+            # resuming after a skipped run: frames forwarded are consecutive from here
+            self._gap_at.append(self._sent)
+            self._gap.append(out[0][0] - self._sent)
+        self._sent += len(out)
+
+        stats["frames_in"] += 1
+        stats["frames_forwarded"] += len(out)
+        return [p for _, p in out]
+
+    def inbound_ms(self, upstream_ms: int) -> int:
+        """Position on the inbound (Twilio) stream of `upstream_ms` on OpenAI's audio clock."""
+        i = bisect_right(self._gap_at, upstream_ms // FRAME_MS) - 1
+        return upstream_ms + self._gap[i] * FRAME_MS
+
+    def _is_speech(self, pcm: np.ndarray) -> bool:
+        """
+        Loud frames are speech; frames just above the threshold only count when
+        their zero-crossing rate is not noise-like (hiss crosses zero constantly).
+        """
+        n = pcm.size
+        if n < 2:
+            return False
+        x = pcm.astype(np.float32)
+        rms = math.sqrt(float(np.dot(x, x)) / n)
+        energy_db = 20 * math.log10(max(rms, 1.0) / 32768.0)
+        if energy_db > self.threshold_db + 10:
+            return True
+        if energy_db <= self.threshold_db:
+            return False
+        signs = pcm < 0
+        zcr = np.count_nonzero(signs[1:] != signs[:-1]) / (n - 1)
+        return zcr < self.zcr_max
@@ -0,0 +1,299 @@
+# app/services/write_behind.py
+"""
+Write-behind persistence for the realtime call path.
+
+Producers (CallHandler, on the event loop) append rows to a bounded
+in-memory queue and return immediately; a single writer thread drains the
+queue in batches with one multi-row INSERT per model per transaction.
+
+Guarantees:
+  - backpressure: once `max_items` rows are queued, producer threads wait
+    for room. The event loop never waits (that would stall every call on
+    the worker): its rows are queued past the limit and counted as
+    `overflow`, and the threads stay blocked until the queue drains
+  - at-least-once: rows leave the queue only after their batch commits.
+    Transient DB errors (OperationalError, invalidated connections) are
+    retried with backoff for as long as they last, and the rows stay queued
+    meanwhile. A row may be written twice if a commit succeeds but reports
+    failure
+  - permanent failures: a batch that fails for any other reason is retried
+    one row at a time, so one bad row can't wedge the writer. The rows that
+    still fail are appended to the dead-letter file (`dead_letter_path`,
+    one JSON object per line) along with the error; so are rows still
+    queued when the process exits and flush() times out. Once the cause is
+    fixed, `flask replay-dead-letters` queues them again
+  - ordering: FIFO, so one conversation's messages keep their order
+  - flush(): blocks until every row queued before the call is committed
+    or dead-lettered
+  - on_insert(model, fn): fn(rows) runs in the same transaction as each
+    batch of `model` rows, for derived tables (e.g. usage rollups) that must
+    never disagree with the rows they are built from
+"""
+import asyncio
+import atexit
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, time as dtime
+
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError
+
+from app.extensions import db
+
+log = logging.getLogger(__name__)
+
+
+def _transient(e: Exception) -> bool:
+    """Worth retrying: the database or the connection to it, not the rows."""
+    return isinstance(e, (OperationalError, DisconnectionError)) or (
+        isinstance(e, DBAPIError) and e.connection_invalidated)
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date, dtime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(model, row: dict) -> dict:
+    """Undo _encode: ISO strings back to the date/time types of `model`'s columns."""
+    columns = model.__table__.c
+    out = {}
+    for key, value in row.items():
+        if isinstance(value, str) and key in columns:
+            kind = columns[key].type.python_type
+            if kind in (datetime, date, dtime):
+                value = kind.fromisoformat(value)
+        out[key] = value
+    return out
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class WriteBehind:
+    def __init__(self, max_items: int = 10000, batch_size: int = 500,
+                 interval: float = 0.2,
+                 dead_letter_path: str = "write_behind_dead_letters.jsonl"):
+        self.max_items   = max_items
+        self.batch_size  = batch_size
+        self.interval    = interval      # max time a row waits for its batch to fill
+        self.dead_letter_path = dead_letter_path
+
+        self._app    = None
+        self._thread = None
+        self._items  = deque()           # (model, row) — removed only once committed
+        self._cond   = threading.Condition()
+        self._queued = 0                 # rows ever queued
+        self._done   = 0                 # rows committed or dead-lettered (FIFO watermark)
+        self._flush_waiters = 0
+
+        self._after_insert: dict = {}    # model → fn(rows), same transaction
+
+        self._dead_lock = threading.Lock()
+        self.counters = {
+            "queued": 0, "written": 0, "batches": 0, "retries": 0,
+            "dead_lettered": 0, "replayed": 0, "producer_waits": 0, "overflow": 0,
+        }
+        self.last_flush_ms = 0.0
+        self.max_flush_ms  = 0.0
+
+    def init_app(self, app):
+        self._app = app
+        self.max_items  = app.config.get("WRITE_BEHIND_MAX_ITEMS", self.max_items)
+        self.batch_size = app.config.get("WRITE_BEHIND_BATCH_SIZE", self.batch_size)
+        self.interval   = app.config.get("WRITE_BEHIND_INTERVAL", self.interval)
+        self.dead_letter_path = app.config.get("WRITE_BEHIND_DEAD_LETTERS", self.dead_letter_path)
+        app.extensions["write_behind"] = self
+        atexit.register(self._shutdown, 10.0)
+
+        @app.cli.command("replay-dead-letters")
+        def replay_dead_letters_command():
+            """Queue the write-behind dead letters again and write them."""
+            print(f"write-behind: replayed {self.replay_dead_letters()} row(s)")
+
+    def on_insert(self, model, fn):
+        """Run fn(rows) inside the transaction of every batch of `model` rows."""
+        self._after_insert[model] = fn
+
+    # ── producer side ────────────────────────────────────────────────────────
+
+    def put(self, model, /, **row):
+        """
+        Queue one row for `model`. If the queue is full, a thread waits for
+        room; on the event loop the row is queued anyway (see `overflow`),
+        since waiting there would stall every call on the worker.
+        """
+        if self._app is None:
+            raise RuntimeError("WriteBehind.init_app() was never called")
+
+        with self._cond:
+            if len(self._items) >= self.max_items:
+                if _on_event_loop():
+                    self.counters["overflow"] += 1
+                else:
+                    while len(self._items) >= self.max_items:
+                        self.counters["producer_waits"] += 1
+                        self._cond.wait()
+            self._items.append((model, row))
+            self._queued += 1
+            self.counters["queued"] += 1
+            self._cond.notify_all()
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="write-behind", daemon=True
+                )
+                self._thread.start()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until everything queued so far is persisted. False on timeout."""
+        with self._cond:
+            target = self._queued
+            if self._done >= target:
+                return True
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: self._done >= target, timeout)
+            finally:
+                self._flush_waiters -= 1
+
+    def replay_dead_letters(self) -> int:
+        """Queue every dead-lettered row again and wait for it; returns how many."""
+        from app import models
+
+        path = self.dead_letter_path
+        replaying = f"{path}.replaying"
+        if not os.path.exists(replaying):
+            # a replay that died part way is finished first
+            if not os.path.exists(path):
+                return 0
+            os.replace(path, replaying)
+
+        count = 0
+        with open(replaying, encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                model = getattr(models, entry["model"])
+                self.put(model, **_decode(model, entry["row"]))
+                count += 1
+        self.flush()
+        # rows that failed again are in a new dead-letter file by now
+        os.remove(replaying)
+        self.counters["replayed"] += count
+        return count
+
+    def metrics(self) -> dict:
+        with self._cond:
+            depth = len(self._items)
+        return {
+            **self.counters,
+            "queue_depth":   depth,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms":  self.max_flush_ms,
+        }
+
+    # ── writer side ──────────────────────────────────────────────────────────
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._items)
+                    # let the batch fill up unless someone is waiting on a flush
+                    if len(self._items) < self.batch_size and not self._flush_waiters:
+                        self._cond.wait(self.interval)
+                    batch = list(itertools.islice(self._items, self.batch_size))
+
+                self._write_with_retry(batch)
+
+                with self._cond:
+                    for _ in batch:
+                        self._items.popleft()
+                    self._done += len(batch)
+                    self._cond.notify_all()
+
+    def _write_with_retry(self, batch):
+        delay = 0.05
+        while True:
+            try:
+                self._write(batch)
+                return
+            except Exception as e:
+                db.session.rollback()
+                if _transient(e):
+                    # the database, not the rows: keep them queued and wait it out
+                    self.counters["retries"] += 1
+                    log.warning("write-behind: batch of %d failed (%s); retrying in %.2fs",
+                                len(batch), e, delay)
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+                    continue
+                if len(batch) > 1:
+                    # a bad row must not block the rest: write them one at a time
+                    for item in batch:
+                        self._write_with_retry([item])
+                    return
+                self._dead_letter(batch, f"{e.__class__.__name__}: {e}")
+                return
+
+    def _dead_letter(self, batch, error: str):
+        log.error("write-behind: dead-lettering %d row(s) to %s after %s",
+                  len(batch), self.dead_letter_path, error)
+        at = datetime.now().isoformat()
+        lines = "".join(
+            json.dumps({"model": model.__name__, "row": row, "error": error, "at": at},
+                       default=_encode) + "\n"
+            for model, row in batch
+        )
+        with self._dead_lock:
+            try:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                # nowhere durable left: the log is the last copy
+                log.exception("write-behind: could not write dead letters:\n%s", lines)
+                return
+        self.counters["dead_lettered"] += len(batch)
+
+    def _shutdown(self, timeout: float):
+        if self.flush(timeout):
+            return
+        with self._cond:
+            left = list(self._items)
+        # the writer may still commit some of these: replaying them is at-least-once
+        self._dead_letter(left, "still queued at exit")
+
+    def _write(self, batch):
+        started = time.perf_counter()
+
+        rows_by_model: dict = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+        for model, rows in rows_by_model.items():
+            db.session.execute(db.insert(model), rows)  # executemany → multi-row INSERT
+            hook = self._after_insert.get(model)
+            if hook is not None:
+                hook(rows)
+        db.session.commit()
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.last_flush_ms = elapsed
+        self.max_flush_ms  = max(self.max_flush_ms, elapsed)
+        self.counters["written"] += len(batch)
+        self.counters["batches"] += 1
+
+
+write_behind = WriteBehind()
@@ -0,0 +1,7 @@
+from app.asgi import create_asgi_app
+import os
+
+os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'  # Allow OAuth over HTTP for development
+
+# Shared-event-loop mode: hypercorn asgi:app
+app = create_asgi_app()
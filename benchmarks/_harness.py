@@ -0,0 +1,146 @@
+# benchmarks/_harness.py
+"""Shared plumbing for the benchmarks: throwaway DB, server processes, stats."""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Server commands per serving mode; both expose /voice and /ws/call/<id>.
+SERVER_MODES = {
+    "threaded": [sys.executable, "-c",
+                 "import sys; from run import app; "
+                 "app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"],
+    "asgi":     [sys.executable, "-m", "hypercorn", "asgi:app", "--bind"],
+}
+
+
+def wire(event: dict) -> str:
+    """An event as Twilio and OpenAI put it on the wire: compact JSON, keys in order."""
+    return json.dumps(event, separators=(",", ":"))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+def bench_env(realtime_port: int, db_path: str | None = None) -> dict:
+    """Environment for the app under test: local SQLite + local fake realtime."""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL":        f"sqlite:///{db_path}",
+        "OPENAI_REALTIME_URL": f"ws://127.0.0.1:{realtime_port}",
+        "OPENAI_KEY":          os.getenv("OPENAI_KEY", "bench"),
+        "PYTHONPATH":          ROOT,
+    })
+    return env
+
+
+def seed(env: dict, calls: int, twilio_number: str = "+15550000000",
+         record_calls: bool = False) -> list[int]:
+    """Create one assistant and `calls` conversations; return conversation ids."""
+    script = f"""
+import json
+from app import create_app
+from app.extensions import db
+from app.models import User, Assistant, Conversation
+app = create_app()
+with app.app_context():
+    user = User(name="bench")
+    db.session.add(user); db.session.flush()
+    assistant = Assistant(
+        name="Bench", business_name="Bench Co", description="Benchmark tenant.",
+        start_time="09:00", end_time="17:00", booking_duration_minutes=30,
+        available_days=json.dumps({{d: True for d in
+            ["monday","tuesday","wednesday","thursday","friday","saturday","sunday"]}}),
+        twilio_number={twilio_number!r}, voice_type="female", record_calls={record_calls!r},
+        user_id=user.id)
+    db.session.add(assistant); db.session.flush()
+    convos = [Conversation(assistant_id=assistant.id, caller_number=f"+1555{{i:07d}}")
+              for i in range({calls})]
+    db.session.add_all(convos); db.session.commit()
+    print(json.dumps([c.id for c in convos]))
+"""
+    out = subprocess.run([sys.executable, "-c", script], env=env, cwd=ROOT,
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def start_realtime(port: int, *extra: str) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_realtime", "--port", str(port), *extra],
+        cwd=ROOT, start_new_session=True,
+    )
+    wait_for_port(port)
+    return proc
+
+
+def start_server(mode: str, port: int, env: dict, *extra: str) -> subprocess.Popen:
+    cmd = list(SERVER_MODES[mode])
+    cmd.append(f"127.0.0.1:{port}" if mode == "asgi" else str(port))
+    cmd.extend(extra)
+    # own process group: hypercorn serves from worker child processes
+    proc = subprocess.Popen(cmd, env=env, cwd=ROOT, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return proc
+
+
+def stop(*procs: subprocess.Popen):
+    for p in procs:
+        _signal_group(p, signal.SIGTERM)
+    for p in procs:
+        try:
+            p.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            _signal_group(p, signal.SIGKILL)
+
+
+def _signal_group(proc: subprocess.Popen, sig: int):
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _tree(pid: int):
+    import psutil
+    proc = psutil.Process(pid)
+    return [proc, *proc.children(recursive=True)]
+
+
+def tree_cpu_seconds(pid: int) -> float:
+    """User + system CPU of a server and its worker processes."""
+    return sum(sum(p.cpu_times()[:2]) for p in _tree(pid))
+
+
+def tree_threads(pid: int) -> int:
+    return sum(p.num_threads() for p in _tree(pid))
@@ -0,0 +1,135 @@
+# benchmarks/answer_cache.py
+"""
+Text-path turn latency with the semantic answer cache off vs on.
+
+Replays a caller mix against the local fake OpenRouter, which also serves
+the embeddings (benchmarks/fake_openrouter.py). Each turn is a new
+caller's opening question, in its own conversation, since only first
+turns are cached. Most are paraphrases of a few FAQs (hours, location,
+price, walk-ins, parking) and the rest are booking questions, which the
+cache must leave alone. Finally every caller of the "on" run asks a FAQ
+again, as a follow-up turn; none of those may come from the cache. Every stub reply is
+unique, so a hit can be traced back to the question that produced it, and
+a hit on a different FAQ is counted as wrong. The stub's counters give
+what each run really cost upstream: completions sent, prompt tokens, reply
+tokens generated, and completions hung up on after a semantic hit.
+
+The stub's embeddings are hashed bags of words, not a real model, so the
+similarity threshold is lowered to --threshold here; with real embeddings
+use the ANSWER_CACHE_THRESHOLD default.
+
+    python -m benchmarks.answer_cache --turns 150 --embed-ms 100 --first-token-ms 300
+"""
+import argparse
+import os
+import random
+import time
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+FAQ = {
+    "hours": ["What are your opening hours?", "What hours are you open?",
+              "Tell me your opening hours please", "What are the hours you're open?"],
+    "location": ["Where is your office located?", "What is the address of your office?",
+                 "Where exactly is your office?", "Can you give me your office address?"],
+    "price": ["How much does a consultation cost?", "What is the price of a consultation?",
+              "What does a consultation cost?", "How much is the consultation price?"],
+    "walk-ins": ["Do you take walk-ins?", "Can I just walk in without notice?",
+                 "Are walk-ins accepted at your office?", "Do you accept walk-ins?"],
+    "parking": ["Is there parking near your office?", "Where can I park my car?",
+                "Is there somewhere to park near the office?", "Do you have parking nearby?"],
+}
+BOOKING = ["Can I book Monday at 10 AM?", "Do you have anything available tomorrow?",
+           "I'd like to cancel my appointment please", "Is Thursday afternoon free?"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=150)
+    parser.add_argument("--booking-share", type=float, default=0.2)
+    parser.add_argument("--embed-ms", type=float, default=100)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-s", type=float, default=60)
+    parser.add_argument("--threshold", type=float, default=0.75)
+    args = parser.parse_args()
+
+    replies = [f"Happy to help with that, here is answer number {i} for you." for i in range(10 * args.turns)]
+    port = _harness.free_port()
+    stub = start_in_thread(port, args.first_token_ms, args.tokens_per_s, embed_ms=args.embed_ms,
+                           replies=replies)
+    env = _harness.bench_env(_harness.free_port())
+    env["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    env["ANSWER_CACHE_THRESHOLD"] = str(args.threshold)
+    conversation_ids = _harness.seed(env, 2 * args.turns)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant
+    from app.services.assistant import process_input
+    from app.services.answer_cache import answer_cache
+
+    rng = random.Random(7)
+    workload = []
+    for _ in range(args.turns):
+        if rng.random() < args.booking_share:
+            workload.append(("booking", rng.choice(BOOKING)))
+        else:
+            intent = rng.choice(list(FAQ))
+            workload.append((intent, rng.choice(FAQ[intent])))
+
+    app = create_app()
+    latency = {}
+    cost = {}                 # enabled → stub counters for that run
+    answered_by = {}          # reply → intent of the question that produced it
+    wrong = 0
+    with app.app_context():
+        assistant = Assistant.query.first()
+        for enabled in (False, True):
+            assistant.answer_cache = enabled
+            db.session.commit()
+            latency[enabled] = []
+            before = dict(stub.stats)
+            callers = conversation_ids[args.turns:] if enabled else conversation_ids[:args.turns]
+            for (intent, text), conversation_id in zip(workload, callers):
+                hits_before = answer_cache.metrics()["hits"] + answer_cache.metrics()["exact_hits"]
+                started = time.perf_counter()
+                reply, _ = process_input(text, assistant, conversation_id)
+                latency[enabled].append(time.perf_counter() - started)
+                m = answer_cache.metrics()
+                if m["hits"] + m["exact_hits"] > hits_before:
+                    wrong += answered_by[reply] != intent
+                else:
+                    answered_by[reply] = intent
+            time.sleep(1.0)   # let hung-up streams notice the closed socket
+            cost[enabled] = {k: stub.stats[k] - before[k] for k in before}
+
+        # follow-up turns: the conversation has history, so the cache stays out of it
+        before = answer_cache.metrics()
+        for conversation_id in callers:
+            process_input(FAQ["hours"][0], assistant, conversation_id)
+        after = answer_cache.metrics()
+        follow_up_hits = after["hits"] + after["exact_hits"] - before["hits"] - before["exact_hits"]
+
+    m = answer_cache.metrics()
+    p = _harness.percentile
+    print(f"{args.turns} turns ({args.booking_share:.0%} booking questions); stub LLM first token "
+          f"{args.first_token_ms:.0f} ms, embedding {args.embed_ms:.0f} ms, threshold {args.threshold}")
+    print(f"{'cache':<6} {'p50 ms':>7} {'p95 ms':>7} {'mean ms':>8} {'LLM calls':>10} "
+          f"{'hung up':>8} {'prompt tok':>11} {'reply tok':>10}")
+    for enabled in (False, True):
+        lat, c = latency[enabled], cost[enabled]
+        print(f"{('on' if enabled else 'off'):<6} {p(lat, 50) * 1e3:>7.0f} {p(lat, 95) * 1e3:>7.0f} "
+              f"{sum(lat) / len(lat) * 1e3:>8.0f} {c['completions']:>10} {c['aborted']:>8} "
+              f"{c['prompt_tokens']:>11} {c['completion_tokens']:>10}")
+    print(f"lookups {m['lookups']}, hits {m['hits']} + {m['exact_hits']} exact "
+          f"(hit ratio {m['hit_ratio']:.0%}), skipped {m['skipped']} booking/short/follow-up, "
+          f"stored {m['stores']}, wrong-intent hits {wrong}")
+    print(f"follow-up turns answered from the cache: {follow_up_hits} of {len(callers)}")
+    print(f"LLM time saved {m['saved_ms'] / 1000:.1f} s, embedding time spent {m['embed_ms'] / 1000:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/availability.py
+"""
+Slot availability over a date range: the per-day loop vs the bitmap engine.
+
+Old path (what /api/bookings did): for each day, generate_time_slots
+(datetime + strftime per slot), load_booked_slots (one query per day) and
+strptime per slot back to "HH:MM". New path: app.services.availability,
+one range query and numpy bitmaps. Both run over the same busy calendar
+and must produce the same slots (the old route looked bookings up under a
+key that never matched, so its is_booked was always false; the old path
+here uses the lookup it meant to do).
+
+Also times GET /api/bookings and /api/slots end to end and counts SQL
+statements per call.
+
+    python -m benchmarks.availability --days 7 30 90 --occupancy 0.6 --duration 15
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from benchmarks import _harness
+
+
+def old_slots_by_day(assistant, start, end, available_days):
+    from app.services.booking import generate_time_slots, load_booked_slots
+    all_slots = {}
+    current = start
+    while current <= end:
+        day = current.strftime("%A").lower()
+        if available_days.get(day, False):
+            day_slots = generate_time_slots(assistant.start_time, assistant.end_time,
+                                            assistant.booking_duration_minutes, available_days, for_date=current)
+            booked_map = load_booked_slots(assistant.id, current)
+            formatted = []
+            for slot in day_slots:
+                t24 = datetime.strptime(slot, "%I:%M %p").strftime("%H:%M")
+                formatted.append({"time": t24, "is_booked": slot in booked_map})
+            all_slots[current.strftime("%Y-%m-%d")] = formatted
+        current += timedelta(days=1)
+    return all_slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 90])
+    parser.add_argument("--occupancy", type=float, default=0.6)
+    parser.add_argument("--duration", type=int, default=15)
+    parser.add_argument("--reads", type=int, default=30)
+    args = parser.parse_args()
+
+    env = _harness.bench_env(_harness.free_port())
+    _harness.seed(env, 1)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Booking
+    from app.services import availability
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        assistant = Assistant.query.first()
+        assistant.booking_duration_minutes = args.duration
+        assistant.available_days = '{"monday": true, "tuesday": true, "wednesday": true, "thursday": true, ' \
+                                   '"friday": true, "saturday": true, "sunday": false}'
+        db.session.commit()
+        aid = assistant.id
+
+        grid = availability.SlotGrid.for_assistant(assistant)
+        rng = random.Random(11)
+        today = date.today()
+        horizon = max(args.days)
+        rows = [{"assistant_id": aid, "date": today + timedelta(days=d), "time": dtime(m // 60, m % 60),
+                 "customer_name": "Caller"}
+                for d in range(horizon + 1) for m in grid.minutes if rng.random() < args.occupancy]
+        db.session.execute(db.insert(Booking), rows)
+        db.session.commit()
+
+        statements = []
+        db.event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(1))
+        days_open = availability.available_days(assistant)
+
+        def timed(fn):
+            samples, before = [], len(statements)
+            for _ in range(args.reads):
+                db.session.expire_all()
+                t = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - t)
+            return _harness.percentile(samples, 50) * 1e3, (len(statements) - before) / args.reads
+
+        results = []
+        for n in args.days:
+            end = today + timedelta(days=n - 1)
+            old = old_slots_by_day(assistant, today, end, days_open)
+            new = availability.load(assistant, today, end).by_day()
+            assert old == new, f"slot maps differ for {n} days"
+            old_ms, old_sql = timed(lambda: old_slots_by_day(assistant, today, end, days_open))
+            new_ms, new_sql = timed(lambda: availability.load(assistant, today, end).by_day())
+            route_ms, route_sql = timed(lambda: client.get(
+                f"/api/bookings/{aid}?start_date={today}&end_date={end}").get_json())
+            results.append((n, old_ms, old_sql, new_ms, new_sql, route_ms, route_sql))
+
+        slots_ms, slots_sql = timed(lambda: client.get(f"/api/slots/{aid}?date={today}").get_json())
+        booked = sum(sum(s["is_booked"] for s in day) for day in new.values())
+
+    print(f"{grid.size} slots/day ({args.duration} min), 6 open days/week, {len(rows):,} bookings "
+          f"({booked:,} in the last range)")
+    print(f"{'days':>5} {'old ms':>8} {'SQL':>5} {'engine ms':>10} {'SQL':>5} {'speedup':>8} "
+          f"{'/api/bookings ms':>17} {'SQL':>5}")
+    for n, old_ms, old_sql, new_ms, new_sql, route_ms, route_sql in results:
+        print(f"{n:>5} {old_ms:>8.2f} {old_sql:>5.0f} {new_ms:>10.2f} {new_sql:>5.0f} {old_ms / new_ms:>7.1f}x "
+              f"{route_ms:>17.2f} {route_sql:>5.0f}")
+    print(f"/api/slots (one day): {slots_ms:.2f} ms p50, {slots_sql:.0f} SQL")
+
+
+if __name__ == "__main__":
+    main()
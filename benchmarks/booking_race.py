@@ -0,0 +1,140 @@
+# benchmarks/booking_race.py
+"""
+Concurrent booking stress: hundreds of callers confirming the same few slots.
+
+--callers threads (each its own app context and DB session, like request
+threads) are released at once and each books one of --hot-slots slots
+through handle_booking. A caller who loses a slot accepts the nearest free
+slot they are offered and books that, up to --retries times. Afterwards
+the booking table must hold at most one booking per slot and every caller
+who was told "booked" must own their row.
+
+--old replays the previous behaviour (no unique index, blind insert) to
+show the double bookings it allowed.
+
+    python -m benchmarks.booking_race --callers 300 --hot-slots 10
+    python -m benchmarks.booking_race --callers 300 --postgres-url postgresql://localhost/bench_booking
+
+--postgres-url needs a driver (psycopg2) installed in this interpreter, not
+just on PYTHONPATH: the app is seeded in a subprocess whose PYTHONPATH is
+the repo root.
+"""
+import argparse
+import contextlib
+import io
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks import _harness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--callers", type=int, default=300)
+    parser.add_argument("--hot-slots", type=int, default=10)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--postgres-url", help="run against this (empty, throwaway) Postgres database")
+    parser.add_argument("--old", action="store_true", help="blind inserts without the unique index")
+    args = parser.parse_args()
+
+    env = _harness.bench_env(_harness.free_port())
+    if args.postgres_url:
+        env["DATABASE_URL"] = args.postgres_url
+    _harness.seed(env, 1)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Booking
+    from app.services.availability import SlotGrid
+    from app.services.booking import handle_booking
+
+    app = create_app()
+    with app.app_context():
+        assistant = Assistant.query.first()
+        grid = SlotGrid.for_assistant(assistant)
+        if args.old:
+            db.session.execute(db.text("DROP INDEX uq_booking_slot"))
+            db.session.commit()
+        db.session.refresh(assistant)
+        db.session.expunge(assistant)       # read-only from here, shared by the caller threads
+
+    day = date.today() + timedelta(days=1)
+    hot = [datetime.combine(day, datetime.min.time()) + timedelta(minutes=m) for m in grid.minutes[:args.hot_slots]]
+    barrier = threading.Barrier(args.callers)
+    outcomes, latencies, errors = [], [], []
+    lock = threading.Lock()
+
+    def caller(n: int):
+        want = hot[n % len(hot)]
+        name = f"caller {n}"
+        with app.app_context():
+            barrier.wait()
+            try:
+                book(name, want)
+            finally:
+                db.session.remove()
+
+    def book(name: str, want: datetime):
+        for attempt in range(args.retries + 1):
+            started = time.perf_counter()
+            try:
+                if args.old:
+                    db.session.add(Booking(assistant_id=assistant.id, date=want.date(), time=want.time(),
+                                           customer_name=name))
+                    db.session.commit()
+                    booking_id, nearest = -1, None
+                else:
+                    booking_id, nearest = handle_booking(assistant, want.date(), want.time(), name, "")
+            except Exception as e:
+                db.session.rollback()
+                with lock:
+                    errors.append(repr(e))
+                return
+            with lock:
+                latencies.append(time.perf_counter() - started)
+            if booking_id is not None:
+                with lock:
+                    outcomes.append((name, want, attempt))
+                return
+            if nearest is None:
+                return
+            want = nearest                    # "yes, that works"
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(args.callers)]
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):      # one "Booking saved/conflict" line per attempt
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - started
+
+    with app.app_context():
+        duplicates = db.session.execute(
+            db.select(Booking.date, Booking.time, db.func.count())
+              .where(Booking.assistant_id == assistant.id)
+              .group_by(Booking.date, Booking.time)
+              .having(db.func.count() > 1)
+        ).all()
+        owners = {(b.date, b.time): b.customer_name
+                  for b in Booking.query.filter_by(assistant_id=assistant.id).all()}
+        dialect = db.engine.dialect.name
+
+    lied_to = sum(owners.get((w.date(), w.time())) != name for name, w, _ in outcomes)
+    first_try = sum(1 for *_, a in outcomes if a == 0)
+    print(f"{dialect}: {args.callers} concurrent callers on {len(hot)} hot slots "
+          f"({'old blind insert' if args.old else 'unique index + nearest free slot'}) in {wall:.2f} s")
+    print(f"booked {len(outcomes)} ({first_try} first try, {len(outcomes) - first_try} took the offered slot), "
+          f"{args.callers - len(outcomes) - len(errors)} gave up, {len(errors)} errors")
+    print(f"slots booked more than once: {len(duplicates)}; callers told 'booked' who don't own the slot: {lied_to}")
+    print(f"booking attempts {len(latencies)}: p50 {_harness.percentile(latencies, 50) * 1e3:.1f} ms, "
+          f"p99 {_harness.percentile(latencies, 99) * 1e3:.1f} ms")
+    if errors:
+        print(f"first error: {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bookings_export.py
+"""
+A year of bookings for one big tenant: GET /api/bookings vs the streaming
+export, time and peak Python memory.
+
+Seeds --bookings bookings over the past year for one assistant, then:
+
+  bookings  GET /api/bookings for the year (.all() + one JSON document)
+  ndjson    GET /api/bookings/<id>/export, consumed chunk by chunk
+  csv       same, format=csv
+  paged     the export in --page-size pages, each resumed from the last
+            row's cursor; must return exactly the rows of the full export
+
+Peak memory is tracemalloc's peak over a second run of each, serving and
+consuming the response (the old route's body counts: it is built whole).
+
+    python -m benchmarks.bookings_export --bookings 100000 --page-size 20000
+"""
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, time as dtime, timedelta
+
+from benchmarks import _harness
+
+
+def measure(fn):
+    """(first byte ms, total ms, peak MiB, bytes, rows, ids); memory from a second, traced run."""
+    started = time.perf_counter()
+    first, size, rows, ids = fn()
+    wall = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ((first or started + wall) - started) * 1e3, wall * 1e3, peak / 2**20, size, rows, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bookings", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=20_000)
+    args = parser.parse_args()
+
+    env = _harness.bench_env(_harness.free_port())
+    _harness.seed(env, 1)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Booking
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        aid = Assistant.query.first().id
+        first_day = date.today() - timedelta(days=364)
+        rng = random.Random(23)
+        keys = rng.sample(range(365 * 1440), min(args.bookings, 365 * 1440))     # one per (day, minute)
+        db.session.execute(db.insert(Booking), [
+            {"assistant_id": aid, "date": first_day + timedelta(days=k // 1440),
+             "time": dtime(k % 1440 // 60, k % 60), "customer_name": f"Caller {k}",
+             "details": "Annual check-up, prefers mornings"}
+            for k in keys])
+        db.session.commit()
+        year = f"start_date={first_day}&end_date={date.today()}"
+
+    def old_route():
+        resp = client.get(f"/api/bookings/{aid}?{year}")
+        body = resp.get_data()
+        return None, len(body), len(json.loads(body)["bookings"]), None
+
+    def export(query):
+        def run():
+            resp = client.get(f"/api/bookings/{aid}/export?{query}", buffered=False)
+            first, size, lines = None, 0, 0
+            for chunk in resp.iter_encoded():
+                first = first or time.perf_counter()
+                size += len(chunk)
+                lines += chunk.count(b"\n")
+            resp.close()
+            return first, size, lines - query.endswith("csv"), None      # minus the CSV header
+        return run
+
+    def paged():
+        cursor, ids, size, first = None, [], 0, None
+        while True:
+            resp = client.get(f"/api/bookings/{aid}/export?limit={args.page_size}"
+                              + (f"&after={cursor}" if cursor else ""))
+            first = first or time.perf_counter()
+            body = resp.get_data()
+            size += len(body)
+            rows = [json.loads(line) for line in body.splitlines()]
+            ids.extend(r["id"] for r in rows)
+            if len(rows) < args.page_size:
+                return first, size, len(ids), ids
+            cursor = rows[-1]["cursor"]
+
+    results = {
+        "bookings": measure(old_route),
+        "ndjson":   measure(export("format=ndjson")),
+        "csv":      measure(export("format=csv")),
+        "paged":    measure(paged),
+    }
+    with app.app_context():
+        full = client.get(f"/api/bookings/{aid}/export").get_data().splitlines()
+        full_ids = [json.loads(line)["id"] for line in full]
+    ordered = [(r["date"], r["time"], r["id"]) for r in map(json.loads, full)]
+
+    print(f"{len(keys):,} bookings over 365 days, one assistant")
+    print(f"{'path':<9} {'first byte ms':>13} {'total ms':>9} {'peak MiB':>9} {'MiB out':>8} {'rows':>8}")
+    for label, (ttfb, total, peak, size, rows, _) in results.items():
+        print(f"{label:<9} {ttfb:>13.1f} {total:>9.1f} {peak:>9.1f} {size / 2**20:>8.1f} {rows:>8,}")
+    print(f"export ordered by (date, time, id): {ordered == sorted(ordered)}; "
+          f"paged export == full export: {results['paged'][5] == full_ids}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/conditional_get.py
+"""
+Dashboard polling of /api/assistants, /api/slots and /api/bookings: SQL
+statements, latency and bytes per poll with and without the response
+cache and ETags.
+
+Seeds one user with --assistants assistants and a busy week of bookings
+on the first, then polls each endpoint --polls times as:
+
+  no cache   RESPONSE cache off, no If-None-Match (what every poll cost before)
+  body       body cache on, no If-None-Match (a client that ignores ETags)
+  etag       If-None-Match with the last ETag: 304s
+
+then checks a booking (handle_booking) changes the slots and bookings
+ETags and an update (PATCH /api/assistant) changes the assistants one,
+with the new bodies showing the change.
+
+    python -m benchmarks.conditional_get --assistants 20 --polls 300
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from benchmarks import _harness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assistants", type=int, default=20)
+    parser.add_argument("--polls", type=int, default=300)
+    parser.add_argument("--occupancy", type=float, default=0.6)
+    args = parser.parse_args()
+
+    env = _harness.bench_env(_harness.free_port())
+    _harness.seed(env, 1)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Booking
+    from app.services.booking import handle_booking
+    from app.services.response_cache import response_cache
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        first = Assistant.query.first()
+        uid, aid = first.user_id, first.id
+        for i in range(args.assistants - 1):
+            db.session.add(Assistant(name=f"A{i}", business_name=f"Biz {i}", description="Dental clinic.",
+                                     start_time="09:00", end_time="17:00", booking_duration_minutes=30,
+                                     available_days=first.available_days, twilio_number=f"+1555100{i:04d}",
+                                     voice_type="female", user_id=uid))
+        rng = random.Random(29)
+        today = date.today()
+        db.session.execute(db.insert(Booking), [
+            {"assistant_id": aid, "date": today + timedelta(days=d), "time": dtime(9 + m // 2, m % 2 * 30),
+             "customer_name": f"Caller {d}-{m}", "details": "Cleaning"}
+            for d in range(1, 8) for m in range(16) if rng.random() < args.occupancy])
+        db.session.commit()
+
+        statements = []
+        db.event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+    urls = {
+        "assistants": f"/api/assistants?user_id={uid}",
+        "slots":      f"/api/slots/{aid}?date={today + timedelta(days=1)}",
+        "bookings":   f"/api/bookings/{aid}",
+    }
+
+    def poll(url, etag_mode):
+        samples, sizes, before, etag = [], 0, len(statements), None
+        statuses = set()
+        for _ in range(args.polls):
+            headers = {"If-None-Match": f'"{etag}"'} if etag_mode and etag else {}
+            t = time.perf_counter()
+            resp = client.get(url, headers=headers)
+            body = resp.get_data()
+            samples.append(time.perf_counter() - t)
+            sizes += len(body)
+            statuses.add(resp.status_code)
+            etag = resp.headers.get("ETag", "").strip('"') or etag
+        return ((len(statements) - before) / args.polls, _harness.percentile(samples, 50) * 1e3,
+                sizes / args.polls, statuses)
+
+    results = []
+    for mode in ("no cache", "body", "etag"):
+        response_cache.max_bytes = 0 if mode == "no cache" else 8_000_000
+        for name, url in urls.items():
+            client.get(url)                     # warm the body cache (and the availability cache)
+            results.append((mode, name) + poll(url, mode == "etag"))
+
+    # writes move the versions, so the ETags change and new bodies are served
+    etags = {name: client.get(url).headers["ETag"] for name, url in urls.items()}
+    with app.app_context():
+        assistant = db.session.get(Assistant, aid)
+        day = today + timedelta(days=1)
+        slot = next(s for s in client.get(urls["slots"]).get_json()["slots"])
+        handle_booking(assistant, day, datetime.strptime(slot, "%I:%M %p").time(), "New caller", "")
+    client.patch(f"/api/assistant/{aid}", json={"business_name": "Renamed Co"})
+    after = {name: client.get(url, headers={"If-None-Match": etags[name]}) for name, url in urls.items()}
+    booked_shown = slot not in after["slots"].get_json()["slots"] \
+        and any(b["customer_name"] == "New caller" for b in after["bookings"].get_json()["bookings"])
+    renamed_shown = any(a["business_name"] == "Renamed Co" for a in after["assistants"].get_json()["assistants"])
+
+    print(f"{args.assistants} assistants, {args.polls} polls per endpoint")
+    print(f"{'mode':<9} {'endpoint':<11} {'SQL/poll':>8} {'p50 ms':>7} {'bytes/poll':>10} {'status':>8}")
+    for mode, name, sql, p50, size, statuses in results:
+        print(f"{mode:<9} {name:<11} {sql:>8.2f} {p50:>7.2f} {size:>10.0f} {'/'.join(map(str, sorted(statuses))):>8}")
+    print(f"after a booking and an update: all ETags changed "
+          f"{all(after[n].headers['ETag'] != etags[n] for n in urls)}, statuses "
+          f"{sorted(r.status_code for r in after.values())}, booking shown {booked_shown}, "
+          f"rename shown {renamed_shown}")
+    print(f"response cache: {response_cache.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
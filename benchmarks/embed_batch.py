@@ -0,0 +1,101 @@
+# benchmarks/embed_batch.py
+"""
+Embedding a long document for RAG: one request per chunk vs rag.embed_many.
+
+Chunks a synthetic --pages page document with rag._chunk_text, then
+embeds it against the local stub (fake_openrouter's /embeddings: --embed-ms
+per request plus --per-input-ms per input) as:
+
+  per chunk   rag.embed() once per chunk, one after another (what
+              extract_and_index did); timed on the first --per-chunk-sample
+              chunks and reported as chunks/s
+  batched     embed_many with EMBED_CONCURRENCY=1
+  concurrent  embed_many with --concurrency batches in flight
+  limited     the same against a stub that answers 429 above
+              --max-in-flight concurrent requests: the throttle has to back
+              off and still finish
+
+Every mode's vectors must match per-chunk ones, in chunk order.
+
+    python -m benchmarks.embed_batch --pages 200 --batch-size 64 --concurrency 4 --max-in-flight 2
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+WORDS = ("appointment patient clinic insurance billing schedule cleaning whitening orthodontic "
+         "emergency weekend refund policy deposit consultation x-ray hygienist referral payment "
+         "cancellation reminder parking wheelchair access children sedation crown implant").split()
+
+
+def document(pages: int, rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(pages * 6):             # ~6 paragraphs, ~3000 characters a page
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(60)) + ".")
+    return "\n\n".join(paragraphs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--embed-ms", type=float, default=80)
+    parser.add_argument("--per-input-ms", type=float, default=0.5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    parser.add_argument("--per-chunk-sample", type=int, default=100)
+    args = parser.parse_args()
+
+    port, limited_port = _harness.free_port(), _harness.free_port()
+    start_in_thread(port, embed_ms=args.embed_ms, embed_per_input_ms=args.per_input_ms)
+    start_in_thread(limited_port, embed_ms=args.embed_ms, embed_per_input_ms=args.per_input_ms,
+                    embed_max_in_flight=args.max_in_flight)
+    env = _harness.bench_env(_harness.free_port())
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.update(env)
+
+    from app.services import rag
+
+    chunks = rag._chunk_text(document(args.pages, random.Random(31)))
+    rag.EMBED_BATCH_SIZE = args.batch_size
+
+    started = time.perf_counter()
+    reference = [rag.embed(c) for c in chunks[:args.per_chunk_sample]]
+    per_chunk_rate = len(reference) / (time.perf_counter() - started)
+
+    def run(concurrency, base_url):
+        rag.EMBED_CONCURRENCY = concurrency
+        rag._embed_client.base_url = base_url
+        before = dict(rag.stats)
+        started = time.perf_counter()
+        vectors = rag.embed_many(chunks)
+        wall = time.perf_counter() - started
+        same = len(vectors) == len(chunks) and all(
+            np.allclose(v, r, atol=1e-6) for v, r in zip(vectors, reference))
+        return len(chunks) / wall, wall, rag.stats["batches"] - before["batches"], \
+            rag.stats["rate_limited"] - before["rate_limited"], same
+
+    results = [
+        ("batched", run(1, f"http://127.0.0.1:{port}/v1/")),
+        ("concurrent", run(args.concurrency, f"http://127.0.0.1:{port}/v1/")),
+        ("limited", run(args.concurrency, f"http://127.0.0.1:{limited_port}/v1/")),
+    ]
+
+    print(f"{args.pages} pages -> {len(chunks):,} chunks; stub {args.embed_ms:g} ms/request + "
+          f"{args.per_input_ms:g} ms/input; batches of {args.batch_size}, {args.concurrency} in flight; "
+          f"'limited' stub allows {args.max_in_flight} at once")
+    print(f"{'mode':<11} {'chunks/s':>9} {'wall s':>8} {'requests':>9} {'429s':>6} {'in order':>9}")
+    print(f"{'per chunk':<11} {per_chunk_rate:>9.0f} {len(chunks) / per_chunk_rate:>8.1f} {len(chunks):>9} "
+          f"{0:>6} {'-':>9}   (estimated from {len(reference)} chunks)")
+    for label, (rate, wall, requests, limited, same) in results:
+        print(f"{label:<11} {rate:>9.0f} {wall:>8.1f} {requests:>9} {limited:>6} {str(same):>9}")
+
+
+if __name__ == "__main__":
+    main()
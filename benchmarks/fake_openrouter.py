@@ -0,0 +1,267 @@
+# benchmarks/fake_openrouter.py
+"""
+Local stand-in for OpenRouter's chat completions endpoint.
+
+POST any path with an OpenAI-style chat body. The reply is generated at a
+fixed pace: the first token after --first-token-ms, then --tokens-per-s.
+With "stream": true it is sent as server-sent events over chunked transfer
+encoding, token by token, like OpenRouter (including its
+": OPENROUTER PROCESSING" keep-alive comment); otherwise one JSON body once
+the whole reply is "generated". Every fourth reply confirms a booking with
+the ```json block the prompt asks for. Streamed and plain requests cycle
+through the replies separately, so alternating the two compares like with
+like. --error-rate answers that share of requests with 429 + Retry-After
+instead, to exercise client retries. server.stats counts the completions
+asked for, their prompt tokens, the reply tokens actually sent and the
+streams the client hung up on before the end.
+
+POST .../embeddings answers like OpenAI's embeddings endpoint (point the SDK
+at it with OPENAI_BASE_URL) after --embed-ms. The vectors are hashed bags of
+content words, so paraphrases sharing words come out similar and unrelated
+questions don't: good enough to exercise a similarity threshold, nothing
+like a real model's geometry.
+--embed-per-input-ms adds that much per input in a request (so batching
+isn't free), and --embed-max-in-flight answers 429 + Retry-After to
+embedding requests beyond that many at once, like a provider rate limit.
+
+    python -m benchmarks.fake_openrouter --port 8099 --first-token-ms 300 --tokens-per-s 60
+"""
+import argparse
+import base64
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLIES = [
+    "Thanks for calling! We have openings on Monday at 10 AM and 2 PM. "
+    "Tuesday is fully booked, but Wednesday morning is wide open. "
+    "Which of those works best for you?",
+    "Of course. Our consultations take about thirty minutes and cover everything you need. "
+    "Could I get your name so I can hold the slot for you?",
+    "Great, that works. Just to confirm, you'd like Monday at 10 AM. "
+    "Is there anything you'd like us to know before the appointment?",
+    "Perfect, you're all set for Monday at 10 AM. We'll see you then, and have a lovely day!\n"
+    "```json\n"
+    '{"booking_confirmed": {"date": "2026-10-19", "time": "10:00 AM", '
+    '"name": "Alex", "details": "consultation"}}\n'
+    "```",
+]
+
+EMBED_DIMS = 256
+STOPWORDS = set(
+    "a an and are as at be can could do does for from have how i i'm is it me my of on or "
+    "our please so that the there this to us we what when where which who will with would "
+    "you your you're".split()
+)
+
+
+def tokens(text: str) -> list[str]:
+    """Roughly LLM-sized pieces: words with their leading space, punctuation apart."""
+    return re.findall(r"\s*[\w']+|\s*[^\w\s]|\s+", text)
+
+
+def embedding(text: str) -> list[float]:
+    """Hashed bag of content words (first five letters, as a crude stem), unit length."""
+    v = [0.0] * EMBED_DIMS
+    for word in re.findall(r"[a-z']+", text.lower()):
+        if word not in STOPWORDS:
+            v[zlib.crc32(word[:5].encode()) % EMBED_DIMS] += 1.0
+    norm = sum(x * x for x in v) ** 0.5 or 1.0
+    return [x / norm for x in v]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    first_token = 0.3
+    token_gap = 1 / 60
+    error_rate = 0.0
+    embed_delay = 0.1
+    embed_per_input = 0.0
+    embed_max_in_flight = 0
+    embed_in_flight = None      # [count] shared by a server's handlers
+    embed_lock = threading.Lock()
+    replies = REPLIES
+    counters = {True: itertools.count(), False: itertools.count()}
+    stats = None                # shared by a server's handlers, see serve()
+    stats_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        ssl_context = getattr(self.server, "ssl_context", None)
+        if ssl_context is not None:
+            # handshake in the connection's own thread, not the accept loop
+            self.request = ssl_context.wrap_socket(self.request, server_side=True)
+        super().setup()
+        # token-sized writes: without this, Nagle + delayed ACK add ~40 ms each
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.error_rate and random.random() < self.error_rate:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.05")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.rstrip("/").endswith("/embeddings"):
+            self._embeddings(body)
+            return
+        stream = bool(body.get("stream"))
+        reply = self.replies[next(self.counters[stream]) % len(self.replies)]
+        usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4,
+                 "completion_tokens": len(tokens(reply))}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self._count(completions=1, prompt_tokens=usage["prompt_tokens"])
+        if stream:
+            self._stream(reply, body.get("model"), usage if (body.get("stream_options") or {}).get("include_usage") else None)
+        else:
+            time.sleep(self.first_token + self.token_gap * (len(tokens(reply)) - 1))
+            payload = json.dumps({
+                "id": "gen-fake", "object": "chat.completion", "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": usage,
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            self._count(completion_tokens=usage["completion_tokens"])
+
+    def _count(self, **n):
+        with self.stats_lock:
+            for key, value in n.items():
+                self.stats[key] += value
+
+    def _embeddings(self, body: dict):
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        with self.embed_lock:
+            over = self.embed_max_in_flight and self.embed_in_flight[0] >= self.embed_max_in_flight
+            if not over:
+                self.embed_in_flight[0] += 1
+        if over:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.2")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            time.sleep(self.embed_delay + self.embed_per_input * len(inputs))
+        finally:
+            with self.embed_lock:
+                self.embed_in_flight[0] -= 1
+        data = []
+        for i, text in enumerate(inputs):
+            vector = embedding(text)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        n = sum(len(tokens(t)) for t in inputs)
+        payload = json.dumps({"object": "list", "data": data, "model": body.get("model"),
+                              "usage": {"prompt_tokens": n, "total_tokens": n}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, reply: str, model=None, usage=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._chunk(b": OPENROUTER PROCESSING\n\n")
+        time.sleep(self.first_token)
+        for i, tok in enumerate(tokens(reply)):
+            if i:
+                time.sleep(self.token_gap)
+            event = {"id": "gen-fake", "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": tok}}]}
+            try:
+                self._chunk(b"data: " + json.dumps(event).encode() + b"\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # the client hung up: stop generating, like the provider does
+                self._count(aborted=1)
+                self.close_connection = True
+                return
+            self._count(completion_tokens=1)
+        if usage:
+            event = {"id": "gen-fake", "object": "chat.completion.chunk", "model": model,
+                     "choices": [], "usage": usage}
+            self._chunk(b"data: " + json.dumps(event).encode() + b"\n\n")
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # port probes and aborted TLS handshakes; the client side reports real errors
+
+
+def serve(host: str, port: int, first_token_ms: float, tokens_per_s: float,
+          error_rate: float = 0.0, embed_ms: float = 100, replies=None,
+          embed_per_input_ms: float = 0.0, embed_max_in_flight: int = 0) -> ThreadingHTTPServer:
+    handler = type("Handler", (_Handler,), {
+        "first_token": first_token_ms / 1000,
+        "token_gap": 1 / tokens_per_s,
+        "error_rate": error_rate,
+        "embed_delay": embed_ms / 1000,
+        "embed_per_input": embed_per_input_ms / 1000,
+        "embed_max_in_flight": embed_max_in_flight,
+        "embed_in_flight": [0],
+        "embed_lock": threading.Lock(),
+        "replies": replies or REPLIES,
+        "counters": {True: itertools.count(), False: itertools.count()},
+        "stats": {"completions": 0, "prompt_tokens": 0, "completion_tokens": 0, "aborted": 0},
+        "stats_lock": threading.Lock(),
+    })
+    return _Server((host, port), handler)
+
+
+def start_in_thread(port: int, first_token_ms: float = 300, tokens_per_s: float = 60,
+                    error_rate: float = 0.0, ssl_context=None, embed_ms: float = 100,
+                    replies=None, embed_per_input_ms: float = 0.0,
+                    embed_max_in_flight: int = 0) -> ThreadingHTTPServer:
+    server = serve("127.0.0.1", port, first_token_ms, tokens_per_s, error_rate, embed_ms, replies,
+                   embed_per_input_ms, embed_max_in_flight)
+    server.ssl_context = ssl_context
+    server.stats = server.RequestHandlerClass.stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-s", type=float, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--embed-ms", type=float, default=100)
+    parser.add_argument("--embed-per-input-ms", type=float, default=0.0)
+    parser.add_argument("--embed-max-in-flight", type=int, default=0)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.first_token_ms, args.tokens_per_s,
+          args.error_rate, args.embed_ms, None, args.embed_per_input_ms,
+          args.embed_max_in_flight).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
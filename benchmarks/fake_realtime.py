@@ -0,0 +1,205 @@
+# benchmarks/fake_realtime.py
+"""
+Local stand-in for wss://api.openai.com/v1/realtime.
+
+Point the app at it with OPENAI_REALTIME_URL=ws://127.0.0.1:<port>.
+Events go out as compact JSON, as the real endpoint sends them, so the
+relay's fast path (app/services/relay.py) sees what it would in production.
+
+Every input_audio_buffer.append is answered immediately with a
+response.audio.delta carrying the same payload, so a caller can measure the
+relay round trip through CallHandler without any model in the loop.
+
+--mode script plays a scripted conversation instead of echoing: every
+--turn-frames inbound frames it emits server-VAD speech events, the caller's
+transcript, a response with transcript deltas interleaved with its audio
+deltas and response.done, and every fourth reply confirms a booking with
+the ```json block the prompt asks for, each one a different slot (see
+_next_slot) so calls don't contend for
+the same one. Echoes would queue behind paced assistant audio, so here relay latency
+is measured on arrival instead: inbound payloads starting with LOAD_MAGIC
+carry the caller's wall-clock send time, and GET /stats (?reset=1) on the
+same port returns frame count and latency percentiles (and, in any mode,
+the number of sessions opened). The first frame of
+each scripted reply carries SCRIPT_MAGIC + its own send time the same way.
+
+--connect-delay holds every opening handshake back, standing in for the
+TCP + TLS + upgrade round trips to the real endpoint.
+
+    python -m benchmarks.fake_realtime --port 9000 --mode script --connect-delay 0.4
+"""
+import argparse
+import asyncio
+import base64
+import http
+import itertools
+import json
+import logging
+import struct
+import time
+from datetime import date, timedelta
+
+import websockets
+
+from benchmarks._harness import wire
+
+SCRIPT_MAGIC = b"SCRP"
+LOAD_MAGIC   = b"LOAD"
+STAMP        = struct.Struct("!d")   # wall-clock send time after the magic
+REPLY_FRAMES = 25  # 500 ms of scripted assistant audio per reply
+
+REPLIES = [
+    "Hi, thanks for calling! How can I help you today?",
+    "Sure, we're open nine to five. What time would suit you?",
+    "Great, and may I have your name please?",
+    "You're all set, see you then!\n```json\n"
+    '{"booking_confirmed": {"time": "%s", "date": "%s", '
+    '"name": "Load Test", "details": "benchmark"}}\n```',
+]
+FOLLOW_UP = "Is there anything else I can help with?"
+
+_slots = itertools.count()
+
+
+def _next_slot() -> tuple[str, str]:
+    """(time, date) of a fresh slot on the benchmark seed's grid: 16 half-hour slots from 9:00, daily."""
+    k = next(_slots)
+    minute = 9 * 60 + k % 16 * 30
+    day = date.today() + timedelta(days=1 + k // 16)
+    return f"{(minute // 60 - 1) % 12 + 1}:{minute % 60:02d} {'AM' if minute < 720 else 'PM'}", day.isoformat()
+
+
+async def _reply(ws, ids, text: str):
+    rid, item = f"resp_{next(ids)}", f"item_{next(ids)}"
+    await ws.send(wire({"type": "response.created", "response": {"id": rid}}))
+    # like the real API: transcript deltas interleaved with the audio they transcribe
+    words = [text[i:i + 12] for i in range(0, len(text), 12)]
+    filler = base64.b64encode(b"\xff" * 160).decode()
+    for i in range(max(len(words), REPLY_FRAMES)):
+        if i < len(words):
+            await ws.send(wire({"type": "response.audio_transcript.delta", "item_id": item,
+                                      "delta": words[i]}))
+        if i >= REPLY_FRAMES:
+            continue
+        if i == 0:
+            head = SCRIPT_MAGIC + STAMP.pack(time.time())
+            audio = base64.b64encode(head + b"\xff" * (160 - len(head))).decode()
+        else:
+            audio = filler
+        await ws.send(wire({"type": "response.audio.delta", "item_id": item, "delta": audio}))
+    out_text, out_audio = len(text) // 4, REPLY_FRAMES * 2 // 5   # ~20 audio tokens per second
+    await ws.send(wire({
+        "type": "response.done",
+        "response": {"id": rid, "output": [
+            {"id": item, "content": [{"type": "audio", "transcript": text}]},
+        ], "usage": {
+            "total_tokens": 1700 + out_text + out_audio,
+            "input_tokens": 1700, "output_tokens": out_text + out_audio,
+            "input_token_details": {"text_tokens": 1650, "audio_tokens": 50, "cached_tokens": 1536,
+                                    "cached_tokens_details": {"text_tokens": 1536, "audio_tokens": 0}},
+            "output_token_details": {"text_tokens": out_text, "audio_tokens": out_audio},
+        }},
+    }))
+
+
+async def _turn(ws, ids, turn: int, audio_ms: int):
+    item = f"item_{next(ids)}"
+    await ws.send(wire({"type": "input_audio_buffer.speech_started",
+                              "item_id": item, "audio_start_ms": max(0, audio_ms - 1500)}))
+    await ws.send(wire({"type": "input_audio_buffer.speech_stopped",
+                              "item_id": item, "audio_end_ms": audio_ms}))
+    await ws.send(wire({"type": "conversation.item.input_audio_transcription.completed",
+                              "item_id": item, "transcript": f"caller utterance {turn}"}))
+
+    text = REPLIES[turn % len(REPLIES)]
+    if "%s" in text:
+        await _reply(ws, ids, text % _next_slot())
+        # the model keeps talking after a booking; this also resets the
+        # handler's muted-audio state so later echoes are not dropped
+        await _reply(ws, ids, FOLLOW_UP)
+    else:
+        await _reply(ws, ids, text)
+
+
+class _InboundStats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.connections = 0
+
+    def record(self, audio: str):
+        raw = base64.b64decode(audio[:24])
+        if raw.startswith(LOAD_MAGIC):
+            sent, = STAMP.unpack_from(raw, len(LOAD_MAGIC))
+            self.latencies.append(time.time() - sent)
+
+    def report(self, reset: bool) -> dict:
+        ordered = sorted(self.latencies)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else None
+        out = {"frames": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+               "connections": self.connections}
+        if reset:
+            self.latencies = []
+            self.connections = 0
+        return out
+
+
+def _handler(mode: str, turn_frames: int, inbound: _InboundStats):
+    async def handle(ws):
+        ids = itertools.count()
+        frames = 0
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                t = msg.get("type")
+                if t == "session.update":
+                    await ws.send(wire({"type": "session.updated", "session": msg["session"]}))
+                elif t == "input_audio_buffer.append" and mode == "echo":
+                    await ws.send(wire({
+                        "type": "response.audio.delta",
+                        "delta": msg["audio"],
+                    }))
+                elif t == "input_audio_buffer.append":
+                    inbound.record(msg["audio"])
+                    frames += 1
+                    if frames % turn_frames == 0:
+                        await _turn(ws, ids, frames // turn_frames - 1, frames * 20)
+        except websockets.ConnectionClosed:
+            pass
+    return handle
+
+
+async def serve(host: str = "127.0.0.1", port: int = 9000, connect_delay: float = 0.0,
+                mode: str = "echo", turn_frames: int = 150):
+    inbound = _InboundStats()
+
+    async def process_request(connection, request):
+        if request.path.startswith("/stats"):
+            body = json.dumps(inbound.report(reset="reset=1" in request.path))
+            response = connection.respond(http.HTTPStatus.OK, body + "\n")
+            response.headers["Content-Type"] = "application/json"
+            return response
+        inbound.connections += 1
+        if connect_delay:
+            await asyncio.sleep(connect_delay)
+        return None
+
+    # port probes from the benchmarks are not worth a traceback each
+    quiet = logging.getLogger("fake_realtime")
+    quiet.addHandler(logging.NullHandler())
+    quiet.propagate = False
+
+    async with websockets.serve(_handler(mode, turn_frames, inbound), host, port,
+                                max_size=None, process_request=process_request,
+                                logger=quiet):
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--mode", choices=["echo", "script"], default="echo")
+    parser.add_argument("--turn-frames", type=int, default=150)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.connect_delay, args.mode, args.turn_frames))
@@ -0,0 +1,87 @@
+# benchmarks/history_budget.py
+"""
+Session setup size and time vs how much a caller has talked to us before.
+
+For conversations with --sizes prior messages, builds the call's
+session.update instructions the old way (every Message row inlined) and with
+the token-budgeted history (app/services/history.py), before and after the
+summarizer has folded the backlog. Summaries come from the local fake
+OpenRouter (benchmarks/fake_openrouter.py), so fold times are the stub's
+pacing, not a real model's; what matters is that they happen off the path
+being timed.
+
+    python -m benchmarks.history_budget --sizes 20 200 2000 --first-token-ms 300
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+TOKEN_CHARS = 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-s", type=float, default=200)
+    args = parser.parse_args()
+
+    port = _harness.free_port()
+    start_in_thread(port, args.first_token_ms, args.tokens_per_s)
+    env = _harness.bench_env(_harness.free_port())
+    env["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    conversation_ids = _harness.seed(env, len(args.sizes))
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Message
+    from app.services.memory import load_memory
+    from app.services.utils import generate_prompt
+    from app.services.history import load_history, history_json, summarizer
+
+    def old_prompt(assistant, cid):
+        return generate_prompt(json.dumps(load_memory(cid), ensure_ascii=False), assistant)
+
+    def new_prompt(assistant, cid):
+        summary, history = load_history(cid)
+        return generate_prompt(history_json(summary, history), assistant)
+
+    def timed(build, assistant, cid):
+        started = time.perf_counter()
+        prompt = build(assistant, cid)
+        return (time.perf_counter() - started) * 1e3, len(prompt) / TOKEN_CHARS
+
+    app = create_app()
+    rows = []
+    with app.app_context():
+        assistant = Assistant.query.first()
+        for size, cid in zip(args.sizes, conversation_ids):
+            db.session.add_all(Message(conversation_id=cid, role=("user", "assistant")[i % 2],
+                                       content=f"Message {i}: could we move my appointment to Thursday "
+                                               f"afternoon, or is Friday morning better?")
+                               for i in range(size))
+            db.session.commit()
+
+            old = timed(old_prompt, assistant, cid)
+            before = timed(new_prompt, assistant, cid)      # schedules the fold, doesn't wait
+            started = time.perf_counter()
+            summarizer.wait_idle(600)
+            fold_s = time.perf_counter() - started
+            after = timed(new_prompt, assistant, cid)
+            rows.append((size, old, before, after, fold_s))
+
+    print(f"{'messages':>8} | {'all rows':>17} | {'budgeted, 1st call':>18} | {'after fold':>17} | fold (background)")
+    for size, old, before, after, fold_s in rows:
+        print(f"{size:>8} | {old[1]:>7,.0f} tok {old[0]:>5.1f} ms | {before[1]:>8,.0f} tok {before[0]:>5.1f} ms "
+              f"| {after[1]:>7,.0f} tok {after[0]:>5.1f} ms | {fold_s:.2f} s")
+    m = summarizer.metrics()
+    print(f"summarizer: {m['folds']} LLM calls folded {m['folded_messages']} messages, {m['failures']} failures")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/history_cache.py
+"""
+load_history with the in-process history cache: latency and SQL statements
+per load, hit ratio over text turns, and stale-window detection when
+another worker writes.
+
+Seeds --conversations conversations of --messages messages each, then:
+  - loads each conversation with the cache off, cold (miss) and warm (hit)
+  - runs --turns text-path-shaped turns (load, save user, save assistant)
+    over random conversations; write-through keeps the next load a hit
+  - writes a message from "another worker" (a separate SQLite connection
+    doing what save_memory_entry does) and from the realtime write-behind
+    queue, and checks the next load sees both
+
+    python -m benchmarks.history_cache --conversations 200 --messages 40 --turns 500
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=500)
+    args = parser.parse_args()
+
+    port = _harness.free_port()
+    start_in_thread(port, 20, 2000)          # summaries for conversations that outgrow the budget
+    env = _harness.bench_env(_harness.free_port())
+    env["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    conversation_ids = _harness.seed(env, args.conversations)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Conversation, Message
+    from app.services.history import load_history, history_cache
+    from app.services.memory import save_memory_entry, queue_memory_entry
+    from app.services.write_behind import write_behind
+
+    text = "Could we move my appointment to Thursday afternoon, or is Friday morning better for you? "
+    app = create_app()
+    with app.app_context():
+        db.session.execute(db.insert(Message), [
+            {"conversation_id": cid, "role": ("user", "assistant")[i % 2], "content": f"{i}: {text}"}
+            for cid in conversation_ids for i in range(args.messages)
+        ])
+        Conversation.query.update({"message_count": args.messages})
+        db.session.commit()
+
+        statements = []
+        db.event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+        def timed_loads() -> tuple[float, float]:
+            samples, before = [], len(statements)
+            for cid in conversation_ids:
+                db.session.remove()
+                started = time.perf_counter()
+                load_history(cid)
+                samples.append(time.perf_counter() - started)
+            return _harness.percentile(samples, 50) * 1e3, (len(statements) - before) / len(samples)
+
+        max_chars, history_cache.max_chars = history_cache.max_chars, 0
+        off = timed_loads()
+        history_cache.max_chars = max_chars
+        cold = timed_loads()
+        warm = timed_loads()
+
+        before = history_cache.metrics()
+        rng = random.Random(3)
+        for turn in range(args.turns):
+            cid = rng.choice(conversation_ids[:20])   # a few busy conversations
+            db.session.remove()
+            load_history(cid)
+            save_memory_entry(cid, "user", f"turn {turn}: what time do you close?")
+            save_memory_entry(cid, "assistant", f"turn {turn}: we close at five.")
+        after = history_cache.metrics()
+        turn_hits = after["hits"] - before["hits"]
+        turn_loads = turn_hits + after["misses"] - before["misses"] + after["stale"] - before["stale"]
+
+        # another worker's write: same statements as save_memory_entry, other connection
+        cid = conversation_ids[0]
+        other = sqlite3.connect(env["DATABASE_URL"].removeprefix("sqlite:///"))
+        other.execute("INSERT INTO message (conversation_id, role, content) VALUES (?, 'user', 'from worker B')", (cid,))
+        other.execute("UPDATE conversation SET message_count = message_count + 1 WHERE id = ?", (cid,))
+        other.commit()
+        db.session.remove()
+        saw_other = load_history(cid)[1][-1]["content"] == "from worker B"
+
+        queue_memory_entry(cid, "assistant", "from the realtime path")
+        write_behind.flush(10)
+        db.session.remove()
+        saw_queued = load_history(cid)[1][-1]["content"] == "from the realtime path"
+
+    m = history_cache.metrics()
+    print(f"{args.conversations} conversations x {args.messages} messages")
+    print(f"{'load_history':<14} {'p50 ms':>7} {'SQL/load':>9}")
+    for name, (ms, sql) in (("cache off", off), ("cold (miss)", cold), ("warm (hit)", warm)):
+        print(f"{name:<14} {ms:>7.3f} {sql:>9.1f}")
+    print(f"text turns: {turn_hits}/{turn_loads} loads hit ({turn_hits / turn_loads:.0%}) thanks to write-through "
+          f"({after['appends'] - before['appends']} appends)")
+    print(f"other worker's write seen: {saw_other}; write-behind message seen: {saw_queued}; "
+          f"stale windows dropped {m['stale']}, invalidations {m['invalidations']}")
+    print(f"cache: {m['entries']} windows, {m['chars']:,} chars")
+
+
+if __name__ == "__main__":
+    main()
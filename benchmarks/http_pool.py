@@ -0,0 +1,147 @@
+# benchmarks/http_pool.py
+"""
+LLM turn latency with the pooled HTTP client vs a fresh connection per call.
+
+Runs the fake OpenRouter (benchmarks/fake_openrouter.py) over TLS with a
+throwaway self-signed certificate, behind a local proxy that delays every
+chunk by half of --rtt-ms in each direction, so TCP and TLS handshakes cost
+real round trips the way they do to a provider. Each turn POSTs one chat
+completion:
+  - per-call: module-level requests.post(), what llm/rag used to do
+  - pooled:   app.services.http_pool (keep-alive, per-host cap, retries)
+first sequentially, then from --concurrency threads at once. With
+--error-rate the stub answers that share of requests with 429, and the
+pooled client has to retry them.
+
+    python -m benchmarks.http_pool --turns 40 --rtt-ms 40 --server-ms 50 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+BODY = {"model": "fake", "messages": [{"role": "user", "content": "Anything on Monday?"}]}
+
+
+def self_signed_cert() -> tuple[str, str]:
+    d = tempfile.mkdtemp(prefix="bench_tls_")
+    cert, key = os.path.join(d, "cert.pem"), os.path.join(d, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+         "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def start_delay_proxy(listen_port: int, target_port: int, one_way: float):
+    """TCP proxy adding `one_way` seconds of latency in each direction."""
+    async def pump(reader, writer):
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, chunk = await queue.get()
+                if chunk is None:
+                    break
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                writer.write(chunk)
+                await writer.drain()
+            writer.close()
+
+        sender = asyncio.create_task(deliver())
+        try:
+            while chunk := await reader.read(65536):
+                queue.put_nowait((loop.time() + one_way, chunk))
+        except ConnectionError:
+            pass
+        queue.put_nowait((0, None))
+        await sender
+
+    async def handle(client_r, client_w):
+        server_r, server_w = await asyncio.open_connection("127.0.0.1", target_port)
+        await asyncio.gather(pump(client_r, server_w), pump(server_r, client_w),
+                             return_exceptions=True)
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", listen_port)
+        async with server:
+            await server.serve_forever()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True).start()
+    _harness.wait_for_port(listen_port)
+
+
+def run_turns(turn, n: int, concurrency: int) -> list[float]:
+    def one(_):
+        started = time.perf_counter()
+        r = turn()
+        r.raise_for_status()
+        r.json()
+        return time.perf_counter() - started
+    if concurrency == 1:
+        return [one(i) for i in range(n)]
+    with ThreadPoolExecutor(concurrency) as ex:
+        return list(ex.map(one, range(n)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--rtt-ms", type=float, default=40)
+    parser.add_argument("--server-ms", type=float, default=50, help="stub time to answer")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    cert, key = self_signed_cert()
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(cert, key)
+    stub_port, proxy_port = _harness.free_port(), _harness.free_port()
+    start_in_thread(stub_port, args.server_ms, 1e6, args.error_rate, ssl_context=ctx)
+    start_delay_proxy(proxy_port, stub_port, args.rtt_ms / 2000)
+    url = f"https://127.0.0.1:{proxy_port}/api/v1/chat/completions"
+
+    from app.services.http_pool import HttpPool
+    pool = HttpPool(verify=ssl.create_default_context(cafile=cert), max_per_host=args.concurrency)
+
+    variants = {
+        "per-call": lambda: requests.post(url, json=BODY, timeout=30, verify=cert),
+        "pooled":   lambda: pool.post(url, json=BODY, deadline=30),
+    }
+
+    p = _harness.percentile
+    print(f"TLS stub behind {args.rtt_ms:.0f} ms RTT, answers in {args.server_ms:.0f} ms; "
+          f"{args.turns} turns per run; error rate {args.error_rate:.0%}")
+    print(f"{'client':<9} {'threads':>7} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7} {'ok':>4}")
+    for concurrency in (1, args.concurrency):
+        for name, turn in variants.items():
+            try:
+                lat = run_turns(turn, args.turns, concurrency)
+                ok = len(lat)
+            except requests.HTTPError:
+                lat, ok = [float("nan")], "fail"
+            print(f"{name:<9} {concurrency:>7} {p(lat, 50) * 1e3:>7.0f} {p(lat, 95) * 1e3:>7.0f} "
+                  f"{max(lat) * 1e3:>7.0f} {ok:>4}")
+
+    host = next(iter(pool.stats()["hosts"].values()))
+    print(f"pooled: {host['requests']} requests over {host['connections_opened']} connections, "
+          f"{host['retries']} retries, {host['waits']} waits for a host slot, "
+          f"{host['failures']} failures; HTTP/2 {'on' if pool.stats()['http2_enabled'] else 'off'} "
+          f"({host['http2_responses']} HTTP/2 responses; the stub only speaks HTTP/1.1)")
+
+
+if __name__ == "__main__":
+    main()
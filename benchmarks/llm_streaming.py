@@ -0,0 +1,76 @@
+# benchmarks/llm_streaming.py
+"""
+Time to first speakable sentence: process_input vs process_input_stream.
+
+Both text-path variants run the full turn (history load, prompt, LLM call,
+booking strip, memory and booking writes) against a throwaway SQLite tenant
+and the local fake OpenRouter (benchmarks/fake_openrouter.py), which paces
+tokens like a real model. For the blocking path the first sentence is
+available when the whole reply is; for the streaming path it is the first
+sentence the generator yields, i.e. when TTS could start.
+
+    python -m benchmarks.llm_streaming --turns 8 --first-token-ms 300 --tokens-per-s 60
+"""
+import argparse
+import os
+import time
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=8, help="turns per variant")
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-s", type=float, default=60)
+    args = parser.parse_args()
+
+    port = _harness.free_port()
+    start_in_thread(port, args.first_token_ms, args.tokens_per_s)
+    env = _harness.bench_env(_harness.free_port())
+    env["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    conversation_id = _harness.seed(env, 1)[0]
+    os.environ.update(env)
+
+    # app config reads the environment at import time
+    from app import create_app
+    from app.models import Assistant
+    from app.services.assistant import process_input, process_input_stream
+
+    app = create_app()
+    first = {"blocking": [], "streaming": []}
+    total = {"blocking": [], "streaming": []}
+    sentences = []
+    with app.app_context():
+        assistant = Assistant.query.first()
+        for turn in range(args.turns):
+            started = time.perf_counter()
+            process_input("Hi, do you have anything on Monday?", assistant, conversation_id)
+            elapsed = time.perf_counter() - started
+            first["blocking"].append(elapsed)
+            total["blocking"].append(elapsed)
+
+            started = time.perf_counter()
+            got = 0
+            for sentence in process_input_stream("Hi, do you have anything on Monday?",
+                                                 assistant, conversation_id):
+                if not got:
+                    first["streaming"].append(time.perf_counter() - started)
+                got += 1
+                assert "booking_confirmed" not in sentence and "```" not in sentence
+            total["streaming"].append(time.perf_counter() - started)
+            sentences.append(got)
+
+    p = _harness.percentile
+    print(f"fake model: first token {args.first_token_ms:.0f} ms, {args.tokens_per_s:.0f} tokens/s; "
+          f"{args.turns} turns each, {sum(sentences) / len(sentences):.1f} sentences/reply")
+    print(f"{'variant':<10} {'first sentence p50':>19} {'p95':>8} {'full reply p50':>15}")
+    for name in ("blocking", "streaming"):
+        print(f"{name:<10} {p(first[name], 50) * 1e3:>16.0f} ms {p(first[name], 95) * 1e3:>5.0f} ms "
+              f"{p(total[name], 50) * 1e3:>12.0f} ms")
+    print(f"time to first sentence: {p(first['blocking'], 50) / p(first['streaming'], 50):.1f}x faster streamed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/load_test.py
+"""
+Load-test the call path with synthetic Twilio callers and a fake upstream.
+
+Each simulated call follows the real flow: POST /voice/voice, open the
+/ws/call/<id> stream from the TwiML, send `start`, μ-law media frames at a
+real 20 ms cadence and finally `stop`. The fake Realtime server (script mode)
+plays a scripted conversation with speech events, transcripts, audio and a
+booking JSON block.
+
+Relay latency is measured one-way on a shared clock: caller frames carry
+their send time and the fake upstream reports inbound latency and frame
+count on GET /stats; the first audio frame of each scripted reply carries
+the fake's send time and is timed on arrival at the caller (outbound).
+Echoing frames back would measure the outbound pacer, which deliberately
+holds assistant audio to real time, not the relay.
+
+Concurrency is ramped level by level. A level passes when inbound and
+outbound relay p99 stay under --slo-p99-ms, the ratio of caller frames that
+never reached upstream stays under --max-drop and no call fails; the highest
+passing level is the maximum sustainable concurrency.
+
+    python -m benchmarks.load_test --server asgi --ramp 10 25 50 100 200 --seconds 20
+
+--record turns on call recording for the tenant, to see its relay cost;
+the WAV segments land in a temporary RECORDING_DIR.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import re
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+import websockets
+
+from benchmarks import _harness
+from benchmarks.fake_realtime import LOAD_MAGIC, SCRIPT_MAGIC, STAMP
+
+TWILIO_NUMBER = "+15550000000"
+FRAME_BYTES = 160
+FRAME_INTERVAL = 0.020
+
+
+class CallStats:
+    def __init__(self):
+        self.outbound: list[float] = []
+        self.sent = 0
+        self.script_frames = 0
+        self.clears = 0
+        self.failed = 0
+
+
+def _post_voice(port: int, caller: str) -> str:
+    body = urllib.parse.urlencode({"To": TWILIO_NUMBER, "From": caller}).encode()
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/voice/voice", data=body) as r:
+        return r.read().decode()
+
+
+async def _caller(port: int, caller: str, frames: int, stats: CallStats):
+    twiml = await asyncio.to_thread(_post_voice, port, caller)
+    conversation_id = re.search(r"/ws/call/(\d+)", twiml).group(1)
+    sid = f"MZ{conversation_id}"
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/call/{conversation_id}",
+                                  max_size=None) as ws:
+        await ws.send(_harness.wire({"event": "start", "start": {"streamSid": sid}}))
+
+        async def listen():
+            async for raw in ws:
+                msg = json.loads(raw)
+                event = msg.get("event")
+                if event == "clear":
+                    stats.clears += 1
+                if event != "media":
+                    continue
+                stats.script_frames += 1
+                audio = base64.b64decode(msg["media"]["payload"])
+                if audio.startswith(SCRIPT_MAGIC):
+                    sent, = STAMP.unpack_from(audio, len(SCRIPT_MAGIC))
+                    stats.outbound.append(time.time() - sent)
+
+        listener = asyncio.create_task(listen())
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        pad = b"\xff" * (FRAME_BYTES - len(LOAD_MAGIC) - STAMP.size)
+        for seq in range(frames):
+            payload = base64.b64encode(LOAD_MAGIC + STAMP.pack(time.time()) + pad).decode()
+            await ws.send(_harness.wire({"event": "media", "streamSid": sid,
+                                      "media": {"payload": payload}}))
+            stats.sent += 1
+            await asyncio.sleep(max(0.0, start + (seq + 1) * FRAME_INTERVAL - loop.time()))
+
+        await asyncio.sleep(1.0)  # let in-flight frames and replies land
+        await ws.send(_harness.wire({"event": "stop", "streamSid": sid}))
+        listener.cancel()
+
+
+async def _run_level(port: int, level: int, seconds: float) -> CallStats:
+    stats = CallStats()
+    frames = int(seconds / FRAME_INTERVAL)
+    results = await asyncio.gather(
+        *(_caller(port, f"+1{level:04d}{i:06d}", frames, stats) for i in range(level)),
+        return_exceptions=True,
+    )
+    stats.failed = sum(isinstance(r, Exception) for r in results)
+    return stats
+
+
+def _upstream_stats(rt_port: int, reset: bool = False) -> dict:
+    """Inbound relay stats recorded by the fake upstream."""
+    url = f"http://127.0.0.1:{rt_port}/stats" + ("?reset=1" if reset else "")
+    with urllib.request.urlopen(url) as r:
+        return json.loads(r.read())
+
+
+def _turn_latency_mean(port: int) -> float:
+    """Mean turn latency so far, scraped from the server's /metrics."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as r:
+        text = r.read().decode()
+    total = re.search(r"^call_turn_latency_seconds_sum (\S+)$", text, re.M)
+    count = re.search(r"^call_turn_latency_seconds_count (\S+)$", text, re.M)
+    if not total or not count or float(count.group(1)) == 0:
+        return float("nan")
+    return float(total.group(1)) / float(count.group(1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--server", choices=list(_harness.SERVER_MODES), default="asgi")
+    parser.add_argument("--ramp", nargs="+", type=int, default=[10, 25, 50, 100, 200])
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--turn-frames", type=int, default=150)
+    parser.add_argument("--slo-p99-ms", type=float, default=100.0)
+    parser.add_argument("--max-drop", type=float, default=0.01)
+    parser.add_argument("--record", action="store_true")
+    args = parser.parse_args()
+
+    rt_port, app_port = _harness.free_port(), _harness.free_port()
+    env = _harness.bench_env(rt_port)
+    if args.record:
+        env["RECORDING_DIR"] = tempfile.mkdtemp(prefix="bench_rec_")
+    _harness.seed(env, 0, twilio_number=TWILIO_NUMBER, record_calls=args.record)
+    realtime = _harness.start_realtime(rt_port, "--mode", "script",
+                                       "--turn-frames", str(args.turn_frames))
+    server = _harness.start_server(args.server, app_port, env)
+
+    print(f"server={args.server}  {args.seconds:.0f}s per level  "
+          f"SLO: relay p99 < {args.slo_p99_ms:.0f} ms, drops < {args.max_drop:.1%}")
+    print(f"{'':>5} {'inbound relay ms':^23} {'outbound ms':^15}")
+    print(f"{'calls':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'p50':>7} {'p99':>7} {'dropped':>8} "
+          f"{'failed':>6} {'script':>7} {'clears':>6} {'cpu ms/call·s':>13} {'turn ms':>8}  result")
+    sustainable = 0
+    try:
+        for level in args.ramp:
+            _upstream_stats(rt_port, reset=True)
+            cpu_before = _harness.tree_cpu_seconds(server.pid)
+            stats = asyncio.run(_run_level(app_port, level, args.seconds))
+            cpu_used = _harness.tree_cpu_seconds(server.pid) - cpu_before
+            inbound = _upstream_stats(rt_port)
+
+            p = _harness.percentile
+            dropped = stats.sent - inbound["frames"]
+            drop_ratio = dropped / stats.sent if stats.sent else 1.0
+            in_p99 = inbound["p99_ms"] if inbound["frames"] else float("inf")
+            out_p99 = p(stats.outbound, 99) * 1e3 if stats.outbound else 0.0
+            ok = (stats.failed == 0 and drop_ratio <= args.max_drop
+                  and max(in_p99, out_p99) <= args.slo_p99_ms)
+            if ok:
+                sustainable = level
+            print(f"{level:>5} {inbound['p50_ms'] or 0:>7.1f} {inbound['p95_ms'] or 0:>7.1f} "
+                  f"{in_p99:>7.1f} {p(stats.outbound, 50) * 1e3:>7.1f} {out_p99:>7.1f} "
+                  f"{dropped:>8} {stats.failed:>6} {stats.script_frames:>7} "
+                  f"{stats.clears:>6} {cpu_used * 1e3 / (level * args.seconds):>13.2f} "
+                  f"{_turn_latency_mean(app_port) * 1e3:>8.1f}  {'ok' if ok else 'FAIL'}")
+            if not ok:
+                break
+    finally:
+        _harness.stop(server, realtime)
+
+    print(f"max sustainable concurrency: {sustainable} calls")
+    if args.record:
+        print(f"recordings: {env['RECORDING_DIR']}")
+
+
+if __name__ == "__main__":
+    main()
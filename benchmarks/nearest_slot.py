@@ -0,0 +1,132 @@
+# benchmarks/nearest_slot.py
+"""
+Nearest free slot search over a busy calendar: correctness and latency.
+
+Seeds one assistant with 15-minute slots, Sundays closed, and --occupancy
+of every slot booked from today through the horizon. For random requested
+times in the coming week it checks availability.nearest_free against a
+brute-force search (every open slot in the window, sorted by distance,
+earlier first on a tie), then times:
+
+  query   nearest_free(): one range query for the window + the bitmap search
+  cached  nearest_free(cached=True) with the days in the availability cache
+  route   GET /api/slots/<id>/nearest end to end (assistant lookup included)
+
+and fails if the cached search's p50 is over --budget-ms.
+
+    python -m benchmarks.nearest_slot --horizon 60 --occupancy 0.9 --k 3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from benchmarks import _harness
+
+
+def brute_force(grid, booked, when, k, days, now):
+    start = max(when.date() - timedelta(days=days), now.date())
+    end = when.date() + timedelta(days=days)
+    found = []
+    d = start
+    while d <= end:
+        if grid.weekdays[d.weekday()]:
+            for m in grid.minutes:
+                at = datetime.combine(d, dtime(m // 60, m % 60))
+                if at >= now and (d, at.time()) not in booked:
+                    found.append(at)
+        d += timedelta(days=1)
+    found.sort(key=lambda at: (abs((at - when).total_seconds()), at))
+    return found[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--horizon", type=int, default=60, help="days searched either side of the request")
+    parser.add_argument("--occupancy", type=float, default=0.9)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--checks", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=300)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    env = _harness.bench_env(_harness.free_port())
+    _harness.seed(env, 1)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Booking
+    from app.services import availability
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        assistant = Assistant.query.first()
+        assistant.booking_duration_minutes = 15
+        assistant.available_days = '{"monday": true, "tuesday": true, "wednesday": true, "thursday": true, ' \
+                                   '"friday": true, "saturday": true, "sunday": false}'
+        db.session.commit()
+        aid = assistant.id
+        grid = availability.SlotGrid.for_assistant(assistant)
+        rng = random.Random(17)
+        today = date.today()
+        rows = [{"assistant_id": aid, "date": today + timedelta(days=d), "time": dtime(m // 60, m % 60),
+                 "customer_name": "Caller"}
+                for d in range(args.horizon + 8) for m in grid.minutes if rng.random() < args.occupancy]
+        db.session.execute(db.insert(Booking), rows)
+        db.session.commit()
+        booked = {(r["date"], r["time"]) for r in rows}
+
+        requests = [datetime.combine(today + timedelta(days=rng.randrange(7)),
+                                     dtime(rng.randrange(8, 18), rng.choice((0, 15, 30, 45, 10))))
+                    for _ in range(args.checks)]
+        mismatches = 0
+        for when in requests:
+            now = datetime.now()
+            got = availability.nearest_free(assistant, when, k=args.k, days=args.horizon)
+            want = brute_force(grid, booked, when, args.k, args.horizon, now)
+            if got != want and datetime.now().replace(second=0, microsecond=0) == now.replace(second=0, microsecond=0):
+                mismatches += 1
+                if mismatches == 1:
+                    print(f"mismatch for {when}: got {got}, want {want}")
+            assert availability.nearest_free(assistant, when, k=args.k, days=args.horizon, cached=True) == got
+
+        statements = []
+        db.event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+        def timed(fn):
+            samples, before = [], len(statements)
+            for i in range(args.reads):
+                when = requests[i % len(requests)]
+                t = time.perf_counter()
+                fn(when)
+                samples.append(time.perf_counter() - t)
+            return (_harness.percentile(samples, 50) * 1e3, _harness.percentile(samples, 99) * 1e3,
+                    (len(statements) - before) / args.reads)
+
+        query = timed(lambda when: availability.nearest_free(assistant, when, k=args.k, days=args.horizon))
+        cached = timed(lambda when: availability.nearest_free(assistant, when, k=args.k, days=args.horizon,
+                                                              cached=True))
+        route = timed(lambda when: client.get(f"/api/slots/{aid}/nearest?at={when:%Y-%m-%dT%H:%M}"
+                                              f"&k={args.k}&days={args.horizon}").get_json())
+        cache_stats = availability.availability_cache.metrics()
+
+    window = 2 * args.horizon + 1
+    print(f"{grid.size} slots/day (15 min), Sundays closed, {args.occupancy:.0%} booked, {len(rows):,} bookings; "
+          f"k={args.k}, window up to {window} days ({args.horizon} either side, none in the past)")
+    print(f"checked {len(requests)} requests against brute force: {mismatches} mismatches")
+    print(f"{'path':<8} {'p50 ms':>8} {'p99 ms':>8} {'SQL':>5}")
+    for label, (p50, p99, sql) in (("query", query), ("cached", cached), ("route", route)):
+        print(f"{label:<8} {p50:>8.3f} {p99:>8.3f} {sql:>5.1f}")
+    print(f"cache day hit ratio {cache_stats['hit_ratio']:.1%}")
+    ok = cached[0] <= args.budget_ms and not mismatches
+    print(f"{'PASS' if ok else 'FAIL'}: cached search p50 {cached[0]:.3f} ms (budget {args.budget_ms} ms)")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
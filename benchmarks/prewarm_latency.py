@@ -0,0 +1,116 @@
+# benchmarks/prewarm_latency.py
+"""
+Time-to-first-audio with and without pre-warmed realtime sessions.
+
+Drives the real call flow against the ASGI server: POST /voice/voice, wait
+`--twiml-gap` (Twilio fetching the TwiML and dialing the stream), open
+/ws/call/<id>, stream 20 ms frames, and stop at the first media frame that
+comes back. The fake upstream delays every handshake by `--connect-delay`.
+
+Reported per mode:
+  connect→delta  media socket opened → first audio frame back
+  webhook→delta  /voice request sent → first audio frame back
+  pre-warm used  calls that ran on a pre-warmed session: every call opens
+                 one upstream session, plus one more when the media stream
+                 landed on a worker other than the one /voice pre-warmed on
+
+The pool is per worker, so with --workers N a pre-warmed session only
+helps when the stream reaches the same worker as the webhook.
+
+    python -m benchmarks.prewarm_latency --calls 30 --connect-delay 0.4 --workers 1
+"""
+import argparse
+import asyncio
+import base64
+import json
+import re
+import time
+import urllib.parse
+import urllib.request
+
+import websockets
+
+from benchmarks import _harness
+
+TWILIO_NUMBER = "+15550000000"
+SILENCE = base64.b64encode(b"\xff" * 160).decode()
+
+
+def _post_voice(port: int, caller: str) -> str:
+    body = urllib.parse.urlencode({"To": TWILIO_NUMBER, "From": caller}).encode()
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/voice/voice", data=body) as r:
+        return r.read().decode()
+
+
+async def _one_call(port: int, caller: str, twiml_gap: float) -> tuple[float, float]:
+    t_webhook = time.perf_counter()
+    twiml = await asyncio.to_thread(_post_voice, port, caller)
+    conversation_id = re.search(r"/ws/call/(\d+)", twiml).group(1)
+    await asyncio.sleep(twiml_gap)
+
+    t_connect = time.perf_counter()
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/call/{conversation_id}") as ws:
+        sid = f"MZ{conversation_id}"
+        await ws.send(_harness.wire({"event": "start", "start": {"streamSid": sid}}))
+
+        async def stream_frames():
+            while True:
+                await ws.send(_harness.wire({"event": "media", "streamSid": sid,
+                                          "media": {"payload": SILENCE}}))
+                await asyncio.sleep(0.02)
+
+        sender = asyncio.create_task(stream_frames())
+        try:
+            async for raw in ws:
+                if json.loads(raw).get("event") == "media":
+                    t_first = time.perf_counter()
+                    break
+        finally:
+            sender.cancel()
+        await ws.send(_harness.wire({"event": "stop", "streamSid": sid}))
+
+    return t_first - t_connect, t_first - t_webhook
+
+
+async def _run(port: int, calls: int, twiml_gap: float, tag: str):
+    connect, webhook = [], []
+    for i in range(calls):
+        c, w = await _one_call(port, f"+1{tag}{i:07d}", twiml_gap)
+        connect.append(c)
+        webhook.append(w)
+    return connect, webhook
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--connect-delay", type=float, default=0.4)
+    parser.add_argument("--twiml-gap", type=float, default=0.15)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.calls} calls, {args.workers} worker(s), upstream handshake {args.connect_delay * 1e3:.0f} ms")
+    print(f"{'prewarm':<8} {'connect→delta p50/p95 ms':>26} {'webhook→delta p50/p95 ms':>26} {'pre-warm used':>14}")
+    for prewarm in ("0", "1"):
+        rt_port, app_port = _harness.free_port(), _harness.free_port()
+        env = _harness.bench_env(rt_port)
+        env["REALTIME_PREWARM"] = prewarm
+        _harness.seed(env, 0, twilio_number=TWILIO_NUMBER)
+        realtime = _harness.start_realtime(rt_port, "--connect-delay", str(args.connect_delay))
+        server = _harness.start_server("asgi", app_port, env, "--workers", str(args.workers))
+        try:
+            connect, webhook = asyncio.run(_run(app_port, args.calls, args.twiml_gap, "55" + prewarm))
+            time.sleep(0.5)         # let the last call's sessions finish opening
+            with urllib.request.urlopen(f"http://127.0.0.1:{rt_port}/stats") as r:
+                sessions = json.loads(r.read())["connections"]
+        finally:
+            _harness.stop(server, realtime)
+        p = _harness.percentile
+        used = f"{2 * args.calls - sessions}/{args.calls}" if prewarm == "1" else "-"
+        print(f"{'on' if prewarm == '1' else 'off':<8} "
+              f"{p(connect, 50) * 1e3:>12.0f} / {p(connect, 95) * 1e3:<11.0f} "
+              f"{p(webhook, 50) * 1e3:>12.0f} / {p(webhook, 95) * 1e3:<11.0f} {used:>14}")
+
+
+if __name__ == "__main__":
+    main()
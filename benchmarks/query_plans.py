@@ -0,0 +1,244 @@
+# benchmarks/query_plans.py
+"""
+Query-plan regression check for the hot ORM queries: fails on a full scan.
+
+Seeds a database at production-like scale (millions of messages, hundreds
+of thousands of bookings and usage rows), runs the hot code paths (the
+/voice webhook, load_history, a summarizer fold, load_memory,
+save_memory_entry, load_booked_slots, the usage endpoints) with the SQL they
+emit captured, then EXPLAINs every captured SELECT/UPDATE:
+
+  - SQLite: EXPLAIN QUERY PLAN; any "SCAN <table>" step fails
+  - Postgres (--postgres-url): EXPLAIN (FORMAT JSON) with enable_seqscan off,
+    so a Seq Scan only shows up when no index can serve the query; any Seq
+    Scan node fails
+
+An index step with only range bounds (the primary key walked from id > 0
+because the conversation_id index is gone) fails too: it reads the table.
+
+Exits 1 when a hot query would scan, so it can gate a PR that changes a
+query or an index. --drop-indexes drops the hot-query indexes after seeding
+to show what a regression looks like (and what it costs).
+
+    python -m benchmarks.query_plans --messages 2000000
+    python -m benchmarks.query_plans --postgres-url postgresql://localhost/bench_plans
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+HOT_INDEXES = ("ix_assistant_twilio_number", "ix_conversation_assistant_caller",
+               "ix_message_conversation_id", "uq_booking_slot")
+CHUNK = 50_000
+
+
+def seed(db, models, args, rng):
+    """Bulk-insert the dataset; returns the conversation ids."""
+    def insert(model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == CHUNK:
+                db.session.execute(db.insert(model), batch)
+                batch = []
+        if batch:
+            db.session.execute(db.insert(model), batch)
+        db.session.commit()
+
+    user = models.User(name="bench")
+    db.session.add(user)
+    db.session.commit()
+    numbers = [f"+1555{i:07d}" for i in range(args.assistants)]
+    insert(models.Assistant, ({"name": f"A{i}", "twilio_number": n, "voice_type": "female",
+                               "start_time": "09:00", "end_time": "17:00", "booking_duration_minutes": 30,
+                               "user_id": user.id} for i, n in enumerate(numbers)))
+    assistant_ids = db.session.execute(db.select(models.Assistant.id)).scalars().all()
+
+    insert(models.Conversation, ({"assistant_id": assistant_ids[i % len(assistant_ids)],
+                                  "caller_number": f"+1444{i:07d}", "message_count": 0}
+                                 for i in range(args.conversations)))
+    conversation_ids = db.session.execute(db.select(models.Conversation.id)).scalars().all()
+
+    insert(models.Message, ({"conversation_id": rng.choice(conversation_ids), "role": ("user", "assistant")[i % 2],
+                             "content": f"message {i}: could I book something next week?"}
+                            for i in range(args.messages)))
+
+    first_day = date.today() - timedelta(days=180)
+    slots = len(assistant_ids) * 365 * 16              # one booking per slot (uq_booking_slot)
+    insert(models.Booking, ({"assistant_id": assistant_ids[k // (365 * 16)],
+                             "date": first_day + timedelta(days=k // 16 % 365),
+                             "time": dtime(9 + k % 16 // 2, k % 2 * 30),
+                             "customer_name": f"Caller {k}"}
+                            for k in rng.sample(range(slots), min(args.bookings, slots))))
+
+    now = datetime.utcnow()
+    insert(models.Usage, ({"assistant_id": rng.choice(assistant_ids), "conversation_id": rng.choice(conversation_ids),
+                           "source": ("realtime", "chat", "summary")[i % 3], "model": "gpt-4o-mini-realtime-preview",
+                           "input_tokens": 1700, "cached_tokens": 1500, "output_tokens": 160,
+                           "audio_input_tokens": 0, "audio_output_tokens": 0, "cost_usd": 0.001,
+                           "latency_ms": 900.0, "ttfb_ms": 400.0,
+                           "created_at": now - timedelta(days=rng.randrange(90))}
+                          for i in range(args.usage)))
+    insert(models.UsageRollup, ({"assistant_id": a, "day": (now - timedelta(days=d)).date(), "source": s,
+                                 "requests": 10, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+                                 "audio_input_tokens": 0, "audio_output_tokens": 0, "cost_usd": 0.0,
+                                 "latency_ms_sum": 0.0, "latency_ms_max": 0.0, "ttfb_ms_sum": 0.0,
+                                 "ttfb_count": 0}
+                                for a in assistant_ids for d in range(90) for s in ("realtime", "chat", "summary")))
+    return conversation_ids
+
+
+def explain(conn, statement, parameters) -> tuple[str, bool]:
+    """(plan summary, scans a table)"""
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()[0]["Plan"]
+        nodes, stack = [], [plan]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.get("Plans", []))
+        steps = [" ".join(filter(None, (n["Node Type"], n.get("Relation Name"), n.get("Index Name"))))
+                 for n in nodes if "Scan" in n["Node Type"]]
+        scans = any(n["Node Type"] == "Seq Scan"
+                    or ("Index" in n["Node Type"] and not _has_equality(f"({n.get('Index Cond', '')})"))
+                    for n in nodes)
+        return "; ".join(steps), scans
+
+    details = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+    scans = [d for d in details if (d.startswith("SCAN ") and not d.startswith("SCAN CONSTANT"))
+             or (d.startswith("SEARCH ") and not _has_equality(d))]
+    return "; ".join(details), bool(scans)
+
+
+def _has_equality(step: str) -> bool:
+    """
+    An index step bounded only by ranges (rowid>? on a missing index, or
+    id > 0 in Postgres) walks most of the table, so it counts as a scan.
+    """
+    cond = step[step.find("("):] if "(" in step else ""
+    return "=?" in cond or " = " in cond
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assistants", type=int, default=500)
+    parser.add_argument("--conversations", type=int, default=50_000)
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--bookings", type=int, default=300_000)
+    parser.add_argument("--usage", type=int, default=300_000)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs of each hot path")
+    parser.add_argument("--postgres-url", help="run against this (empty, throwaway) Postgres database")
+    parser.add_argument("--drop-indexes", action="store_true", help="drop the hot-query indexes to see a failure")
+    args = parser.parse_args()
+
+    port = _harness.free_port()
+    start_in_thread(port, 20, 2000)          # load_history schedules summaries for long conversations
+    env = _harness.bench_env(_harness.free_port())
+    env["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    if args.postgres_url:
+        env["DATABASE_URL"] = args.postgres_url
+    os.environ.update(env)
+
+    from app import create_app, models
+    from app.extensions import db
+    from app.services.booking import load_booked_slots
+    from app.services.history import Summarizer, history_cache, load_history
+    from app.services.memory import load_memory, save_memory_entry
+
+    class NoLLMSummarizer(Summarizer):
+        def _summarize(self, convo, summary, batch):
+            return f"{len(batch)} messages"
+
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(5)
+    with app.app_context():
+        started = time.perf_counter()
+        conversation_ids = seed(db, models, args, rng)
+        seed_s = time.perf_counter() - started
+        if args.drop_indexes:
+            for name in HOT_INDEXES:
+                db.session.execute(db.text(f"DROP INDEX {name}"))
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+        history_cache.max_chars = 0          # every load_history goes to the database
+
+        convo = db.session.get(models.Conversation, rng.choice(conversation_ids))
+        number = db.session.get(models.Assistant, convo.assistant_id).twilio_number
+        aid, cid, caller = convo.assistant_id, convo.id, convo.caller_number
+        day = date.today()
+        hot_paths = {
+            "voice webhook":       lambda: client.post("/voice/voice", data={"To": number, "From": caller}),
+            "load_history":        lambda: load_history(cid),
+            "summarizer fold":     lambda: NoLLMSummarizer().fold(cid),
+            "load_memory":         lambda: load_memory(cid),
+            "save_memory_entry":   lambda: save_memory_entry(cid, "user", "hello again"),
+            "load_booked_slots":   lambda: load_booked_slots(aid, day),
+            "usage dashboard":     lambda: client.get(f"/api/usage/{aid}"),
+            "conversation usage":  lambda: client.get(f"/api/usage/{aid}?conversation_id={cid}"),
+        }
+
+        statements, main_thread = [], threading.get_ident()
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if threading.get_ident() == main_thread and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+                statements.append((statement, parameters))
+
+        timings, captured = {}, []
+        db.event.listen(db.engine, "before_cursor_execute", capture)
+        for label, fn in hot_paths.items():
+            del statements[:]
+            fn()
+            seen = set()
+            for statement, parameters in statements:
+                if statement not in seen:
+                    seen.add(statement)
+                    captured.append((label, statement, parameters))
+        db.event.remove(db.engine, "before_cursor_execute", capture)
+
+        for label, fn in hot_paths.items():
+            samples = []
+            for _ in range(args.repeat):
+                db.session.remove()
+                t = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - t)
+            timings[label] = _harness.percentile(samples, 50) * 1e3
+
+        failures = 0
+        results = []
+        with db.engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.exec_driver_sql("SET enable_seqscan = off")
+            for label, statement, parameters in captured:
+                plan, scans = explain(conn, statement, parameters)
+                failures += scans
+                results.append((label, statement, plan, scans))
+        dialect = db.engine.dialect.name
+
+    print(f"{dialect}: {args.messages:,} messages, {args.conversations:,} conversations, "
+          f"{args.bookings:,} bookings, {args.usage:,} usage rows seeded in {seed_s:.0f} s"
+          + (" (hot-query indexes dropped)" if args.drop_indexes else ""))
+    print(f"{'hot path':<20} {'p50 ms':>8}")
+    for label, ms in timings.items():
+        print(f"{label:<20} {ms:>8.2f}")
+    print()
+    for label, statement, plan, scans in results:
+        print(f"[{'FAIL' if scans else ' ok '}] {label}: {' '.join(statement.split())[:110]}")
+        print(f"       {plan}")
+    print()
+    if failures:
+        print(f"{failures} hot quer{'y' if failures == 1 else 'ies'} scan a table")
+        sys.exit(1)
+    print(f"all {len(results)} hot queries use an index")
+
+
+if __name__ == "__main__":
+    main()
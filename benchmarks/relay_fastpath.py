@@ -0,0 +1,151 @@
+# benchmarks/relay_fastpath.py
+"""
+Per-frame relay cost: full JSON parse/serialize vs the fast path (app/services/relay.py).
+
+Runs both directions of the relay on one core, on messages shaped like the
+real ones:
+  - inbound:  Twilio `media` event → input_audio_buffer.append
+  - outbound: response.audio.delta → 20 ms frames → Twilio `media` events
+and reports 20 ms frames per second per core for each, plus what
+permessage-deflate would add on top of every upstream message.
+
+    python -m benchmarks.relay_fastpath --frames 200000 --delta-ms 100
+"""
+import argparse
+import base64
+import json
+import os
+import time
+import zlib
+
+from app.services import relay
+from app.services.audio_out import OutboundAudio, FRAME_BYTES, FRAME_MS
+
+STREAM_SID = "MZ" + "0123456789abcdef" * 2
+
+
+def twilio_media(seq: int, payload: str) -> str:
+    return json.dumps({
+        "event": "media",
+        "sequenceNumber": str(seq),
+        "media": {"track": "inbound", "chunk": str(seq), "timestamp": str(seq * FRAME_MS),
+                  "payload": payload},
+        "streamSid": STREAM_SID,
+    }, separators=(",", ":"))
+
+
+def audio_delta(seq: int, delta: str) -> str:
+    return json.dumps({
+        "type": "response.audio.delta",
+        "event_id": f"event_{seq:020d}",
+        "response_id": "resp_0123456789abcdef",
+        "item_id": "item_0123456789abcdef",
+        "output_index": 0,
+        "content_index": 0,
+        "delta": delta,
+    }, separators=(",", ":"))
+
+
+def inbound_legacy(messages):
+    for raw in messages:
+        data = json.loads(raw)
+        if data["event"] == "media":
+            json.dumps({"type": "input_audio_buffer.append", "audio": data["media"]["payload"]})
+
+
+def inbound_fast(messages):
+    for raw in messages:
+        payload = relay.twilio_media_payload(raw)
+        if payload is None:
+            payload = json.loads(raw)["media"]["payload"]
+        relay.append_message(payload)
+
+
+def _drain(out: OutboundAudio, fmt):
+    frames = out._frames
+    while frames:
+        _, frame = frames.popleft()
+        fmt(frame)
+
+
+def outbound_legacy(messages, out: OutboundAudio):
+    fmt = lambda frame: json.dumps({"event": "media", "streamSid": STREAM_SID,
+                                    "media": {"payload": frame}})
+    for raw in messages:
+        data = json.loads(raw)
+        if data["type"] == "response.audio.delta":
+            out.enqueue(data.get("item_id"), data["delta"])
+            _drain(out, fmt)
+
+
+def outbound_fast(messages, out: OutboundAudio):
+    prefix = relay.media_prefix(STREAM_SID)
+    fmt = lambda frame: relay.media_message(prefix, frame)
+    for raw in messages:
+        audio = relay.audio_delta(raw)
+        out.enqueue(*audio)
+        _drain(out, fmt)
+
+
+def deflate(messages):
+    """What permessage-deflate (context takeover) does to every message."""
+    z = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    for raw in messages:
+        z.compress(raw.encode())
+        z.flush(zlib.Z_SYNC_FLUSH)
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=200_000, help="20 ms frames per direction")
+    parser.add_argument("--delta-ms", type=int, default=100, help="audio per upstream delta")
+    args = parser.parse_args()
+
+    # random bytes: μ-law speech is close to incompressible after base64 anyway
+    inbound = [twilio_media(i, base64.b64encode(os.urandom(FRAME_BYTES)).decode())
+               for i in range(args.frames)]
+    per_delta = max(1, args.delta_ms // FRAME_MS)
+    outbound = [audio_delta(i, base64.b64encode(os.urandom(FRAME_BYTES * per_delta)).decode())
+                for i in range(args.frames // per_delta)]
+    out_frames = len(outbound) * per_delta
+
+    # sanity: the fast path must produce what the full parse produces
+    sample = json.loads(inbound[0])
+    assert json.loads(relay.append_message(relay.twilio_media_payload(inbound[0]))) == \
+        {"type": "input_audio_buffer.append", "audio": sample["media"]["payload"]}
+    assert relay.audio_delta(outbound[0]) == ("item_0123456789abcdef", json.loads(outbound[0])["delta"])
+
+    out = OutboundAudio(send=None)
+    out.stream_sid = STREAM_SID
+    rows = [
+        ("inbound  (Twilio → upstream)", args.frames,
+         timed(inbound_legacy, inbound), timed(inbound_fast, inbound)),
+        ("outbound (upstream → Twilio)", out_frames,
+         timed(outbound_legacy, outbound, out), timed(outbound_fast, outbound, out)),
+    ]
+
+    print(f"{'direction':<30} {'full parse':>14} {'fast path':>14} {'speed-up':>9}   (20 ms frames/s/core)")
+    for name, frames, legacy, fast in rows:
+        print(f"{name:<30} {frames / legacy:>14,.0f} {frames / fast:>14,.0f} {legacy / fast:>8.1f}x")
+
+    appends = [relay.append_message(relay.twilio_media_payload(m)) for m in inbound]
+    z_in = timed(deflate, appends) / args.frames * 1e6
+    z_out = timed(deflate, outbound) / out_frames * 1e6
+    print(f"permessage-deflate would add {z_in:.1f} µs per inbound and "
+          f"{z_out:.1f} µs per outbound frame (disabled upstream)")
+    per_call = 1000 / FRAME_MS   # frames/s each way for one call
+    (_, n_in, l_in, f_in), (_, n_out, l_out, f_out) = rows
+    legacy_s = (l_in / n_in + l_out / n_out) * per_call
+    fast_s = (f_in / n_in + f_out / n_out) * per_call
+    print(f"relay JSON work alone caps a core at ~{1 / legacy_s:,.0f} calls (full parse) "
+          f"vs ~{1 / fast_s:,.0f} calls (fast path)")
+
+
+if __name__ == "__main__":
+    main()
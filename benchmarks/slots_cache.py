@@ -0,0 +1,170 @@
+# benchmarks/slots_cache.py
+"""
+GET /api/slots throughput under concurrency, availability cache on vs off.
+
+Seeds one assistant with a busy calendar (--occupancy of its 15-minute
+slots booked over --days days), then for each mode starts the threaded
+server (run.py) and has --clients threads, each on its own keep-alive
+connection, request /api/slots for random days in the range for
+--seconds. Meanwhile "another worker" books a free slot --bookings-per-s
+times a second straight in the database (insert + bookings_version bump,
+what handle_booking commits), so cached days keep going stale the way
+they would in production.
+
+  off  AVAILABILITY_CACHE_DAYS=0: template rebuilt and one query per request
+  on   templates and per-day rows served from memory until a booking
+
+Reports req/s, p50/p99 latency and the cache counters from /metrics, and
+checks that every free slot a client was shown was free in the database
+as of the request, apart from slots booked during it.
+
+    python -m benchmarks.slots_cache --clients 1 8 32 --seconds 10
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, time as dtime, timedelta
+
+from benchmarks import _harness
+
+
+def client(port, aid, days, until, latencies, seen, lock, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    mine, samples = [], []
+    while time.perf_counter() < until:
+        d = days[rng.randrange(len(days))]
+        t = time.perf_counter()
+        conn.request("GET", f"/api/slots/{aid}?date={d}")
+        body = json.loads(conn.getresponse().read())
+        samples.append(time.perf_counter() - t)
+        mine.append((d, t, body["slots"]))
+    conn.close()
+    with lock:
+        latencies.extend(samples)
+        seen.extend(mine)
+
+
+def writer(db_path, aid, days, minutes, rate, until, booked_at, seed):
+    """Another worker's bookings: insert + version bump in one transaction."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    while rate > 0 and time.perf_counter() < until:
+        d, m = days[rng.randrange(len(days))], minutes[rng.randrange(len(minutes))]
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO booking (assistant_id, date, time, customer_name) VALUES (?, ?, ?, ?)",
+            (aid, d, f"{m // 60:02d}:{m % 60:02d}:00.000000", "Other worker"))
+        if cur.rowcount:
+            conn.execute("UPDATE assistant SET bookings_version = bookings_version + 1 WHERE id = ?", (aid,))
+        conn.execute("COMMIT")
+        if cur.rowcount:
+            booked_at[(d, m)] = time.perf_counter()
+        time.sleep(1 / rate)
+    conn.close()
+
+
+def run(mode, args, env, aid, days, minutes, db_path):
+    env = dict(env, AVAILABILITY_CACHE_DAYS="0" if mode == "off" else str(args.cache_days))
+    port = _harness.free_port()
+    server = _harness.start_server("threaded", port, env)
+    results = []
+    try:
+        for n in args.clients:
+            latencies, seen, booked_at, lock = [], [], {}, threading.Lock()
+            until = time.perf_counter() + args.seconds
+            threads = [threading.Thread(target=client, args=(port, aid, days, until, latencies, seen, lock, i))
+                       for i in range(n)]
+            threads.append(threading.Thread(target=writer, args=(db_path, aid, days, minutes,
+                                                                 args.bookings_per_s, until, booked_at, f"{mode}{n}")))
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - started
+
+            conn = sqlite3.connect(db_path)
+            taken = {(d, int(t[:2]) * 60 + int(t[3:5])) for d, t in conn.execute(
+                "SELECT date, time FROM booking WHERE assistant_id = ?", (aid,))}
+            conn.close()
+            wrong = 0
+            for d, t, slots in seen:
+                for label in slots:
+                    hm, ampm = label.split()
+                    h, m = map(int, hm.split(":"))
+                    minute = (h % 12 + (12 if ampm == "PM" else 0)) * 60 + m
+                    # booked before this request was sent, yet offered as free
+                    wrong += (d, minute) in taken and booked_at.get((d, minute), 0) < t
+            results.append((n, len(latencies) / wall, _harness.percentile(latencies, 50) * 1e3,
+                            _harness.percentile(latencies, 99) * 1e3, len(booked_at), wrong))
+
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", "/metrics")
+        counters = {line.split()[0].removeprefix("availability_cache_").removesuffix("_total"):
+                    float(line.split()[1])
+                    for line in conn.getresponse().read().decode().splitlines()
+                    if line.startswith("availability_cache_")}
+        conn.close()
+    finally:
+        _harness.stop(server)
+    return results, counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--occupancy", type=float, default=0.6)
+    parser.add_argument("--bookings-per-s", type=float, default=5)
+    parser.add_argument("--cache-days", type=int, default=100_000)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+    env = _harness.bench_env(_harness.free_port(), db_path)
+    _harness.seed(env, 1)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Booking
+    from app.services.availability import SlotGrid
+
+    app = create_app()
+    with app.app_context():
+        assistant = Assistant.query.first()
+        assistant.booking_duration_minutes = 15
+        db.session.commit()
+        aid, grid = assistant.id, SlotGrid.for_assistant(assistant)
+        first = date.today() + timedelta(days=1)
+        days = [first + timedelta(days=i) for i in range(args.days)]
+        rng = random.Random(3)
+        db.session.execute(db.insert(Booking), [
+            {"assistant_id": aid, "date": d, "time": dtime(m // 60, m % 60), "customer_name": "Caller"}
+            for d in days for m in grid.minutes if rng.random() < args.occupancy])
+        db.session.commit()
+    days = [d.isoformat() for d in days]
+
+    print(f"/api/slots, {args.days} days x {grid.size} slots, {args.occupancy:.0%} booked, "
+          f"another worker booking {args.bookings_per_s:g}/s, {args.seconds:g} s per run")
+    print(f"{'cache':>5} {'clients':>7} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'bookings':>8} {'stale slots shown':>17}")
+    for mode in ("off", "on"):
+        results, counters = run(mode, args, env, aid, days, grid.minutes, db_path)
+        for n, rps, p50, p99, booked, wrong in results:
+            print(f"{mode:>5} {n:>7} {rps:>8.0f} {p50:>7.2f} {p99:>7.2f} {booked:>8} {wrong:>17}")
+        if mode == "on":
+            print(f"cache: day hit ratio {counters.get('hit_ratio', 0):.1%} "
+                  f"({counters.get('day_hits', 0):.0f} hits, {counters.get('day_misses', 0):.0f} misses), "
+                  f"{counters.get('stale', 0):.0f} stale reloads, "
+                  f"template hits {counters.get('template_hits', 0):.0f} / misses {counters.get('template_misses', 0):.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/usage_rollup.py
+"""
+Usage accounting: hot-path cost, batched persistence, and dashboard reads
+from the rollups vs scanning raw usage rows.
+
+1. A few text turns through process_input against the local fake OpenRouter
+   (benchmarks/fake_openrouter.py), which reports usage like OpenRouter.
+2. --rows realtime-shaped usage rows spread over 30 days, queued through
+   the write-behind queue the way calls queue them. The rollup upsert runs
+   in each batch's transaction.
+3. GET /api/usage/<assistant> (reads usage_rollup) vs the same 30-day,
+   per-day/per-source aggregate computed from the raw usage table.
+
+    python -m benchmarks.usage_rollup --rows 100000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import _harness
+from benchmarks.fake_openrouter import start_in_thread
+
+REALTIME_USAGE = {
+    "input_tokens": 1700, "output_tokens": 160,
+    "input_token_details": {"text_tokens": 1650, "audio_tokens": 50, "cached_tokens": 1536,
+                            "cached_tokens_details": {"text_tokens": 1536, "audio_tokens": 0}},
+    "output_token_details": {"text_tokens": 40, "audio_tokens": 120},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--reads", type=int, default=20)
+    args = parser.parse_args()
+
+    port = _harness.free_port()
+    start_in_thread(port, 50, 1000)
+    env = _harness.bench_env(_harness.free_port())
+    env["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    conversation_ids = _harness.seed(env, 20)
+    os.environ.update(env)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Assistant, Usage
+    from app.services import usage
+    from app.services.assistant import process_input
+    from app.services.write_behind import write_behind
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        assistant = Assistant.query.first()
+        aid = assistant.id
+
+        for _ in range(args.turns):
+            process_input("What are your opening hours?", assistant, conversation_ids[0])
+        write_behind.flush(30)
+        chat = client.get(f"/api/usage/{aid}?conversation_id={conversation_ids[0]}").get_json()
+
+        started = time.perf_counter()
+        for _ in range(10_000):
+            usage.record(REALTIME_USAGE, assistant_id=aid, conversation_id=conversation_ids[1],
+                         source="realtime", model="gpt-4o-mini-realtime-preview-2024-12-17",
+                         latency_ms=900.0, ttfb_ms=450.0)
+        record_us = (time.perf_counter() - started) / 10_000 * 1e6
+        write_behind.flush(120)
+
+        rng = random.Random(1)
+        today = datetime.now(timezone.utc).replace(tzinfo=None)
+        counts = usage.tokens(REALTIME_USAGE)
+        price = usage.cost("gpt-4o-mini-realtime-preview", REALTIME_USAGE, counts)
+        before = dict(write_behind.counters)
+        started = time.perf_counter()
+        for i in range(args.rows):
+            write_behind.put(
+                Usage, assistant_id=aid, conversation_id=rng.choice(conversation_ids),
+                source=("realtime", "chat", "summary")[i % 3], model="gpt-4o-mini-realtime-preview",
+                cost_usd=price, latency_ms=rng.uniform(400, 2000), ttfb_ms=rng.uniform(200, 900),
+                created_at=today - timedelta(days=rng.randrange(30), seconds=rng.randrange(86400)),
+                **counts,
+            )
+        write_behind.flush(600)
+        write_s = time.perf_counter() - started
+        batches = write_behind.counters["batches"] - before["batches"]
+
+        def timed(fn):
+            samples = []
+            for _ in range(args.reads):
+                t = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - t)
+            return _harness.percentile(samples, 50) * 1e3
+
+        start = (today - timedelta(days=29)).date()
+        rollup_ms = timed(lambda: client.get(f"/api/usage/{aid}").get_json())
+        raw_ms = timed(lambda: db.session.query(
+            db.func.date(Usage.created_at), Usage.source, db.func.count(),
+            *(db.func.sum(getattr(Usage, f)) for f in (*usage.TOKEN_FIELDS, "cost_usd", "latency_ms", "ttfb_ms")),
+            db.func.max(Usage.latency_ms),
+        ).filter(Usage.assistant_id == aid, Usage.created_at >= start)
+         .group_by(db.func.date(Usage.created_at), Usage.source).all())
+        dashboard = client.get(f"/api/usage/{aid}").get_json()
+        raw_rows = Usage.query.filter_by(assistant_id=aid).count()
+
+    t = chat["totals"]
+    print(f"text path: {t['requests']} completions accounted, {t['input_tokens']} in / "
+          f"{t['output_tokens']} out tokens, ${t['cost_usd']:.6f}, avg latency {t['avg_latency_ms']} ms")
+    print(f"usage.record() on the hot path: {record_us:.1f} µs per response (queues a row, no DB)")
+    print(f"{args.rows:,} rows written in {batches} batches, rollups included: "
+          f"{args.rows / write_s:,.0f} rows/s")
+    print(f"30-day dashboard over {raw_rows:,} raw rows: rollups (API, {len(dashboard['days'])} rows) "
+          f"{rollup_ms:.1f} ms p50 vs raw scan {raw_ms:.1f} ms p50")
+    print(f"rollup totals: {dashboard['totals']['requests']:,} requests, ${dashboard['totals']['cost_usd']:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/ws_concurrency.py
+"""
+Compare the two media-stream serving modes under concurrent calls.
+
+  threaded  flask-sock, one thread + asyncio.run() per call (run.py)
+  asgi      Quart/Hypercorn, every CallHandler on one shared loop (asgi.py)
+
+Each simulated call streams 20 ms μ-law frames into /ws/call/<id>; the fake
+realtime upstream echoes every frame back as response.audio.delta, so the
+number measured is the full Twilio → CallHandler → upstream → Twilio relay.
+
+    python -m benchmarks.ws_concurrency --calls 10 50 100 200 --seconds 10
+"""
+import argparse
+import asyncio
+import base64
+import json
+import struct
+import time
+
+import websockets
+
+from benchmarks import _harness
+
+FRAME_BYTES = 160          # 20 ms of 8 kHz μ-law
+FRAME_INTERVAL = 0.020
+
+
+async def _call(port: int, conversation_id: int, frames: int, stats: dict):
+    uri = f"ws://127.0.0.1:{port}/ws/call/{conversation_id}"
+    stream_sid = f"MZbench{conversation_id}"
+    sent_at: dict[int, float] = {}
+
+    async with websockets.connect(uri, max_size=None) as ws:
+        await ws.send(_harness.wire({"event": "start", "start": {"streamSid": stream_sid}}))
+
+        async def read_echoes():
+            async for raw in ws:
+                msg = json.loads(raw)
+                if msg.get("event") != "media":
+                    continue
+                seq, = struct.unpack_from("!I", base64.b64decode(msg["media"]["payload"]))
+                t0 = sent_at.pop(seq, None)
+                if t0 is not None:
+                    stats["latencies"].append(time.perf_counter() - t0)
+
+        reader = asyncio.create_task(read_echoes())
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for seq in range(frames):
+            payload = struct.pack("!I", seq) + b"\xff" * (FRAME_BYTES - 4)
+            sent_at[seq] = time.perf_counter()
+            await ws.send(_harness.wire({
+                "event": "media",
+                "streamSid": stream_sid,
+                "media": {"payload": base64.b64encode(payload).decode()},
+            }))
+            await asyncio.sleep(max(0.0, start + (seq + 1) * FRAME_INTERVAL - loop.time()))
+
+        await asyncio.sleep(1.0)  # let in-flight echoes land
+        await ws.send(_harness.wire({"event": "stop", "streamSid": stream_sid}))
+        reader.cancel()
+        stats["lost"] += len(sent_at)
+
+
+async def _sample(pid: int, stats: dict, stop: asyncio.Event):
+    last_cpu, last_t = _harness.tree_cpu_seconds(pid), time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.5)
+        cpu, now = _harness.tree_cpu_seconds(pid), time.perf_counter()
+        stats["threads"] = max(stats["threads"], _harness.tree_threads(pid))
+        stats["cpu"].append(100 * (cpu - last_cpu) / (now - last_t))
+        last_cpu, last_t = cpu, now
+
+
+async def _run_level(port: int, pid: int, convo_ids: list[int], calls: int, seconds: float):
+    stats = {"latencies": [], "lost": 0, "threads": 0, "cpu": [], "failed": 0}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample(pid, stats, stop))
+    frames = int(seconds / FRAME_INTERVAL)
+    results = await asyncio.gather(
+        *(_call(port, cid, frames, stats) for cid in convo_ids[:calls]),
+        return_exceptions=True,
+    )
+    stats["failed"] = sum(isinstance(r, Exception) for r in results)
+    stop.set()
+    await sampler
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modes", nargs="+", default=list(_harness.SERVER_MODES))
+    parser.add_argument("--calls", nargs="+", type=int, default=[10, 50, 100])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<9} {'calls':>5} {'p50 ms':>8} {'p99 ms':>8} {'lost':>6} "
+          f"{'failed':>6} {'threads':>7} {'cpu %':>6}")
+    for mode in args.modes:
+        rt_port, app_port = _harness.free_port(), _harness.free_port()
+        env = _harness.bench_env(rt_port)
+        convo_ids = _harness.seed(env, max(args.calls))
+        realtime = _harness.start_realtime(rt_port)
+        server = _harness.start_server(mode, app_port, env)
+        try:
+            for calls in args.calls:
+                s = asyncio.run(_run_level(app_port, server.pid, convo_ids, calls, args.seconds))
+                lat = s["latencies"]
+                cpu = sum(s["cpu"]) / len(s["cpu"]) if s["cpu"] else 0.0
+                print(f"{mode:<9} {calls:>5} {_harness.percentile(lat, 50) * 1e3:>8.1f} "
+                      f"{_harness.percentile(lat, 99) * 1e3:>8.1f} {s['lost']:>6} "
+                      f"{s['failed']:>6} {s['threads']:>7} {cpu:>6.0f}")
+        finally:
+            _harness.stop(server, realtime)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+# tests/test_metrics.py
+"""Prometheus types on /metrics: running totals are counters, levels are gauges."""
+from app.routes.metrics_routes import _lines
+
+
+def test_totals_are_counters_and_levels_gauges():
+    lines = _lines("write_behind", {"written": 7, "queue_depth": 3})
+    assert lines == [
+        "# TYPE write_behind_written_total counter",
+        "write_behind_written_total 7",
+        "# TYPE write_behind_queue_depth gauge",
+        "write_behind_queue_depth 3",
+    ]
+
+
+def test_a_source_without_gauges_is_all_counters():
+    assert _lines("vad", {"frames_in": 2}) == ["# TYPE vad_frames_in_total counter",
+                                               "vad_frames_in_total 2"]
@@ -0,0 +1,70 @@
+# tests/test_migrations.py
+"""The migration runner against SQLite."""
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.migrations import MIGRATIONS, migrate, schema_migrations
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return sa.create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+
+
+def test_fresh_database_applies_every_step_once(engine):
+    assert migrate(engine) == [migration_id for migration_id, _ in MIGRATIONS]
+    assert migrate(engine) == []
+
+
+def test_model_column_without_a_migration_stops_startup(engine):
+    migrate(engine)
+    with engine.begin() as conn:
+        # as if a commit added Assistant.answer_cache without shipping its ALTER
+        conn.execute(sa.text("ALTER TABLE assistant DROP COLUMN answer_cache"))
+
+    with pytest.raises(RuntimeError, match=r"assistant\.answer_cache"):
+        migrate(engine)
+
+
+COLUMNS_SINCE_FIRST_RELEASE = {
+    "assistant": ["vad_threshold_db", "record_calls", "config_version", "answer_cache"],
+    "conversation": ["summary", "summary_through", "message_count"],
+}
+
+
+def _first_release_schema(engine):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table, columns in COLUMNS_SINCE_FIRST_RELEASE.items():
+            for column in columns:
+                conn.execute(sa.text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(sa.text("INSERT INTO conversation (id, assistant_id, caller_number) "
+                             "VALUES (1, 1, '+15550000000')"))
+        conn.execute(sa.text("INSERT INTO message (conversation_id, role, content) "
+                             "VALUES (1, 'user', 'hi'), (1, 'assistant', 'hello')"))
+
+
+def test_database_from_before_the_runner_upgrades(engine):
+    _first_release_schema(engine)
+
+    assert migrate(engine) == [migration_id for migration_id, _ in MIGRATIONS]
+    with engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT message_count FROM conversation")).scalar() == 2
+
+
+def test_database_that_ran_the_retired_0002_upgrades(engine):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        schema_migrations.create(conn)
+        for migration_id in ("0001_initial_tables", "0002_columns_since_first_release",
+                             "0003_hot_query_indexes", "0004_booking_slot_unique",
+                             "0005_assistant_bookings_version", "0006_user_assistants_version"):
+            conn.execute(schema_migrations.insert().values(
+                id=migration_id, applied_at=datetime(2026, 1, 1)))
+
+    # 0007-0012 make 0002's changes again, as no-ops
+    assert migrate(engine) == [migration_id for migration_id, _ in MIGRATIONS
+                               if migration_id >= "0007"]
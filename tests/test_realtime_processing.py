@@ -0,0 +1,104 @@
+# tests/test_realtime_processing.py
+"""CallHandler._one_ai_turn against the event names the Realtime API sends."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import realtime_processing
+from app.services.realtime_processing import CallHandler
+
+
+def compact(event: dict) -> str:
+    return json.dumps(event, separators=(",", ":"))
+
+
+class FakeUpstream:
+    """Async-iterable stand-in for the OpenAI websocket; counts what was read."""
+    def __init__(self, events):
+        self.events = [compact(e) for e in events]
+        self.read = 0
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.read == len(self.events):
+            raise StopAsyncIteration
+        self.read += 1
+        return self.events[self.read - 1]
+
+    async def send(self, data):
+        self.sent.append(data)
+
+
+class FakeAudioOut:
+    def __init__(self):
+        self.frames = []
+        self.interrupts = 0
+
+    def enqueue(self, item_id, delta):
+        self.frames.append(delta)
+
+    async def interrupt(self):
+        self.interrupts += 1
+        return None, 0
+
+
+def reply_events(delta_type: str):
+    """A booking reply: speech, then the JSON block split across deltas, audio in between."""
+    text = ["You're all set, ", "see you then!\n```js", 'on\n{"booking_confirmed": {"time": "10:00 AM", ',
+            '"date": "2030-01-07", "name": "Sam", "details": "cleaning"}}', "\n```"]
+    events = [{"type": "response.created", "response": {"id": "resp_1"}}]
+    for i, chunk in enumerate(text):
+        events.append({"type": delta_type, "item_id": "item_1", "delta": chunk})
+        events.append({"type": "response.audio.delta", "item_id": "item_1", "delta": f"QUFB{i}"})
+    events.append({"type": "response.done", "response": {"id": "resp_1", "output": [
+        {"id": "item_1", "content": [{"type": "audio", "transcript": "".join(text)}]}]}})
+    return events, len(text)
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setattr(realtime_processing, "queue_memory_entry", lambda *a: None)
+    assistant = SimpleNamespace(id=1, vad_threshold_db=None, record_calls=False)
+    h = CallHandler(SimpleNamespace(send=None), assistant, conversation_id=1)
+    h.audio_out = FakeAudioOut()
+    h._record_usage = lambda usage: None
+    h.booked_at = []
+    h._start_booking = lambda b: h.booked_at.append((h.openai_ws.read, b))
+    return h
+
+
+@pytest.mark.parametrize("delta_type", ["response.audio_transcript.delta", "response.text.delta"])
+def test_booking_cuts_audio_and_saves_when_block_closes(handler, delta_type):
+    events, chunks = reply_events(delta_type)
+    handler.openai_ws = FakeUpstream(events)
+
+    assert asyncio.run(handler._one_ai_turn()) is True
+
+    # audio stops on the delta that completes "```json" (split across two deltas)
+    assert handler.audio_out.frames == ["QUFB0", "QUFB1"]
+    assert handler.audio_out.interrupts == 1
+    # saved once, straight from the stream: on the closing delta, not at response.done
+    closing = 1 + 2 * (chunks - 1) + 1
+    assert handler.booked_at == [(closing, {"time": "10:00 AM", "date": "2030-01-07",
+                                            "name": "Sam", "details": "cleaning"})]
+
+
+def test_reply_without_booking_plays_all_audio(handler):
+    handler.openai_ws = FakeUpstream([
+        {"type": "response.created", "response": {"id": "resp_1"}},
+        {"type": "response.audio_transcript.delta", "item_id": "item_1", "delta": "We open at nine."},
+        {"type": "response.audio.delta", "item_id": "item_1", "delta": "QUFB"},
+        {"type": "response.audio.delta", "item_id": "item_1", "delta": "QkJC"},
+        {"type": "response.done", "response": {"id": "resp_1", "output": []}},
+    ])
+
+    asyncio.run(handler._one_ai_turn())
+
+    assert handler.audio_out.frames == ["QUFB", "QkJC"]
+    assert handler.audio_out.interrupts == 0
+    assert handler.booked_at == []
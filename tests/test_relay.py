@@ -0,0 +1,70 @@
+# tests/test_relay.py
+"""The media relay's fast path against the JSON Twilio and OpenAI really send."""
+import json
+
+import pytest
+
+from app.services import relay
+
+PAYLOAD = "f/9/f3///w=="
+
+
+def compact(event: dict) -> str:
+    return json.dumps(event, separators=(",", ":"))
+
+
+def twilio_media(payload: str = PAYLOAD) -> dict:
+    return {"event": "media", "sequenceNumber": "3",
+            "media": {"track": "inbound", "chunk": "2", "timestamp": "40", "payload": payload},
+            "streamSid": "MZ0123"}
+
+
+def audio_delta(delta: str = PAYLOAD) -> dict:
+    return {"type": "response.audio.delta", "event_id": "event_1", "response_id": "resp_1",
+            "item_id": "item_1", "output_index": 0, "content_index": 0, "delta": delta}
+
+
+def test_twilio_media_payload_is_sliced_out():
+    assert relay.twilio_media_payload(compact(twilio_media())) == PAYLOAD
+
+
+def test_audio_delta_is_sliced_out():
+    assert relay.audio_delta(compact(audio_delta())) == ("item_1", PAYLOAD)
+
+
+def test_audio_delta_without_item_id():
+    event = audio_delta()
+    del event["item_id"]
+    assert relay.audio_delta(compact(event)) == (None, PAYLOAD)
+
+
+@pytest.mark.parametrize("raw", [
+    json.dumps(twilio_media()),                                    # spaced separators: not the wire format
+    compact({"streamSid": "MZ0123", **twilio_media()}),            # event not the first key
+    compact(twilio_media(PAYLOAD + "\\u0041")),                    # escaped: must be parsed properly
+    compact({"event": "start", "start": {"streamSid": "MZ0123"}}),
+    b'{"event":"media"}',                                          # bytes frame
+    None,
+])
+def test_twilio_falls_back_when_unsure(raw):
+    assert relay.twilio_media_payload(raw) is None
+
+
+@pytest.mark.parametrize("raw", [
+    json.dumps(audio_delta()),
+    compact({"type": "response.audio_transcript.delta", "item_id": "item_1", "delta": "Hi"}),
+    compact({"type": "response.audio.delta.extra", "delta": PAYLOAD}),
+    compact(audio_delta("")),
+])
+def test_audio_delta_falls_back_when_unsure(raw):
+    assert relay.audio_delta(raw) is None
+
+
+def test_append_message_matches_json():
+    assert json.loads(relay.append_message(PAYLOAD)) == {"type": "input_audio_buffer.append", "audio": PAYLOAD}
+
+
+def test_media_message_matches_json():
+    prefix = relay.media_prefix('MZ"odd"')
+    assert json.loads(relay.media_message(prefix, PAYLOAD)) == {
+        "event": "media", "streamSid": 'MZ"odd"', "media": {"payload": PAYLOAD}}
@@ -0,0 +1,42 @@
+# tests/test_vad.py
+"""SilenceGate: what it forwards, and mapping OpenAI's audio clock back to the call."""
+import base64
+
+import numpy as np
+
+from app.services.vad import SilenceGate, FRAME_MS
+
+SILENT = base64.b64encode(b"\xff" * 160).decode()           # μ-law zero
+
+
+def loud(i: int) -> str:
+    """A loud, low-ZCR frame, distinct per i so frames can be told apart."""
+    tone = (np.sin(2 * np.pi * 200 * np.arange(160) / 8000) * 0x7F).astype(np.int16)
+    ulaw = np.where(tone >= 0, 0x80, 0x00) | 0x0F          # loud segment, sign from the tone
+    ulaw[0] = i % 256
+    return base64.b64encode(ulaw.astype(np.uint8).tobytes()).decode()
+
+
+def test_silence_runs_are_skipped_with_preroll_and_hangover():
+    gate = SilenceGate(-45, preroll_ms=40, hangover_ms=40)
+    stream = [SILENT] * 10 + [loud(0)] + [SILENT] * 10
+    out = [gate.feed(p) for p in stream]
+
+    assert [len(o) for o in out[:10]] == [0] * 10
+    assert out[10] == [SILENT, SILENT, loud(0)]              # 2 frames of pre-roll, then speech
+    assert [len(o) for o in out[11:]] == [1, 1] + [0] * 8    # 2 frames of hang-over
+
+
+def test_inbound_ms_maps_upstream_clock_back_to_the_call():
+    gate = SilenceGate(-45, preroll_ms=40, hangover_ms=40)
+    stream = [f for run in range(3) for f in [SILENT] * 30 + [loud(run * 5 + i) for i in range(5)]]
+    stream += [SILENT] * 5
+    sent = []
+    for p in stream:
+        sent.extend(gate.feed(p))
+
+    assert len(sent) < len(stream)
+    for k, payload in enumerate(sent):
+        position = gate.inbound_ms(k * FRAME_MS + 7)         # anywhere inside the frame
+        assert stream[position // FRAME_MS] == payload           # speech frames are all distinct
+        assert position % FRAME_MS == 7
@@ -0,0 +1,101 @@
+# tests/test_write_behind.py
+"""WriteBehind against SQLite: nothing queued is lost."""
+import asyncio
+import json
+import threading
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+from app.models import Message
+from app.services.write_behind import WriteBehind
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    app.config["WRITE_BEHIND_DEAD_LETTERS"] = str(tmp_path / "dead.jsonl")
+    app.config["WRITE_BEHIND_INTERVAL"] = 0.01
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def wb(app):
+    wb = WriteBehind()
+    wb.init_app(app)
+    return wb
+
+
+def _contents(app) -> list:
+    with app.app_context():
+        return list(db.session.scalars(db.select(Message.content).order_by(Message.id)))
+
+
+def test_transient_errors_are_retried_until_the_database_is_back(app, wb, monkeypatch):
+    write, failures = wb._write, iter(range(3))
+
+    def flaky(batch):
+        if next(failures, None) is not None:
+            raise OperationalError("INSERT", {}, Exception("database is restarting"))
+        write(batch)
+
+    monkeypatch.setattr(wb, "_write", flaky)
+    for i in range(5):
+        wb.put(Message, conversation_id=1, role="user", content=f"m{i}")
+
+    assert wb.flush(30)
+    assert _contents(app) == [f"m{i}" for i in range(5)]
+    assert wb.counters["retries"] == 3
+    assert wb.counters["dead_lettered"] == 0
+
+
+def test_a_bad_row_is_dead_lettered_to_disk_and_replayed(app, wb):
+    at = datetime(2026, 1, 2, 3, 4, 5)
+    wb.put(Message, conversation_id=1, role="user", content="before")
+    wb.put(Message, conversation_id=1, role="user", content=None, created_at=at)
+    wb.put(Message, conversation_id=1, role="user", content="after")
+    assert wb.flush(30)
+
+    assert _contents(app) == ["before", "after"]
+    with open(wb.dead_letter_path) as f:
+        (entry,) = [json.loads(line) for line in f]
+    assert entry["model"] == "Message" and entry["row"]["created_at"] == at.isoformat()
+    assert "IntegrityError" in entry["error"]
+
+    # the cause is fixed by hand, then the row goes back through the queue
+    entry["row"]["content"] = "fixed"
+    with open(wb.dead_letter_path, "w") as f:
+        f.write(json.dumps(entry) + "\n")
+    assert wb.replay_dead_letters() == 1
+    assert _contents(app) == ["before", "after", "fixed"]
+    with app.app_context():
+        assert db.session.scalar(db.select(Message.created_at).filter_by(content="fixed")) == at
+
+
+def test_a_full_queue_never_blocks_or_drops_on_the_event_loop(app, wb, monkeypatch):
+    wb.max_items = 2
+    release, write = threading.Event(), wb._write
+
+    def stalled(batch):
+        release.wait()
+        write(batch)
+
+    monkeypatch.setattr(wb, "_write", stalled)
+
+    async def call():
+        for i in range(10):
+            wb.put(Message, conversation_id=1, role="user", content=f"m{i}")
+
+    asyncio.run(asyncio.wait_for(call(), 5))
+    assert wb.counters["overflow"] > 0
+
+    release.set()
+    assert wb.flush(30)
+    assert _contents(app) == [f"m{i}" for i in range(10)]